@@ -0,0 +1,102 @@
+"""
+Benchmark the cold start time of the command line entry point and of the project module.
+
+Each case runs in a fresh python process so the time includes the interpreter start and all
+the imports, as paid by a job wrapper that creates one project per process. The create case
+builds a 10 x 10 box with hf_hydrodata and subsettools replaced by the stand-ins of fake_providers.
+
+    cli_help:               python src/cli.py --help (no project module import).
+    import_project:         import project (hf_hydrodata, subsettools, parflow, numpy and the modules of
+                            the optional features are imported lazily).
+    import_project_eager:   import project and the modules imported lazily (the imports of a build).
+    create_box_10:          cli.main create of a 10 x 10 box with the stand-ins.
+
+The fastest of --repeat runs of each case is reported and saved as JSON.
+
+Usage:
+    python benchmarks/bench_cold_start.py [--repeat N] [--output results.json]
+"""
+
+# pylint: disable=C0301
+import sys
+import os
+import time
+import json
+import argparse
+import shutil
+import tempfile
+import subprocess
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../src"))
+BENCHMARKS_DIR = os.path.abspath(os.path.dirname(__file__))
+
+# The modules imported lazily by the project module
+EAGER_MODULES = [
+    "hf_hydrodata",
+    "subsettools",
+    "parflow",
+    "numpy",
+    "output_store",
+    "pfb_dist",
+    "pf_segments",
+    "output_policy",
+    "solver_profiles",
+]
+
+CREATE_BOX = f"""
+import sys
+sys.path[:0] = [{SRC_DIR!r}, {BENCHMARKS_DIR!r}]
+import project, fake_providers, cli
+fake_providers.install(project)
+cli.main(["create", sys.argv[1], "--grid-bounds", "3750,1550,3760,1560", "--start-date", "2005-10-01", "--end-date", "2005-10-02"])
+"""
+
+
+def benchmark_cases(directory_path: str):
+    """Get the cases of the benchmark as a list of (name, command)."""
+
+    return [
+        ("cli_help", [sys.executable, os.path.join(SRC_DIR, "cli.py"), "--help"]),
+        ("import_project", [sys.executable, "-c", f"import sys; sys.path.insert(0, {SRC_DIR!r}); import project"]),
+        (
+            "import_project_eager",
+            [sys.executable, "-c", f"import sys; sys.path.insert(0, {SRC_DIR!r}); import project, {', '.join(EAGER_MODULES)}"],
+        ),
+        ("create_box_10", [sys.executable, "-c", CREATE_BOX, os.path.join(directory_path, "box_10")]),
+    ]
+
+
+def run_case(command: list, directory_path: str) -> float:
+    """Run the command in a fresh process and return its wall time in seconds."""
+
+    start = time.perf_counter()
+    subprocess.run(command, cwd=directory_path, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main():
+    """Run every case and print and save the fastest wall time of each case."""
+
+    parser = argparse.ArgumentParser(description="Benchmark the cold start time of the command line entry point.")
+    parser.add_argument("--repeat", type=int, default=5, help="Run each case N times and keep the fastest run.")
+    parser.add_argument("--output", default=os.path.join(os.path.dirname(__file__), "results/cold_start.json"))
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory_path:
+        for name, command in benchmark_cases(directory_path):
+            seconds = []
+            for _ in range(0, args.repeat):
+                seconds.append(run_case(command, directory_path))
+                # Every create run builds the project from scratch
+                shutil.rmtree(os.path.join(directory_path, "box_10"), ignore_errors=True)
+            results[name] = min(seconds)
+            print(f"{name:<24} {results[name] * 1000:8.0f} ms")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as stream:
+        json.dump(results, stream, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Offline benchmark of the stages of create_project using the local data provider stand-ins.
+
+Each case creates a project in a fresh process with hf_hydrodata and subsettools replaced by
+the stand-ins of fake_providers so the timings do not depend on the network. The stages
+(runscript, topology, static_forcing, dist) are timed by wrapping the stage functions of the
+project module. For every stage the wall time, the peak RSS of the process after the stage
+and the bytes written to the project directory by the stage are reported.
+
+The results are saved as JSON. When a baseline JSON file of a previous version is given the
+stages that are slower than the baseline by more than REGRESSION_TOLERANCE are reported and
+the benchmark exits with status 1.
+
+Usage:
+    python benchmarks/bench_create_project.py [--quick] [--repeat N] [--latency SECONDS] [--output results.json] [--baseline baseline.json]
+"""
+
+# pylint: disable=C0301,C0413,E0401
+import sys
+import os
+import time
+import json
+import argparse
+import resource
+import tempfile
+import concurrent.futures
+import multiprocessing
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+# The stage functions of the project module timed by the benchmark
+STAGES = {
+    "runscript": "_create_runscript",
+    "topology": "_create_topology",
+    "static_forcing": "_create_static_and_forcing",
+    "dist": "_create_dist_files",
+}
+
+# A stage is a regression if it is this fraction slower than the baseline (and at least 50 ms)
+REGRESSION_TOLERANCE = 0.25
+REGRESSION_MIN_SECONDS = 0.05
+
+BOXES = {"box_10": 10, "box_50": 50, "box_100": 100}
+HUCS = {"huc12": "020802030101", "huc10": "0208020301", "huc8": "02080203"}
+DATE_RANGES = {"1_day": ("2005-10-01", "2005-10-02"), "7_days": ("2005-10-01", "2005-10-08")}
+TOPOLOGIES = {"1x1": [1, 1, 1], "2x2": [2, 2, 1]}
+
+
+def benchmark_cases(quick: bool = False):
+    """
+    Get the cases of the benchmark as a list of (name, project_options).
+    The quick cases are a subset to check the benchmark itself.
+    """
+
+    cases = []
+    for box_name, size in BOXES.items():
+        for dates_name, (start_date, end_date) in DATE_RANGES.items():
+            for topology_name, topology in TOPOLOGIES.items():
+                cases.append(
+                    (
+                        f"{box_name}_{dates_name}_{topology_name}",
+                        {
+                            "grid_bounds": [3750, 1550, 3750 + size, 1550 + size],
+                            "start_date": start_date,
+                            "end_date": end_date,
+                            "topology": topology,
+                        },
+                    )
+                )
+    for huc_name, huc_id in HUCS.items():
+        for topology_name, topology in TOPOLOGIES.items():
+            cases.append(
+                (
+                    f"{huc_name}_1_day_{topology_name}",
+                    {"huc_id": huc_id, "start_date": "2005-10-01", "end_date": "2005-10-02", "topology": topology},
+                )
+            )
+    cases.append(
+        (
+            "box_50_7_days_fixed_forcing_1x1",
+            {
+                "grid_bounds": [3750, 1550, 3800, 1600],
+                "start_date": "2005-10-01",
+                "end_date": "2005-10-08",
+                "forcing_day": "2005-10-01",
+                "topology": [1, 1, 1],
+            },
+        )
+    )
+    for _, options in cases:
+        options["run_type"] = "transient"
+        options["grid"] = "conus2"
+    if quick:
+        cases = [case for case in cases if case[0].startswith(("box_10_1_day", "huc12"))]
+    return cases
+
+
+def run_case(name: str, project_options: dict, latency: float):
+    """
+    Create the project of a case with the stand-ins in this process and measure each stage.
+    Returns:
+        A dict with the total and per stage wall time, peak RSS and bytes written.
+    """
+
+    import project
+    import fake_providers
+
+    hydrodata = fake_providers.install(project, latency=latency)
+    stages = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        directory_path = os.path.join(temp_dir, name)
+        os.makedirs(directory_path)
+
+        def timed(stage, function):
+            def wrapper(*args, **kwargs):
+                bytes_before = _directory_bytes(directory_path)
+                start = time.perf_counter()
+                result = function(*args, **kwargs)
+                stages[stage] = {
+                    "seconds": time.perf_counter() - start,
+                    "peak_rss_bytes": _peak_rss_bytes(),
+                    "bytes_written": _directory_bytes(directory_path) - bytes_before,
+                }
+                return result
+
+            return wrapper
+
+        for stage, function_name in STAGES.items():
+            setattr(project, function_name, timed(stage, getattr(project, function_name)))
+        start = time.perf_counter()
+        project.create_project(project_options, directory_path)
+        total_seconds = time.perf_counter() - start
+        total_bytes = _directory_bytes(directory_path)
+    return {
+        "name": name,
+        "options": project_options,
+        "seconds": total_seconds,
+        "peak_rss_bytes": _peak_rss_bytes(),
+        "bytes_written": total_bytes,
+        "requests": hydrodata.requests,
+        "stages": stages,
+    }
+
+
+def compare(results: dict, baseline: dict):
+    """
+    Compare the stage timings of the results with a baseline.
+    Returns:
+        A list of messages of the stages slower than the baseline.
+    """
+
+    regressions = []
+    baseline_cases = {case["name"]: case for case in baseline.get("cases", [])}
+    for case in results["cases"]:
+        baseline_case = baseline_cases.get(case["name"])
+        if not baseline_case:
+            continue
+        for stage, measured in case["stages"].items():
+            expected = baseline_case["stages"].get(stage)
+            if not expected:
+                continue
+            limit = max(expected["seconds"] * (1 + REGRESSION_TOLERANCE), expected["seconds"] + REGRESSION_MIN_SECONDS)
+            if measured["seconds"] > limit:
+                regressions.append(
+                    f"{case['name']} {stage}: {measured['seconds']:.3f} s (baseline {expected['seconds']:.3f} s)"
+                )
+    return regressions
+
+
+def main():
+    """Run the benchmark cases, print a table of the stage timings and save the results as JSON."""
+
+    parser = argparse.ArgumentParser(description="Offline benchmark of the create_project stages.")
+    parser.add_argument("--quick", action="store_true", help="Run only the smallest cases.")
+    parser.add_argument("--repeat", type=int, default=1, help="Run each case N times and keep the fastest run.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated seconds of each data request.")
+    parser.add_argument("--output", default=os.path.join(os.path.dirname(__file__), "results/create_project.json"))
+    parser.add_argument("--baseline", default=None, help="The results JSON of a previous version to compare with.")
+    args = parser.parse_args()
+
+    cases = []
+    context = multiprocessing.get_context("spawn")
+    for name, options in benchmark_cases(args.quick):
+        runs = []
+        for _ in range(0, max(args.repeat, 1)):
+            # Each case runs in a new process so the peak RSS is measured per case
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                runs.append(executor.submit(run_case, name, options, args.latency).result())
+        case = min(runs, key=lambda run: run["seconds"])
+        cases.append(case)
+        stage_text = "  ".join(f"{stage} {values['seconds']:.3f}s" for stage, values in case["stages"].items())
+        print(f"{name:<36} {case['seconds']:7.3f}s  rss {case['peak_rss_bytes'] / 2**20:7.1f} MB  written {case['bytes_written'] / 2**20:8.2f} MB  {stage_text}")
+
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "latency": args.latency,
+        "repeat": args.repeat,
+        "cases": cases,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as stream:
+        json.dump(results, stream, indent=2)
+    print(f"Saved {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as stream:
+            regressions = compare(results, json.load(stream))
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+def _directory_bytes(directory_path: str) -> int:
+    """Get the total size of the files in the directory (hardlinked files are counted once)."""
+
+    total = 0
+    inodes = set()
+    for root, _, file_names in os.walk(directory_path):
+        for file_name in file_names:
+            stat = os.lstat(os.path.join(root, file_name))
+            if (stat.st_dev, stat.st_ino) not in inodes:
+                inodes.add((stat.st_dev, stat.st_ino))
+                total += stat.st_size
+    return total
+
+
+def _peak_rss_bytes() -> int:
+    """Get the peak resident set size of this process (ru_maxrss is in KB on linux)."""
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+if __name__ == "__main__":
+    main()
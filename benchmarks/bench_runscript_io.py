@@ -0,0 +1,77 @@
+"""
+Benchmark the cost of parsing and writing the parflow runscript yaml file in create_project.
+
+A create_project call used to load the runscript with parflow.Run.from_definition and write it back
+with model.write in every stage. The stages now share one parflow model in memory and only write it
+before calling a subsettools function that reads the runscript file and once at the end.
+
+The counts below include the parse and write calls made inside subsettools and were measured for a
+transient project with forcing_day by wrapping parflow.Run.from_definition and parflow.Run.write.
+
+Usage:
+    python benchmarks/bench_runscript_io.py [repeat]
+"""
+
+# pylint: disable=C0301,C0413,E0401
+import sys
+import os
+import time
+import shutil
+import tempfile
+import parflow
+
+TEMPLATE_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "../src/template_runscripts")
+)
+TEMPLATES = ["conus2_transient_solid.yaml", "conus2_spinup_solid.yaml"]
+
+# (parse, write) calls of one create_project call and the extra round trip of pf_scenarios.execute_run
+ROUND_TRIPS_BEFORE = (9 + 1, 7 + 1)
+ROUND_TRIPS_AFTER = (6, 6)
+
+
+def measure_round_trip(template_path: str, repeat: int):
+    """
+    Measure the average time to parse and to write the runscript of the template.
+    Returns:
+        (parse_seconds, write_seconds)
+    """
+
+    with tempfile.TemporaryDirectory() as directory_path:
+        runscript_path = os.path.join(directory_path, "bench.yaml")
+        shutil.copy(template_path, runscript_path)
+        parflow.tools.settings.set_working_directory(directory_path)
+        parse_seconds = 0.0
+        write_seconds = 0.0
+        for _ in range(0, repeat):
+            start = time.perf_counter()
+            model = parflow.Run.from_definition(runscript_path)
+            parse_seconds += time.perf_counter() - start
+            start = time.perf_counter()
+            model.write(file_format="yaml")
+            write_seconds += time.perf_counter() - start
+    return (parse_seconds / repeat, write_seconds / repeat)
+
+
+def main():
+    """Print the runscript parse and write cost of create_project before and after sharing the model."""
+
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for template in TEMPLATES:
+        parse_seconds, write_seconds = measure_round_trip(
+            os.path.join(TEMPLATE_DIR, template), repeat
+        )
+        before = (
+            ROUND_TRIPS_BEFORE[0] * parse_seconds
+            + ROUND_TRIPS_BEFORE[1] * write_seconds
+        )
+        after = (
+            ROUND_TRIPS_AFTER[0] * parse_seconds + ROUND_TRIPS_AFTER[1] * write_seconds
+        )
+        print(template)
+        print(f"    parse: {parse_seconds * 1000:.1f} ms  write: {write_seconds * 1000:.1f} ms")
+        print(f"    before: {before * 1000:.1f} ms  after: {after * 1000:.1f} ms  saved: {(before - after) * 1000:.1f} ms per project")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark the "auto" topology choice of create_project against measured parflow runtimes.
+
+For each domain the project is created once with every candidate topology [p, q, 1] that fits
+in the available cores and parflow is run for a few timesteps. The runtime of the topology chosen
+by project.choose_topology is compared with the fastest measured topology. The auto choice is
+reported as ok when it is within TOLERANCE of the fastest runtime.
+
+This needs hf_hydrodata access and a parflow installation (PARFLOW_DIR) with mpi.
+
+Usage:
+    python benchmarks/bench_topology.py [cores] [time_steps]
+"""
+
+# pylint: disable=C0301,C0413,E0401
+import sys
+import os
+import time
+import json
+import tempfile
+import parflow
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+import project
+
+# The domains to benchmark from the 10x10 box of test_trivial to a HUC8
+DOMAINS = {
+    "box_10": {"grid_bounds": [3749, 1583, 3759, 1593]},
+    "box_64": {"grid_bounds": [3722, 1556, 3786, 1620]},
+    "box_128": {"grid_bounds": [3690, 1524, 3818, 1652]},
+    "huc_02080203": {"huc_id": "02080203"},
+}
+
+# The auto topology is accepted if its runtime is within this fraction of the fastest topology
+TOLERANCE = 0.15
+
+
+def candidate_topologies(cores: int):
+    """Get the candidate topologies [p, q, 1] that use at most cores ranks."""
+
+    return [[p, q, 1] for p in range(1, cores + 1) for q in range(1, cores // p + 1)]
+
+
+def measure_topology(domain_options: dict, topology, time_steps: int, cores: int):
+    """
+    Create a project with the topology and measure the runtime of parflow.
+    Returns:
+        The parflow runtime in seconds.
+    """
+
+    with tempfile.TemporaryDirectory() as directory_path:
+        project_options = {
+            "run_type": "transient",
+            "grid": "conus2",
+            "start_date": "2005-10-01",
+            "end_date": "2005-10-02",
+            "time_steps": time_steps,
+            "forcing_day": "2005-10-01",
+            "topology": topology,
+            "available_cores": cores,
+            **domain_options,
+        }
+        runscript_path = project.create_project(
+            project_options, os.path.join(directory_path, "bench")
+        )
+        model = parflow.Run.from_definition(runscript_path)
+        start = time.perf_counter()
+        model.run(working_directory=os.path.dirname(runscript_path))
+        return time.perf_counter() - start
+
+
+def main():
+    """Print and save the measured runtimes of the candidate and auto topologies of each domain."""
+
+    cores = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+    time_steps = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    results = {}
+    for name, domain_options in DOMAINS.items():
+        domain = project.resolve_domain(domain_options)
+        nx = domain.ij_bounds[2] - domain.ij_bounds[0]
+        ny = domain.ij_bounds[3] - domain.ij_bounds[1]
+        active_fraction = float(domain.mask.astype(bool).sum()) / domain.mask.size
+        auto, reason = project.choose_topology(
+            nx, ny, 10, active_fraction=active_fraction, cores=cores
+        )
+        runtimes = {}
+        for topology in candidate_topologies(cores):
+            if topology[0] > nx or topology[1] > ny:
+                continue
+            try:
+                runtimes[f"{topology[0]}x{topology[1]}"] = measure_topology(
+                    domain_options, topology, time_steps, cores
+                )
+            except Exception as e:
+                print(f"{name} {topology} failed: {e}")
+        auto_key = f"{auto[0]}x{auto[1]}"
+        if auto_key not in runtimes:
+            runtimes[auto_key] = measure_topology(domain_options, auto, time_steps, cores)
+        fastest = min(runtimes, key=runtimes.get)
+        ok = runtimes[auto_key] <= runtimes[fastest] * (1 + TOLERANCE)
+        results[name] = {
+            "nx": nx,
+            "ny": ny,
+            "active_fraction": active_fraction,
+            "auto": auto_key,
+            "reason": reason,
+            "fastest": fastest,
+            "ok": ok,
+            "runtimes": runtimes,
+        }
+        print(name)
+        print(f"    {reason}")
+        print(f"    auto {auto_key}: {runtimes[auto_key]:.2f} s  fastest {fastest}: {runtimes[fastest]:.2f} s  {'ok' if ok else 'SLOWER'}")
+
+    results_path = os.path.join(os.path.dirname(__file__), "results/topology.json")
+    os.makedirs(os.path.dirname(os.path.abspath(results_path)), exist_ok=True)
+    with open(results_path, "w", encoding="utf-8") as stream:
+        json.dump({"cores": cores, "time_steps": time_steps, "domains": results}, stream, indent=2)
+    print(f"Saved {results_path}")
+
+
+if __name__ == "__main__":
+    main()
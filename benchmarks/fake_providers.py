@@ -0,0 +1,247 @@
+"""
+Local stand-ins for hf_hydrodata and subsettools that serve synthetic CONUS2 shaped data.
+
+The stand-ins implement the functions called by the project module and write files with the
+same names, shapes and sizes as the real data so the stages of create_project can be timed
+without network access. The subsettools functions that only edit or distribute local files
+(edit_runscript_for_subset, change_filename_values and dist_run) are the real functions.
+
+The forcing data depends on the variable and on the date of each day (not on the day of the
+request) so subsetting the forcing in chunks or in one request writes the same files.
+
+A HUC id is mapped to a synthetic domain whose size depends on the HUC level
+(see HUC_SIZES) with an elliptical mask of active cells.
+
+Example:
+
+.. code-block:: python
+
+    import project
+    import fake_providers
+
+    fake_providers.install(project, latency=0.05)
+"""
+
+# pylint: disable=C0301,W0613
+import os
+import time
+import datetime
+import zlib
+import numpy as np
+import parflow
+import subsettools
+
+CONUS2_SHAPE = (10, 3256, 4442)
+CONUS2_DZ = 200.0
+
+# The (nx, ny) size of the synthetic domain of a HUC id by the number of digits of the id
+HUC_SIZES = {2: (600, 500), 4: (300, 250), 6: (160, 130), 8: (70, 55), 10: (30, 25), 12: (12, 10)}
+
+# The number of z layers of each static file written by subset_static
+STATIC_LAYERS = {
+    "slope_x": 1,
+    "slope_y": 1,
+    "pf_indicator": 10,
+    "mannings": 1,
+    "pf_flowbarrier": 1,
+    "pme": 1,
+    "ss_pressure_head": 10,
+}
+
+# The dataset_var of the CW3E forcing variables
+FORCING_DATASET_VARS = {
+    "downward_shortwave": "DSWR",
+    "precipitation": "APCP",
+    "downward_longwave": "DLWR",
+    "specific_humidity": "SPFH",
+    "air_temp": "Temp",
+    "atmospheric_pressure": "Press",
+    "east_windspeed": "UGRD",
+    "north_windspeed": "VGRD",
+}
+
+VEGM_COLUMNS = 23
+
+
+class FakeHydrodata:
+    """
+    A stand-in for hf_hydrodata.
+
+    Parameters:
+        latency:    Seconds to sleep in each data request to simulate the remote service.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests = 0
+
+    def to_latlon(self, grid, x, y):
+        """Convert grid x, y to a lat, lon with a linear projection."""
+
+        return (20.0 + float(y) / 100.0, -125.0 + float(x) / 100.0)
+
+    def get_catalog_entry(self, options):
+        """Get the catalog entry of the forcing variable of the options."""
+
+        return {"dataset_var": FORCING_DATASET_VARS.get(options.get("variable"))}
+
+    def get_gridded_data(self, options):
+        """Get a synthetic array of the options with one time step per day or hour."""
+
+        self._request()
+        bounds = options["grid_bounds"]
+        nx = bounds[2] - bounds[0]
+        ny = bounds[3] - bounds[1]
+        nt = 24 if options.get("temporal_resolution") == "hourly" else 1
+        # The data depends on the requested date so projects of different dates have different forcing
+        name = f"{options.get('variable', '')}:{options.get('start_time', '')}"
+        return synthetic_array((nt, ny, nx), name, bounds)
+
+    def _request(self):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+class FakeSubsettools:
+    """
+    A stand-in for subsettools that writes synthetic input files.
+
+    Parameters:
+        hydrodata:  The FakeHydrodata used for the latency and the latlon projection.
+    """
+
+    def __init__(self, hydrodata: FakeHydrodata):
+        self.hydrodata = hydrodata
+        self.edit_runscript_for_subset = subsettools.edit_runscript_for_subset
+        self.change_filename_values = subsettools.change_filename_values
+        self.dist_run = subsettools.dist_run
+
+    def define_huc_domain(self, hucs, grid):
+        """Get the bounds and an elliptical mask of a synthetic domain of the size of the HUC level."""
+
+        self.hydrodata._request()
+        nx, ny = HUC_SIZES.get(len(str(hucs[0])), HUC_SIZES[8])
+        seed = zlib.crc32(",".join(str(huc) for huc in hucs).encode("utf-8"))
+        x0 = 100 + seed % (CONUS2_SHAPE[2] - nx - 200)
+        y0 = 100 + (seed // CONUS2_SHAPE[2]) % (CONUS2_SHAPE[1] - ny - 200)
+        y, x = np.meshgrid(np.arange(ny), np.arange(nx), indexing="ij")
+        mask = (((x + 0.5 - nx / 2) / (nx / 2)) ** 2 + ((y + 0.5 - ny / 2) / (ny / 2)) ** 2) <= 1.0
+        return (x0, y0, x0 + nx, y0 + ny), mask.astype(int)
+
+    def define_latlon_domain(self, latlon_bounds, grid):
+        """Get the bounds and a mask of active cells of a latlon box."""
+
+        (min_lat, min_lon), (max_lat, max_lon) = latlon_bounds
+        imin = int(round((min_lon + 125.0) * 100.0))
+        jmin = int(round((min_lat - 20.0) * 100.0))
+        imax = int(round((max_lon + 125.0) * 100.0)) + 1
+        jmax = int(round((max_lat - 20.0) * 100.0)) + 1
+        return (imin, jmin, imax, jmax), np.ones((jmax - jmin, imax - imin), dtype=int)
+
+    def write_mask_solid(self, mask, grid, write_dir):
+        """Write the mask.pfb and a solidfile.pfsol sized like the output of pfmask-to-pfsol."""
+
+        mask_path = os.path.join(write_dir, "mask.pfb")
+        solid_path = os.path.join(write_dir, "solidfile.pfsol")
+        mask_vtk_path = os.path.join(write_dir, "mask_vtk.vtk")
+        ny, nx = mask.shape
+        parflow.write_pfb(mask_path, mask.reshape((1, ny, nx)).astype(float), dist=False)
+        with open(solid_path, "w", encoding="utf-8") as stream:
+            stream.write("1\n")
+            for j in range(0, ny + 1):
+                stream.write(" ".join(f"{i * 1000.0} {j * 1000.0} 0.0" for i in range(0, nx + 1)))
+                stream.write("\n")
+        with open(mask_vtk_path, "w", encoding="utf-8") as stream:
+            stream.write("# vtk DataFile Version 2.0\n")
+        return {"mask": mask_path, "mask_vtk": mask_vtk_path, "solid": solid_path}
+
+    def subset_static(self, ij_bounds, dataset, write_dir, var_list=tuple(STATIC_LAYERS.keys())):
+        """Write the static pfb files of the domain."""
+
+        nx = ij_bounds[2] - ij_bounds[0]
+        ny = ij_bounds[3] - ij_bounds[1]
+        file_paths = {}
+        for var in var_list:
+            self.hydrodata._request()
+            file_path = os.path.join(write_dir, f"{var}.pfb")
+            data = synthetic_array((STATIC_LAYERS[var], ny, nx), var, ij_bounds)
+            if var == "ss_pressure_head":
+                data = data - 5.0
+            parflow.write_pfb(file_path, data, dist=False)
+            file_paths[var] = file_path
+        return file_paths
+
+    def config_clm(self, ij_bounds, start, end, dataset, write_dir, time_zone="UTC"):
+        """Write the clm driver files of the domain."""
+
+        self.hydrodata._request()
+        nx = ij_bounds[2] - ij_bounds[0]
+        ny = ij_bounds[3] - ij_bounds[1]
+        vegp_path = os.path.join(write_dir, "drv_vegp.dat")
+        vegm_path = os.path.join(write_dir, "drv_vegm.dat")
+        clmin_path = os.path.join(write_dir, "drv_clmin.dat")
+        with open(vegp_path, "w", encoding="utf-8") as stream:
+            for line in range(0, 50):
+                stream.write(f"parameter_{line} " + " ".join(["0.5"] * 18) + "\n")
+        with open(vegm_path, "w", encoding="utf-8") as stream:
+            stream.write(" x y lat lon sand clay color fractional coverage of grid by vegetation class\n")
+            stream.write("\n")
+            for j in range(0, ny):
+                for i in range(0, nx):
+                    values = [i + 1, j + 1, 40.0, -75.0, 0.16, 0.27, 2] + [0.0] * (VEGM_COLUMNS - 8) + [1.0]
+                    stream.write(" ".join(str(value) for value in values) + "\n")
+        start_dt = datetime.datetime.strptime(start, "%Y-%m-%d")
+        end_dt = datetime.datetime.strptime(end, "%Y-%m-%d") - datetime.timedelta(hours=1)
+        with open(clmin_path, "w", encoding="utf-8") as stream:
+            stream.write(f"{'vegtf':<15}{'drv_vegm.dat':<37} Vegetation Tile Specification File\n")
+            stream.write(f"{'vegpf':<15}{'drv_vegp.dat':<37} Vegetation Type Parameter\n")
+            for key, value in [
+                ("shr", start_dt.hour), ("sda", start_dt.day), ("smo", start_dt.month), ("syr", start_dt.year),
+                ("ehr", end_dt.hour), ("eda", end_dt.day), ("emo", end_dt.month), ("eyr", end_dt.year),
+            ]:
+                stream.write(f"{key:<15}{value:<37}\n")
+        return {"vegp": vegp_path, "pfb": vegm_path, "drv_clm": clmin_path}
+
+    def subset_forcing(
+        self, ij_bounds, grid, start, end, dataset, write_dir, time_zone="UTC", forcing_vars=tuple(FORCING_DATASET_VARS.keys()), dataset_version=None
+    ):
+        """Write one forcing file of 24 hours per day per variable named like subsettools."""
+
+        nx = ij_bounds[2] - ij_bounds[0]
+        ny = ij_bounds[3] - ij_bounds[1]
+        days = (datetime.datetime.strptime(end, "%Y-%m-%d") - datetime.datetime.strptime(start, "%Y-%m-%d")).days
+        outputs = {}
+        for variable in forcing_vars:
+            dataset_var = FORCING_DATASET_VARS[variable]
+            paths = []
+            for day in range(1, days + 1):
+                self.hydrodata._request()
+                date = datetime.datetime.strptime(start, "%Y-%m-%d") + datetime.timedelta(days=day - 1)
+                data = synthetic_array((24, ny, nx), f"{variable}:{date:%Y-%m-%d}", ij_bounds)
+                path = os.path.join(write_dir, f"{dataset}.{dataset_var}.{day * 24 - 23:06d}_to_{day * 24:06d}.pfb")
+                parflow.write_pfb(path, data, dist=False)
+                paths.append(path)
+            outputs[variable] = paths
+        return outputs
+
+
+def synthetic_array(shape, name: str, bounds):
+    """Get a deterministic float array of the shape that depends on the name and bounds."""
+
+    seed = zlib.crc32(f"{name}:{list(bounds)}".encode("utf-8"))
+    return np.random.default_rng(seed).random(shape)
+
+
+def install(project_module, latency: float = 0.0):
+    """
+    Replace hf_hydrodata and subsettools in the project module with the stand-ins.
+    Returns:
+        The FakeHydrodata that counts the requests.
+    """
+
+    hydrodata = FakeHydrodata(latency=latency)
+    project_module.hf = hydrodata
+    project_module.st = FakeSubsettools(hydrodata)
+    project_module._resolve_spatial_domain.cache_clear()
+    return hydrodata
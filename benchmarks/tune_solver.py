@@ -0,0 +1,94 @@
+"""
+Tune the linear solver settings of parflow on a representative project.
+
+The project is created with create_project from the grid_bounds or huc_id and topology options
+(or an existing runscript is used). Each combination of the candidate Krylov dimensions, restarts
+and preconditioners is run for --hours with parflow. The seconds per timestep and the nonlinear
+and linear iterations of the kinsol log of every candidate are printed and saved in
+solver_tuning.json of the project directory, and the fastest settings are saved as a tuned profile
+in the --profiles file used by the solver_profile "auto" option of create_project.
+
+This runs parflow so it requires a parflow installation and the hf_hydrodata credentials.
+
+Usage:
+    python benchmarks/tune_solver.py --grid-bounds 3749,1583,3849,1683 --topology 2,2,1 [--hours 24] [--profiles solver_profiles.json]
+    python benchmarks/tune_solver.py --runscript ./box/box.yaml [--krylov 30,100,500] [--restarts 2,8] [--preconditioner PFMG,PFMGOctree]
+"""
+
+# pylint: disable=C0301,C0413,E0401
+import sys
+import os
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+
+def _list(text: str, convert=str):
+    return [convert(value.strip()) for value in text.split(",") if value.strip()]
+
+
+def main():
+    """Create or load the representative project, run the candidate settings and save the tuned profile."""
+
+    import project
+    import solver_profiles
+
+    parser = argparse.ArgumentParser(description="Tune the parflow linear solver settings of a representative project.")
+    parser.add_argument("--runscript", default=None, help="The runscript of an existing project.")
+    parser.add_argument("--grid-bounds", default=None, help="The grid_bounds of the project to create.")
+    parser.add_argument("--huc-id", default=None, help="The huc_id of the project to create.")
+    parser.add_argument("--topology", default="1,1,1", help="The topology of the project to create.")
+    parser.add_argument("--start-date", default="2005-10-01")
+    parser.add_argument("--end-date", default="2005-10-02")
+    parser.add_argument("--directory", default="./tune_solver", help="The directory of the project to create.")
+    parser.add_argument("--hours", type=float, default=24, help="The hours of each run.")
+    parser.add_argument("--krylov", default="30,100,500", help="The Solver.Linear.KrylovDimension candidates.")
+    parser.add_argument("--restarts", default="2,8", help="The Solver.Linear.MaxRestarts candidates.")
+    parser.add_argument("--preconditioner", default="PFMG,PFMGOctree", help="The Solver.Linear.Preconditioner candidates.")
+    parser.add_argument("--profiles", default="solver_profiles.json", help="The file of the tuned profiles.")
+    parser.add_argument("--name", default=None, help="The name of the tuned profile.")
+    args = parser.parse_args()
+
+    runscript_path = args.runscript
+    if not runscript_path:
+        options = {
+            "run_type": "transient",
+            "start_date": args.start_date,
+            "end_date": args.end_date,
+            "topology": _list(args.topology, int),
+        }
+        if args.grid_bounds:
+            options["grid_bounds"] = _list(args.grid_bounds, int)
+        elif args.huc_id:
+            options["huc_id"] = args.huc_id
+        else:
+            parser.error("One of --runscript, --grid-bounds or --huc-id is required.")
+        runscript_path = project.create_project(options, args.directory)
+
+    candidates = {
+        "Solver.Linear.KrylovDimension": _list(args.krylov, int),
+        "Solver.Linear.MaxRestarts": _list(args.restarts, int),
+        "Solver.Linear.Preconditioner": _list(args.preconditioner),
+    }
+    tuning = solver_profiles.tune_profile(
+        runscript_path, candidates, hours=args.hours, profiles_path=args.profiles, name=args.name
+    )
+    print(f"cells {tuning['cells']}  ranks {tuning['ranks']}")
+    for result in sorted(tuning["results"], key=lambda r: r.get("seconds_per_timestep") or float("inf")):
+        settings = "  ".join(f"{key.split('.')[-1]} {value}" for key, value in result["settings"].items())
+        if result["status"] == "ok":
+            print(
+                f"{settings:<60} {result['seconds_per_timestep']:8.3f} s/step  "
+                f"nonlinear {result['nonlinear_iterations']:6d}  linear {result['linear_iterations']:8d}"
+            )
+        else:
+            print(f"{settings:<60} failed")
+    if tuning["profile"]:
+        print(f"Saved profile '{tuning['profile']['name']}' to {args.profiles}")
+    else:
+        print("All candidates failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Command line entry point to create parflow projects and run scenarios.
+
+The project options are read from a YAML or JSON file and/or given as flags. The flags
+override the keys of the file and --set KEY=VALUE sets any other option (the value is parsed
+as YAML so numbers, booleans and lists keep their type).
+
+The modules of the project are only imported by the command that uses them, and hf_hydrodata
+and subsettools only by the first stage of create_project that needs them, so printing
+the usage or rejecting invalid options does not pay their import time.
+
+Usage:
+    python src/cli.py create ./box --grid-bounds 3749,1583,3759,1593 --start-date 2005-10-01 --end-date 2005-10-02
+    python src/cli.py create ./box --options box.yaml --topology 2,2,1 --set time_steps=10 [--run]
+    python src/cli.py run-scenarios [--scenarios scenarios.yaml] [--scenarios-dir ./scenarios] [--max-workers 4] [--run-parflow]
+
+A scenarios file is a mapping of the runname of each scenario to its project options. Without
+a scenarios file the start pressure and forcing matrix of pf_scenarios is run.
+"""
+
+# pylint: disable = C0301,C0415
+import os
+import sys
+import json
+import argparse
+import functools
+
+
+def main(argv=None) -> int:
+    """
+    Run the command of the command line arguments.
+    Returns:
+        The exit status of the command.
+    """
+
+    parser = _create_parser()
+    args = parser.parse_args(argv)
+    try:
+        return args.command_function(args)
+    except ValueError as error:
+        parser.error(str(error))
+
+
+def read_options(path: str) -> dict:
+    """Read a dict of options from a JSON (.json) or YAML file."""
+
+    with open(path, "r", encoding="utf-8") as stream:
+        if path.endswith(".json"):
+            options = json.load(stream)
+        else:
+            import yaml
+
+            options = yaml.safe_load(stream)
+    if not isinstance(options, dict):
+        raise ValueError(f"The options file '{path}' does not contain a mapping.")
+    return options
+
+
+def project_options(args) -> dict:
+    """Get the project options of the create command from the options file and the flags."""
+
+    options = read_options(args.options) if args.options else {}
+    flags = {
+        "run_type": args.run_type,
+        "template": args.template,
+        "grid_bounds": _int_list(args.grid_bounds),
+        "huc_id": args.huc_id.split(",") if args.huc_id else None,
+        "latlon_bounds": _latlon_bounds(args.latlon_bounds),
+        "start_date": args.start_date,
+        "end_date": args.end_date,
+        "forcing_day": args.forcing_day,
+        "time_steps": args.time_steps,
+        "topology": (
+            args.topology if args.topology in (None, "auto") else _int_list(args.topology)
+        ),
+    }
+    options.update({key: value for key, value in flags.items() if value is not None})
+    for setting in args.set or []:
+        key, separator, value = setting.partition("=")
+        if not separator or not key:
+            raise ValueError(f"The setting '{setting}' is not KEY=VALUE.")
+        import yaml
+
+        options[key.strip()] = yaml.safe_load(value)
+    return options
+
+
+def _create(args) -> int:
+    """Create the project of the options and print the path of its runscript."""
+
+    options = project_options(args)
+    import project
+
+    runscript_path = project.create_project(options, args.directory)
+    print(runscript_path)
+    if args.run:
+        import parflow
+
+        model = parflow.Run.from_definition(runscript_path)
+        model.run(working_directory=os.path.dirname(runscript_path))
+    return 0
+
+
+def _run_scenarios(args) -> int:
+    """Create (and optionally run) the scenarios in parallel and print their status."""
+
+    import pf_scenarios
+
+    if args.scenarios:
+        scenarios = list(read_options(args.scenarios).items())
+        summary = pf_scenarios.run_scenarios(
+            scenarios,
+            max_workers=args.max_workers,
+            run_parflow=args.run_parflow,
+            total_cores=args.total_cores,
+            scenarios_dir=args.scenarios_dir,
+            execute=functools.partial(_create_scenario, os.path.abspath(args.scenarios_dir)),
+        )
+    else:
+        summary = pf_scenarios.generate_scenarios(
+            max_workers=args.max_workers,
+            run_parflow=args.run_parflow,
+            total_cores=args.total_cores,
+            scenarios_dir=args.scenarios_dir,
+        )
+    for result in summary["scenarios"]:
+        print(f"{result['runname']:<30} {result['status']}")
+    print(f"{summary['failed']} of {len(summary['scenarios'])} scenarios failed in {summary['total_seconds']:.1f} s")
+    return 1 if summary["failed"] else 0
+
+
+def _create_scenario(scenarios_dir: str, runname: str, options: dict) -> str:
+    """Create the project of a scenario in a worker process of run_scenarios."""
+
+    import project
+
+    return project.create_project(options, os.path.join(scenarios_dir, runname))
+
+
+def _int_list(text: str):
+    return [int(value) for value in text.split(",")] if text else None
+
+
+def _latlon_bounds(text: str):
+    if not text:
+        return None
+    values = [float(value) for value in text.split(",")]
+    if len(values) != 4:
+        raise ValueError("The latlon bounds must be lat_min,lon_min,lat_max,lon_max.")
+    return [values[0:2], values[2:4]]
+
+
+def _create_parser():
+    """Create the parser of the command line arguments."""
+
+    parser = argparse.ArgumentParser(
+        prog="cli.py", description="Create parflow projects and run scenarios."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    create = commands.add_parser("create", help="Create a parflow project directory.")
+    create.add_argument("directory", help="The project directory (its name is the runname).")
+    create.add_argument("--options", default=None, help="A YAML or JSON file of project options.")
+    create.add_argument("--run-type", default=None, choices=["transient", "spinup"])
+    create.add_argument("--template", default=None, help="A template runscript yaml file.")
+    create.add_argument("--grid-bounds", default=None, help="i_min,j_min,i_max,j_max")
+    create.add_argument("--huc-id", default=None, help="A comma separated list of HUC ids.")
+    create.add_argument("--latlon-bounds", default=None, help="lat_min,lon_min,lat_max,lon_max")
+    create.add_argument("--start-date", default=None)
+    create.add_argument("--end-date", default=None)
+    create.add_argument("--forcing-day", default=None)
+    create.add_argument("--time-steps", type=int, default=None)
+    create.add_argument("--topology", default=None, help="P,Q,R or auto")
+    create.add_argument("--set", action="append", metavar="KEY=VALUE", help="Set any other project option.")
+    create.add_argument("--run", action="store_true", help="Run parflow after the project is created.")
+    create.set_defaults(command_function=_create)
+
+    scenarios = commands.add_parser("run-scenarios", help="Create (and run) scenarios in parallel.")
+    scenarios.add_argument("--scenarios", default=None, help="A YAML or JSON file of runname to project options.")
+    scenarios.add_argument("--scenarios-dir", default="./scenarios", help="The directory of the scenarios and their summary.json.")
+    scenarios.add_argument("--max-workers", type=int, default=None)
+    scenarios.add_argument("--total-cores", type=int, default=None)
+    scenarios.add_argument("--run-parflow", action="store_true")
+    scenarios.set_defaults(command_function=_run_scenarios)
+    return parser
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,560 @@
+"""
+A local content-addressed cache for the files and arrays downloaded by
+hf_hydrodata and subsettools while creating a parflow project.
+
+Each cached request is identified by a key computed from the request options
+(dataset, variable, grid bounds, dates, aggregation, dataset_version, ...).
+The files produced by a request are stored once by the sha256 of their content,
+so identical files produced by different requests share the same storage.
+Cached files are copied (or hardlinked) into the project directory on a cache hit
+so repeated project builds of the same domain skip the network entirely.
+
+The cache is bounded by a maximum size in bytes and evicts the least recently
+used entries when the size is exceeded. The sha256 of a cached file is checked the first
+time it is used in a process (and again if the file was modified), so a cached file
+changed through a hardlink of a project is fetched again. In symlink mode the symlinks
+put into projects are recorded and a file that is still the target of a symlink is not
+removed by the eviction (and does not count towards the maximum size of the cache).
+
+A cache_dir may be shared by the processes of pf_scenarios and pf_ensemble. Storing a request
+and the eviction hold an exclusive lock of the cache_dir and restoring the files of a hit holds
+a shared lock, so an object is not evicted before the entry referencing it is written.
+"""
+
+# pylint: disable = C0301,R0902,R0913
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+import contextlib
+
+try:
+    import fcntl
+except ImportError:
+    # The cache_dir is only locked within a process on platforms without fcntl
+    fcntl = None
+
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024 * 1024
+LINK_MODES = ["copy", "hardlink", "symlink"]
+
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_cache(project_options: dict):
+    """
+    Get the shared DataCache configured by the project options.
+
+    Parameters:
+        project_options:    A dict of options passed to project.create_project.
+
+    The project_options dict supports the keys:
+        cache_dir:          The directory of the local cache (the cache is disabled if not set).
+        cache_max_bytes:    The maximum size of the cache in bytes (defaults to 50 GB).
+        cache_link_mode:    One of "copy", "hardlink" or "symlink" (defaults to "copy").
+
+    Returns:
+        The DataCache for the cache_dir or None if no cache_dir is configured.
+        The same DataCache object is returned for the same cache_dir within a process
+        so the hit/miss statistics accumulate across project builds.
+    """
+
+    cache_dir = project_options.get("cache_dir")
+    if not cache_dir:
+        return None
+    cache_dir = os.path.abspath(cache_dir)
+    max_bytes = int(project_options.get("cache_max_bytes", DEFAULT_MAX_BYTES))
+    link_mode = project_options.get("cache_link_mode", "copy")
+    with _CACHES_LOCK:
+        cache = _CACHES.get(cache_dir)
+        if cache is None:
+            cache = DataCache(cache_dir, max_bytes=max_bytes, link_mode=link_mode)
+            _CACHES[cache_dir] = cache
+        else:
+            cache.max_bytes = max_bytes
+            cache.link_mode = link_mode
+    return cache
+
+
+def link_or_copy(source_path: str, target_path: str, link_mode: str = "hardlink"):
+    """
+    Create target_path with the same contents as source_path.
+
+    Parameters:
+        source_path:    The path of an existing file.
+        target_path:    The path of the file to be created (replaced if it exists).
+        link_mode:      One of "copy", "hardlink" or "symlink".
+
+    A hardlink or symlink falls back to a copy if the file system does not support links.
+    Returns:
+        The link_mode that was actually used.
+    """
+
+    if link_mode not in LINK_MODES:
+        raise ValueError(
+            f"Unsupported link mode '{link_mode}'. Must be one of {', '.join(LINK_MODES)}."
+        )
+    if os.path.abspath(source_path) == os.path.abspath(target_path):
+        return link_mode
+    if os.path.lexists(target_path):
+        os.remove(target_path)
+    try:
+        if link_mode == "hardlink":
+            os.link(source_path, target_path)
+            return link_mode
+        if link_mode == "symlink":
+            os.symlink(os.path.abspath(source_path), target_path)
+            return link_mode
+    except OSError:
+        pass
+    shutil.copyfile(source_path, target_path)
+    return "copy"
+
+
+class DataCache:
+    """
+    A size bounded LRU cache of files and arrays stored in a local directory.
+
+    The cache directory contains:
+        objects/    The cached file contents named by the sha256 of the content.
+        entries/    A json file for each cached request with the files, the result and last access time.
+        links/      A list of the symlinks to each object put into projects in symlink mode.
+        lock        The file locked by the processes using the cache_dir.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        link_mode: str = "copy",
+    ):
+        if link_mode not in LINK_MODES:
+            raise ValueError(
+                f"Unsupported cache link mode '{link_mode}'. Must be one of {', '.join(LINK_MODES)}."
+            )
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = int(max_bytes)
+        self.link_mode = link_mode
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.RLock()
+        # The (path, size, mtime_ns) of the objects whose sha256 was checked by this process
+        self._verified = set()
+        os.makedirs(self._objects_dir(), exist_ok=True)
+        os.makedirs(self._entries_dir(), exist_ok=True)
+        os.makedirs(self._links_dir(), exist_ok=True)
+
+    @staticmethod
+    def make_key(request: dict) -> str:
+        """
+        Get the cache key of a request.
+
+        Parameters:
+            request:    A dict of the options that identify the downloaded data.
+        Returns:
+            The sha256 hex digest of the normalized request options.
+        """
+
+        normalized = json.dumps(_normalize(request), sort_keys=True, default=str)
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def fetch_files(self, request: dict, write_dir: str, fetch):
+        """
+        Get the files of a request from the cache or call fetch to create them.
+
+        Parameters:
+            request:    A dict of the options that identify the downloaded data.
+            write_dir:  The directory where fetch writes the files.
+            fetch:      A function with no arguments that writes the files into write_dir.
+        Returns:
+            The value returned by fetch. On a cache hit the value returned by the original
+            fetch is returned with the paths relocated to write_dir.
+
+        The files written by fetch are found by comparing the contents of write_dir
+        before and after the call.
+        """
+
+        write_dir = os.path.abspath(write_dir)
+        key = self.make_key(request)
+        with self._lock, self._dir_lock(shared=True):
+            entry = self._read_entry(key)
+            if entry is not None and self._restore_files(entry, write_dir):
+                self.hits += 1
+                self._touch(key, entry)
+                return absolutize_paths(entry.get("result"), write_dir)
+            self.misses += 1
+
+        os.makedirs(write_dir, exist_ok=True)
+        before = snapshot_files(write_dir)
+        result = fetch()
+        after = snapshot_files(write_dir)
+        created = sorted(
+            name for name, stat in after.items() if before.get(name) != stat
+        )
+
+        with self._lock, self._dir_lock():
+            files = {}
+            for name in created:
+                files[name] = self._store_object(os.path.join(write_dir, name))
+            entry = {
+                "request": _normalize(request),
+                "files": files,
+                "result": relativize_paths(result, write_dir),
+                "last_access": time.time(),
+            }
+            self._write_entry(key, entry)
+            self._evict()
+        return result
+
+    def fetch_array(self, request: dict, fetch):
+        """
+        Get a numpy array of a request from the cache or call fetch to get it.
+
+        Parameters:
+            request:    A dict of the options that identify the downloaded data.
+            fetch:      A function with no arguments that returns a numpy array.
+        Returns:
+            The numpy array.
+        """
+
+        # pylint: disable=C0415
+        import numpy as np
+
+        key = self.make_key(request)
+        with self._lock, self._dir_lock(shared=True):
+            entry = self._read_entry(key)
+            if entry is not None and self._is_intact(entry["files"]["array.npy"]):
+                self.hits += 1
+                self._touch(key, entry)
+                return np.load(self._object_path(entry["files"]["array.npy"]["sha256"]))
+            self.misses += 1
+
+        data = fetch()
+
+        with self._lock, self._dir_lock():
+            tmp_path = os.path.join(
+                self._objects_dir(), f".{key}.{threading.get_ident()}.npy"
+            )
+            np.save(tmp_path, data)
+            try:
+                files = {"array.npy": self._store_object(tmp_path)}
+            finally:
+                os.remove(tmp_path)
+            entry = {
+                "request": _normalize(request),
+                "files": files,
+                "result": None,
+                "last_access": time.time(),
+            }
+            self._write_entry(key, entry)
+            self._evict()
+        return data
+
+    def stats(self) -> dict:
+        """
+        Get the statistics of the cache.
+        Returns:
+            A dict with hits, misses, evictions, entries and bytes of the cache.
+        """
+
+        with self._lock, self._dir_lock(shared=True):
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entry_keys()),
+                "bytes": self._total_bytes(),
+            }
+
+    def clear(self):
+        """Remove all the entries and files from the cache."""
+
+        with self._lock, self._dir_lock():
+            shutil.rmtree(self._entries_dir(), ignore_errors=True)
+            shutil.rmtree(self._objects_dir(), ignore_errors=True)
+            shutil.rmtree(self._links_dir(), ignore_errors=True)
+            self._verified.clear()
+            os.makedirs(self._objects_dir(), exist_ok=True)
+            os.makedirs(self._entries_dir(), exist_ok=True)
+            os.makedirs(self._links_dir(), exist_ok=True)
+
+    def _restore_files(self, entry: dict, write_dir: str) -> bool:
+        """Put the files of the cache entry into write_dir. Returns False if the entry is damaged."""
+
+        for file_entry in entry["files"].values():
+            if not self._is_intact(file_entry):
+                return False
+        os.makedirs(write_dir, exist_ok=True)
+        for name, file_entry in entry["files"].items():
+            target_path = os.path.join(write_dir, name)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            used_mode = link_or_copy(
+                self._object_path(file_entry["sha256"]), target_path, self.link_mode
+            )
+            if used_mode == "symlink":
+                self._add_link(file_entry["sha256"], target_path)
+        return True
+
+    def _is_intact(self, file_entry: dict) -> bool:
+        """
+        Returns True if the object of the file entry exists with the recorded size and sha256.
+
+        The sha256 is only computed the first time the object is used by this process or
+        if its size or modification time changed since it was checked. A damaged object is removed.
+        """
+
+        object_path = self._object_path(file_entry["sha256"])
+        try:
+            stat = os.stat(object_path)
+        except FileNotFoundError:
+            return False
+        if stat.st_size != file_entry["size"]:
+            return False
+        verified = (object_path, stat.st_size, stat.st_mtime_ns)
+        if verified in self._verified:
+            return True
+        if file_sha256(object_path) != file_entry["sha256"]:
+            os.remove(object_path)
+            return False
+        self._verified.add(verified)
+        return True
+
+    def _store_object(self, path: str) -> dict:
+        """Store the file at path in the objects directory. Returns the file entry."""
+
+        sha256 = file_sha256(path)
+        object_path = self._object_path(sha256)
+        size = os.path.getsize(path)
+        file_entry = {"sha256": sha256, "size": size}
+        if not self._is_intact(file_entry):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            tmp_path = f"{object_path}.{threading.get_ident()}.tmp"
+            shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, object_path)
+        return file_entry
+
+    def _evict(self):
+        """
+        Remove least recently used entries until the cache is smaller than max_bytes.
+        The objects that are still the target of a symlink of a project are kept and do not count.
+        """
+
+        linked = {sha256 for sha256, _ in self._object_paths() if self._is_linked(sha256)}
+        total_bytes = sum(
+            _file_size(object_path)
+            for sha256, object_path in self._object_paths()
+            if sha256 not in linked
+        )
+        if total_bytes <= self.max_bytes:
+            return
+        entries = []
+        for key in self._entry_keys():
+            entry = self._read_entry(key)
+            if entry is not None:
+                entries.append((entry.get("last_access", 0), key, entry))
+        entries.sort(key=lambda item: item[0])
+        while entries and total_bytes > self.max_bytes:
+            _, key, _ = entries.pop(0)
+            try:
+                os.remove(self._entry_path(key))
+                self.evictions += 1
+            except FileNotFoundError:
+                # The entry was already evicted by another cache of the cache_dir
+                pass
+            referenced = set(linked)
+            for _, _, entry in entries:
+                referenced.update(f["sha256"] for f in entry["files"].values())
+            for sha256, object_path in self._object_paths():
+                if sha256 not in referenced:
+                    total_bytes -= _file_size(object_path)
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(object_path)
+
+    def _add_link(self, sha256: str, link_path: str):
+        """Record that link_path is a symlink to the object of sha256."""
+
+        with open(self._links_path(sha256), "a", encoding="utf-8") as stream:
+            stream.write(os.path.abspath(link_path) + "\n")
+
+    def _is_linked(self, sha256: str) -> bool:
+        """
+        Returns True if a recorded symlink still points to the object of sha256.
+        The symlinks that were removed or replaced are forgotten.
+        """
+
+        links_path = self._links_path(sha256)
+        if not os.path.exists(links_path):
+            return False
+        object_path = os.path.realpath(self._object_path(sha256))
+        with open(links_path, "r", encoding="utf-8") as stream:
+            links = {
+                path
+                for path in stream.read().splitlines()
+                if os.path.islink(path) and os.path.realpath(path) == object_path
+            }
+        if not links:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(links_path)
+            return False
+        tmp_path = f"{links_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as stream:
+            stream.writelines(f"{path}\n" for path in sorted(links))
+        os.replace(tmp_path, links_path)
+        return True
+
+    def _touch(self, key: str, entry: dict):
+        entry["last_access"] = time.time()
+        self._write_entry(key, entry)
+
+    def _total_bytes(self) -> int:
+        return sum(_file_size(path) for _, path in self._object_paths())
+
+    @contextlib.contextmanager
+    def _dir_lock(self, shared: bool = False):
+        """Lock the cache_dir for the processes using it (shared for reading the files of an entry)."""
+
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.cache_dir, "lock"), "a", encoding="utf-8") as stream:
+            fcntl.flock(stream, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(stream, fcntl.LOCK_UN)
+
+    def _object_paths(self):
+        objects_dir = self._objects_dir()
+        for prefix in os.listdir(objects_dir):
+            prefix_dir = os.path.join(objects_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                if not name.endswith(".tmp"):
+                    yield name, os.path.join(prefix_dir, name)
+
+    def _entry_keys(self):
+        return [
+            name[: -len(".json")]
+            for name in os.listdir(self._entries_dir())
+            if name.endswith(".json")
+        ]
+
+    def _read_entry(self, key: str):
+        path = self._entry_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as stream:
+                return json.load(stream)
+        except (OSError, ValueError):
+            return None
+
+    def _write_entry(self, key: str, entry: dict):
+        path = self._entry_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as stream:
+            json.dump(entry, stream, indent=1)
+        os.replace(tmp_path, path)
+
+    def _object_path(self, sha256: str) -> str:
+        return os.path.join(self._objects_dir(), sha256[0:2], sha256)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self._entries_dir(), f"{key}.json")
+
+    def _links_path(self, sha256: str) -> str:
+        return os.path.join(self._links_dir(), f"{sha256}.txt")
+
+    def _objects_dir(self) -> str:
+        return os.path.join(self.cache_dir, "objects")
+
+    def _entries_dir(self) -> str:
+        return os.path.join(self.cache_dir, "entries")
+
+    def _links_dir(self) -> str:
+        return os.path.join(self.cache_dir, "links")
+
+
+def file_sha256(path: str) -> str:
+    """Get the sha256 hex digest of the content of the file at path."""
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as stream:
+        for block in iter(lambda: stream.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _file_size(path: str) -> int:
+    """Get the size of the file at path (0 if it was removed by another process)."""
+
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+def snapshot_files(directory_path: str) -> dict:
+    """
+    Get the size and modification time of every file below directory_path.
+    Returns:
+        A dict of (size, mtime_ns) by the path of the file relative to directory_path
+    """
+
+    result = {}
+    for root, _, names in os.walk(directory_path):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # The file was removed by a concurrent stage since the directory was listed
+                continue
+            result[os.path.relpath(path, directory_path)] = (
+                stat.st_size,
+                stat.st_mtime_ns,
+            )
+    return result
+
+
+def _normalize(value):
+    """Convert a request value into a json value that does not depend on the python type used."""
+
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if hasattr(value, "tolist"):
+        return _normalize(value.tolist())
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def relativize_paths(value, write_dir: str):
+    """Replace paths in write_dir in a fetch result with paths relative to write_dir."""
+
+    if isinstance(value, dict):
+        return {k: relativize_paths(v, write_dir) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [relativize_paths(v, write_dir) for v in value]
+    if isinstance(value, str) and os.path.isabs(value):
+        if os.path.abspath(value).startswith(write_dir + os.sep):
+            return {"__relpath__": os.path.relpath(value, write_dir)}
+    return _normalize(value)
+
+
+def absolutize_paths(value, write_dir: str):
+    """Replace the relative paths of a cached fetch result with paths in write_dir."""
+
+    if isinstance(value, dict):
+        if list(value.keys()) == ["__relpath__"]:
+            return os.path.join(write_dir, value["__relpath__"])
+        return {k: absolutize_paths(v, write_dir) for k, v in value.items()}
+    if isinstance(value, list):
+        return [absolutize_paths(v, write_dir) for v in value]
+    return value
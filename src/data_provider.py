@@ -0,0 +1,370 @@
+"""
+Data providers of the static, CLM and forcing inputs of a parflow project.
+
+The stages of create_project get their input data from a provider selected by the
+data_provider key of the project options:
+
+    hydrodata:  Get the data from the hf_hydrodata service using subsettools (the default).
+    local:      Read the data from a local mirror of the full CONUS files in data_mirror_dir.
+
+The local provider memory maps each full CONUS pfb file and reads only the bytes of the
+subgrids that overlap the ij_bounds window (NetCDF files are read as a hyperslab of the window),
+so no full domain array is loaded and a project build is only local disk I/O.
+The files written into the project directory are the same as the files written by subsettools.
+
+The local mirror has the layout:
+
+    <data_mirror_dir>/<dataset>/<variable>.pfb                 Full CONUS static variables (or <variable>.nc)
+                                                                 for example conus2_domain/slope_x.pfb
+    <data_mirror_dir>/<dataset>/clm_run.pfb                      The gridded vegm land cover used by config_clm
+    <data_mirror_dir>/<dataset>/drv_vegp.dat, drv_clmin.dat      The CLM template driver files
+    <data_mirror_dir>/<dataset>/WY<water_year>/<dataset>.<VAR>.<hours>.pfb
+                                                                 Full CONUS hourly forcing files of 24 hours per day
+                                                                 of the water year, for example
+                                                                 CW3E/WY2006/CW3E.APCP.000001_to_000024.pfb
+"""
+
+# pylint: disable = C0301,R0913
+import os
+import shutil
+import datetime
+import lazy_import
+import pf_outputs
+
+np = lazy_import.LazyModule("numpy")
+parflow = lazy_import.LazyModule("parflow")
+
+PROVIDERS = ["hydrodata", "local"]
+
+# The file names of the CW3E forcing variables
+FORCING_DATASET_VARS = {
+    "downward_shortwave": "DSWR",
+    "precipitation": "APCP",
+    "downward_longwave": "DLWR",
+    "specific_humidity": "SPFH",
+    "air_temp": "Temp",
+    "atmospheric_pressure": "Press",
+    "east_windspeed": "UGRD",
+    "north_windspeed": "VGRD",
+}
+
+# The header of the drv_vegm.dat file of the land cover
+VEGM_HEADING = "x y lat lon sand clay color fractional coverage of grid, by vegetation class (Must/Should Add to 1.0) "
+VEGM_COLUMN_NAMES = ["", "", "(Deg)", "(Deg)", "(%/100)", "", "index"] + [str(i) for i in range(1, 19)]
+
+STATIC_VARIABLES = (
+    "slope_x",
+    "slope_y",
+    "pf_indicator",
+    "mannings",
+    "pf_flowbarrier",
+    "pme",
+    "ss_pressure_head",
+)
+
+
+def get_provider(project_options: dict, st, hf):
+    """
+    Get the data provider configured by the project options.
+
+    Parameters:
+        project_options:    A dict of options passed to project.create_project.
+        st, hf:             The subsettools and hf_hydrodata modules used by the hydrodata provider.
+
+    The project_options dict supports the keys:
+        data_provider:      Either "hydrodata" or "local" (defaults to "hydrodata").
+        data_mirror_dir:    The directory of the local mirror (required for the local provider).
+    Returns:
+        A HydrodataProvider or LocalMirrorProvider.
+    """
+
+    provider = project_options.get("data_provider") or "hydrodata"
+    if provider == "hydrodata":
+        return HydrodataProvider(st, hf, project_options.get("grid", "conus2"))
+    if provider == "local":
+        mirror_dir = project_options.get("data_mirror_dir")
+        if not mirror_dir:
+            raise ValueError("The data_mirror_dir option is required for the local data_provider.")
+        return LocalMirrorProvider(mirror_dir)
+    raise ValueError(
+        f"Unsupported data_provider '{provider}'. Must be one of {PROVIDERS}."
+    )
+
+
+class HydrodataProvider:
+    """
+    Get the project inputs from the hf_hydrodata service using subsettools.
+
+    Parameters:
+        st:     The subsettools module.
+        hf:     The hf_hydrodata module.
+        grid:   The grid of the forcing files (defaults to conus2).
+    """
+
+    name = "hydrodata"
+
+    def __init__(self, st, hf, grid: str = "conus2"):
+        self.st = st
+        self.hf = hf
+        self.grid = grid
+
+    @property
+    def identity(self) -> str:
+        """The name of the source of the data used in the cache keys of the requests."""
+
+        return self.name
+
+    def event_name(self, method: str) -> str:
+        """Get the name of the instrumentation event of a method of the provider."""
+
+        return f"hf.{method}" if method.startswith("get_") else f"st.{method}"
+
+    def subset_static(self, ij_bounds, dataset: str, write_dir: str):
+        """Write the static pfb files of the ij_bounds. Returns a dict of the file paths by variable."""
+
+        return self.st.subset_static(ij_bounds, dataset=dataset, write_dir=write_dir)
+
+    def config_clm(self, ij_bounds, start: str, end: str, dataset: str, write_dir: str):
+        """Write the CLM driver files of the ij_bounds and dates. Returns a dict of the file paths."""
+
+        return self.st.config_clm(
+            ij_bounds, start=start, end=end, dataset=dataset, write_dir=write_dir
+        )
+
+    def subset_forcing(self, ij_bounds, start: str, end: str, dataset: str, write_dir: str):
+        """Write one hourly forcing pfb file per day per variable. Returns a dict of the file paths by variable."""
+
+        return self.st.subset_forcing(
+            ij_bounds, grid=self.grid, start=start, end=end, dataset=dataset, write_dir=write_dir
+        )
+
+    def get_catalog_entry(self, options: dict):
+        """Get the catalog entry of the hf_hydrodata options."""
+
+        return self.hf.get_catalog_entry(options)
+
+    def get_gridded_data(self, options: dict):
+        """Get the array of the hf_hydrodata options."""
+
+        return self.hf.get_gridded_data(options)
+
+
+class LocalMirrorProvider:
+    """
+    Get the project inputs from a local mirror of the full CONUS files by memory mapping.
+
+    Parameters:
+        mirror_dir:     The directory of the local mirror (see the module documentation for the layout).
+    """
+
+    name = "local"
+
+    def __init__(self, mirror_dir: str):
+        self.mirror_dir = os.path.abspath(mirror_dir)
+        if not os.path.isdir(self.mirror_dir):
+            raise FileNotFoundError(f"The data_mirror_dir '{mirror_dir}' does not exist.")
+
+    @property
+    def identity(self) -> str:
+        """The name of the source of the data used in the cache keys of the requests."""
+
+        return f"{self.name}:{self.mirror_dir}"
+
+    def event_name(self, method: str) -> str:
+        """Get the name of the instrumentation event of a method of the provider."""
+
+        return f"local.{method}"
+
+    def subset_static(self, ij_bounds, dataset: str, write_dir: str):
+        """Write the static pfb files of the ij_bounds. Returns a dict of the file paths by variable."""
+
+        file_paths = {}
+        for var in STATIC_VARIABLES:
+            subset_data = self.read_window(self._dataset_path(dataset, var), ij_bounds)
+            file_path = os.path.join(write_dir, f"{var}.pfb")
+            parflow.write_pfb(file_path, subset_data, dist=False)
+            file_paths[var] = file_path
+        return file_paths
+
+    def config_clm(self, ij_bounds, start: str, end: str, dataset: str, write_dir: str):
+        """Write the CLM driver files of the ij_bounds and dates. Returns a dict of the file paths."""
+
+        file_paths = {}
+        vegp_path = os.path.join(write_dir, "drv_vegp.dat")
+        shutil.copyfile(self._dataset_path(dataset, "drv_vegp", ".dat"), vegp_path)
+        file_paths["vegp"] = vegp_path
+        land_cover = self.read_window(self._dataset_path(dataset, "clm_run"), ij_bounds)
+        file_paths["pfb"] = _write_vegm(land_cover, os.path.join(write_dir, "drv_vegm.dat"))
+        clmin_path = os.path.join(write_dir, "drv_clmin.dat")
+        _write_drv_clmin(
+            self._dataset_path(dataset, "drv_clmin", ".dat"), clmin_path, start, end
+        )
+        file_paths["drv_clm"] = clmin_path
+        return file_paths
+
+    def subset_forcing(self, ij_bounds, start: str, end: str, dataset: str, write_dir: str):
+        """Write one hourly forcing pfb file per day per variable. Returns a dict of the file paths by variable."""
+
+        start_dt = datetime.datetime.strptime(start, "%Y-%m-%d")
+        days = (datetime.datetime.strptime(end, "%Y-%m-%d") - start_dt).days
+        outputs = {}
+        for variable, dataset_var in FORCING_DATASET_VARS.items():
+            outputs[variable] = []
+            for day in range(1, days + 1):
+                date = start_dt + datetime.timedelta(days=day - 1)
+                data = self.read_window(self._forcing_path(dataset, dataset_var, date), ij_bounds)
+                path = os.path.join(
+                    write_dir, f"{dataset}.{dataset_var}.{day * 24 - 23:06d}_to_{day * 24:06d}.pfb"
+                )
+                parflow.write_pfb(path, data, dist=False)
+                outputs[variable].append(path)
+        return outputs
+
+    def get_catalog_entry(self, options: dict):
+        """Get the catalog entry of a forcing variable."""
+
+        return {
+            "dataset": options.get("dataset"),
+            "variable": options.get("variable"),
+            "dataset_var": FORCING_DATASET_VARS.get(options.get("variable")),
+        }
+
+    def get_gridded_data(self, options: dict):
+        """
+        Get the array of the options from the mirror.
+
+        Static variables are read from the static files. Daily forcing is the sum
+        (for precipitation) or the mean of the 24 hours of the hourly forcing file of the day.
+        """
+
+        dataset = options["dataset"]
+        variable = options["variable"]
+        ij_bounds = options["grid_bounds"]
+        if options.get("temporal_resolution", "static") == "static":
+            return self.read_window(self._dataset_path(dataset, variable), ij_bounds)
+        date = datetime.datetime.strptime(options["start_time"][0:10], "%Y-%m-%d")
+        hourly = self.read_window(
+            self._forcing_path(dataset, FORCING_DATASET_VARS[variable], date), ij_bounds
+        )
+        if options.get("temporal_resolution") == "hourly":
+            return hourly
+        if options.get("aggregation") == "sum":
+            return hourly.sum(axis=0, keepdims=True)
+        return hourly.mean(axis=0, keepdims=True)
+
+    def read_window(self, path: str, ij_bounds):
+        """
+        Read the ij_bounds window of all the z layers of a full CONUS pfb or NetCDF file.
+        Returns:
+            A numpy array of shape (nz, jmax - jmin, imax - imin).
+        """
+
+        imin, jmin, imax, jmax = [int(v) for v in ij_bounds]
+        if path.endswith(".nc"):
+            # pylint: disable=C0415
+            import netCDF4
+
+            with netCDF4.Dataset(path, "r") as dataset:
+                name = os.path.splitext(os.path.basename(path))[0]
+                variable = dataset.variables[name] if name in dataset.variables else _data_variable(dataset)
+                window = np.asarray(variable[..., jmin:jmax, imin:imax], dtype=np.float64)
+            return window.reshape((-1,) + window.shape[-2:])
+        layout = pf_outputs.PfbLayout(path)
+        nz, ny, nx = layout.shape
+        if imin < 0 or jmin < 0 or imax > nx or jmax > ny:
+            raise ValueError(f"The ij_bounds {list(ij_bounds)} are outside the grid {nx}x{ny} of '{path}'.")
+        return layout.read(np.arange(nz), np.arange(jmin, jmax), np.arange(imin, imax))
+
+    def _dataset_path(self, dataset: str, variable: str, extension: str = None):
+        """Get the path of a file of the dataset in the mirror (a pfb or NetCDF file if no extension)."""
+
+        extensions = [extension] if extension else [".pfb", ".nc"]
+        for ext in extensions:
+            path = os.path.join(self.mirror_dir, dataset, f"{variable}{ext}")
+            if os.path.exists(path):
+                return path
+        raise FileNotFoundError(
+            f"No file for variable '{variable}' of dataset '{dataset}' in the data_mirror_dir '{self.mirror_dir}'."
+        )
+
+    def _forcing_path(self, dataset: str, dataset_var: str, date: datetime.datetime):
+        """Get the path of the hourly forcing file of the date in the water year directory of the mirror."""
+
+        water_year = date.year + 1 if date.month >= 10 else date.year
+        day = (date - datetime.datetime(water_year - 1, 10, 1)).days + 1
+        path = os.path.join(
+            self.mirror_dir,
+            dataset,
+            f"WY{water_year}",
+            f"{dataset}.{dataset_var}.{day * 24 - 23:06d}_to_{day * 24:06d}.pfb",
+        )
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"No forcing file '{os.path.basename(path)}' for {date:%Y-%m-%d} in the data_mirror_dir '{self.mirror_dir}'."
+            )
+        return path
+
+
+def _write_vegm(land_cover, path: str) -> str:
+    """
+    Write the land cover window (nz, ny, nx) in the drv_vegm.dat format of subsettools.config_clm.
+    Each row has the 1-based x and y of a cell followed by the nz land cover values of the cell.
+    Returns:
+        The path of the file.
+    """
+
+    _, ny, nx = land_cover.shape
+    indices = np.indices((ny, nx))[::-1] + 1
+    rows = np.vstack([indices, land_cover]).transpose(1, 2, 0).reshape(ny * nx, -1)
+    header = "\n".join([VEGM_HEADING, " ".join(VEGM_COLUMN_NAMES)])
+    np.savetxt(
+        fname=path,
+        X=rows,
+        delimiter=" ",
+        comments="",
+        header=header,
+        fmt=["%d"] * 2 + ["%.6f"] * 2 + ["%.2f"] * 2 + ["%d"] * (rows.shape[1] - 6),
+    )
+    return path
+
+
+def _write_drv_clmin(template_path: str, path: str, start: str, end: str):
+    """
+    Write the drv_clmin.dat template with the vegm and vegp file names, a defined start
+    and the start and end hours of the run (end is exclusive) as subsettools.config_clm.
+    """
+
+    start_dt = datetime.datetime.strptime(start, "%Y-%m-%d")
+    end_dt = datetime.datetime.strptime(end, "%Y-%m-%d") - datetime.timedelta(hours=1)
+    values = {
+        "vegtf": ("drv_vegm.dat", "Vegetation Tile Specification File"),
+        "vegpf": ("drv_vegp.dat", "Vegetation Type Parameter"),
+        "startcode": (2, "1=restart file, 2=defined"),
+        "clm_ic": (2, "1=restart file, 2=defined"),
+        "shr": (start_dt.hour, "Starting Hour"),
+        "sda": (start_dt.day, "Starting Day"),
+        "smo": (start_dt.month, "Starting Month"),
+        "syr": (start_dt.year, "Starting Year"),
+        "ehr": (end_dt.hour, "Ending Hour"),
+        "eda": (end_dt.day, "Ending Day"),
+        "emo": (end_dt.month, "Ending Month"),
+        "eyr": (end_dt.year, "Ending Year"),
+    }
+    with open(template_path, "r", encoding="utf-8") as stream:
+        lines = stream.readlines()
+    for i, line in enumerate(lines):
+        key = line.split()[0] if line.split() else None
+        if key in values:
+            value, comment = values[key]
+            lines[i] = f"{key:<15}{value!s:<37} {comment}\n"
+    with open(path, "w", encoding="utf-8") as stream:
+        stream.writelines(lines)
+
+
+def _data_variable(dataset):
+    """Get the first variable of a NetCDF dataset with at least 2 dimensions."""
+
+    for variable in dataset.variables.values():
+        if len(variable.dimensions) >= 2:
+            return variable
+    raise ValueError(f"No gridded variable in '{dataset.filepath()}'.")
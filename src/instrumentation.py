@@ -0,0 +1,321 @@
+"""
+Instrumentation of the stages of create_project and of the external calls they make.
+
+Each stage (runscript, topology, mask, static, clm, forcing, dist, ...) and each call to
+subsettools, hf_hydrodata and parflow (st.subset_static, st.config_clm, st.subset_forcing,
+hf.get_gridded_data, parflow.write_pfb, st.dist_run, ...) is a span that emits a start and
+an end event to the listeners of an Instrumentation. An event is a dict with the keys:
+
+    event:          "start" or "end"
+    id, parent:     The id of the span and of the enclosing span of the same thread (or None).
+    name, kind:     The name of the stage or call and the kind "stage" or "call".
+    thread:         The name of the thread running the span.
+    time:           The seconds since the Instrumentation was created.
+    duration:       The seconds of the span (end events only).
+    bytes_in:       The bytes of the arrays returned by the call (end events only).
+    bytes_out:      The bytes of the files written in the directory of the span (end events only).
+    files_out:      The number of files written in the directory of the span (end events only).
+    status, error:  "ok" or "error" and the error message (end events only).
+
+Any other attributes set on a span (for example skipped) are added to its end event.
+A listener is any callable taking the event dict. The TimelineCollector listener keeps
+the events and writes a timeline report.
+
+When profile is "cprofile" or "tracemalloc" each stage is profiled and the profile
+is written to the profile_dir as <stage>.prof or <stage>.tracemalloc.txt.
+
+Example:
+
+.. code-block:: python
+
+    collector = instrumentation.TimelineCollector()
+    events = instrumentation.Instrumentation([collector], profile="cprofile", profile_dir="./profiles")
+    with events.span("static", kind="stage", directory_path=directory_path):
+        events.call("st.subset_static", lambda: st.subset_static(...), directory_path=directory_path)
+    collector.write("./timeline.json")
+"""
+
+# pylint: disable = C0301,R0902,R0913
+import os
+import json
+import time
+import itertools
+import threading
+import contextlib
+import cProfile
+import tracemalloc
+import data_cache
+
+PROFILE_MODES = ["cprofile", "tracemalloc"]
+TIMELINE_FILE_NAME = "project_timeline.json"
+PROFILE_DIR_NAME = "profiles"
+
+
+class Span:
+    """
+    A stage or call being measured. Attributes set with set() are added to the end event.
+    """
+
+    def __init__(self, span_id: int, parent, name: str, kind: str, directory_path: str):
+        self.id = span_id
+        self.parent = parent
+        self.name = name
+        self.kind = kind
+        self.directory_path = directory_path
+        self.bytes_in = 0
+        self.attributes = {}
+
+    def set(self, **attributes):
+        """Set attributes added to the end event of the span."""
+
+        self.attributes.update(attributes)
+
+    def add_bytes_in(self, value):
+        """Add the bytes of an array (or a number of bytes) received by the span."""
+
+        self.bytes_in += int(getattr(value, "nbytes", value) or 0)
+
+
+class Instrumentation:
+    """
+    Emits the start and end events of spans to listeners and optionally profiles the stages.
+
+    Parameters:
+        listeners:      Callables called with each event dict.
+        profile:        None, "cprofile" or "tracemalloc" to profile each stage.
+        profile_dir:    The directory of the profiles (required if profile is set).
+    """
+
+    def __init__(self, listeners=(), profile: str = None, profile_dir: str = None):
+        if profile and profile not in PROFILE_MODES:
+            raise ValueError(
+                f"Unsupported profile '{profile}'. Must be one of {PROFILE_MODES}."
+            )
+        if profile and not profile_dir:
+            raise ValueError("A profile_dir is required to profile the stages.")
+        self.listeners = list(listeners)
+        self.profile = profile
+        self.profile_dir = profile_dir
+        self._start = time.perf_counter()
+        self._ids = itertools.count(1)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._profiling = False
+
+    @property
+    def enabled(self) -> bool:
+        """True if there are listeners or the stages are profiled."""
+
+        return bool(self.listeners) or bool(self.profile)
+
+    def add_listener(self, listener):
+        """Add a callable called with each event dict."""
+
+        self.listeners.append(listener)
+
+    @contextlib.contextmanager
+    def span(self, name: str, kind: str = "call", directory_path: str = None):
+        """
+        A context manager that measures the enclosed code as a span.
+
+        Parameters:
+            name:           The name of the stage or call.
+            kind:           Either "stage" or "call".
+            directory_path: The directory in which the bytes and files written are measured (optional).
+        Yields:
+            The Span to set attributes of the end event.
+        """
+
+        if not self.enabled:
+            yield Span(0, None, name, kind, directory_path)
+            return
+        stack = self._stack()
+        span = Span(
+            next(self._ids), stack[-1].id if stack else None, name, kind, directory_path
+        )
+        before = data_cache.snapshot_files(directory_path) if directory_path else {}
+        profiler = self._start_profile(span)
+        stack.append(span)
+        start = time.perf_counter()
+        self._emit(span, "start", {"time": start - self._start})
+        status = "ok"
+        error = None
+        try:
+            yield span
+        except BaseException as e:
+            status = "error"
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            end = time.perf_counter()
+            stack.pop()
+            bytes_out = 0
+            files_out = 0
+            if directory_path:
+                for path, stat in data_cache.snapshot_files(directory_path).items():
+                    if before.get(path) != stat:
+                        bytes_out += stat[0]
+                        files_out += 1
+            self._stop_profile(span, profiler)
+            self._emit(
+                span,
+                "end",
+                {
+                    "time": end - self._start,
+                    "duration": end - start,
+                    "bytes_in": span.bytes_in,
+                    "bytes_out": bytes_out,
+                    "files_out": files_out,
+                    "status": status,
+                    "error": error,
+                    **span.attributes,
+                },
+            )
+
+    def call(self, name: str, function, directory_path: str = None):
+        """
+        Call a function with no arguments as a span of kind "call".
+
+        The bytes of a numpy array returned by the function are counted as bytes_in.
+        Returns:
+            The value returned by the function.
+        """
+
+        with self.span(name, "call", directory_path) as span:
+            result = function()
+            if hasattr(result, "nbytes"):
+                span.add_bytes_in(result)
+            return result
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _emit(self, span: Span, event: str, values: dict):
+        data = {
+            "event": event,
+            "id": span.id,
+            "parent": span.parent,
+            "name": span.name,
+            "kind": span.kind,
+            "thread": threading.current_thread().name,
+            **values,
+        }
+        for listener in self.listeners:
+            listener(data)
+
+    def _start_profile(self, span: Span):
+        """Start profiling a stage unless a stage is already being profiled."""
+
+        if not self.profile or span.kind != "stage":
+            return None
+        with self._lock:
+            if self._profiling:
+                return None
+            self._profiling = True
+        if self.profile == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        return ("tracemalloc", started)
+
+    def _stop_profile(self, span: Span, profiler):
+        """Stop profiling a stage and write the profile to the profile_dir."""
+
+        if profiler is None:
+            return
+        os.makedirs(self.profile_dir, exist_ok=True)
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            path = os.path.join(self.profile_dir, f"{span.name}.prof")
+            profiler.dump_stats(path)
+        else:
+            _, started = profiler
+            _, peak = tracemalloc.get_traced_memory()
+            statistics = tracemalloc.take_snapshot().statistics("lineno")
+            if started:
+                tracemalloc.stop()
+            path = os.path.join(self.profile_dir, f"{span.name}.tracemalloc.txt")
+            with open(path, "w", encoding="utf-8") as stream:
+                stream.write(f"peak traced memory: {peak} bytes\n")
+                for statistic in statistics[0:25]:
+                    stream.write(f"{statistic}\n")
+            span.set(tracemalloc_peak_bytes=peak)
+        span.set(profile_path=path)
+        with self._lock:
+            self._profiling = False
+
+
+class TimelineCollector:
+    """
+    A listener that keeps the events of an Instrumentation and writes a timeline report.
+    """
+
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+
+    def __call__(self, event: dict):
+        with self._lock:
+            self.events.append(event)
+
+    def spans(self):
+        """Get the end events of the completed spans ordered by start time."""
+
+        with self._lock:
+            ended = [event for event in self.events if event["event"] == "end"]
+        for event in ended:
+            event.setdefault("start", event["time"] - event["duration"])
+        return sorted(ended, key=lambda event: event["start"])
+
+    def report(self) -> dict:
+        """
+        Get the timeline report.
+        Returns:
+            A dict with the list of spans and the totals of the stages and calls by name.
+        """
+
+        spans = self.spans()
+        totals = {"stage": {}, "call": {}}
+        for span in spans:
+            total = totals[span["kind"]].setdefault(
+                span["name"],
+                {"count": 0, "seconds": 0.0, "bytes_in": 0, "bytes_out": 0, "files_out": 0},
+            )
+            total["count"] += 1
+            total["seconds"] += span["duration"]
+            total["bytes_in"] += span["bytes_in"]
+            total["bytes_out"] += span["bytes_out"]
+            total["files_out"] += span["files_out"]
+        return {"spans": spans, "stages": totals["stage"], "calls": totals["call"]}
+
+    def format(self) -> str:
+        """Get the timeline as text with one line per span indented below its parent span."""
+
+        spans = self.spans()
+        depth = {}
+        lines = []
+        for span in spans:
+            depth[span["id"]] = depth.get(span["parent"], -1) + 1
+            indent = "  " * depth[span["id"]]
+            lines.append(
+                f"{span['start']:9.3f}s {span['duration']:9.3f}s  {indent}{span['name']:<30} "
+                f"in {span['bytes_in']:>12}  out {span['bytes_out']:>12}  files {span['files_out']:>4}"
+                f"{'  ' + span['status'] if span['status'] != 'ok' else ''}"
+                f"{'  skipped' if span.get('skipped') else ''}"
+            )
+        return "\n".join(lines)
+
+    def write(self, path: str):
+        """Write the timeline report as JSON to path."""
+
+        with open(path, "w", encoding="utf-8") as stream:
+            json.dump(self.report(), stream, indent=2, default=str)
+
+
+DISABLED = Instrumentation()
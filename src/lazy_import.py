@@ -0,0 +1,67 @@
+"""
+Modules that are imported on the first use of one of their attributes.
+
+hf_hydrodata, subsettools, parflow and numpy take most of the time of importing the project
+module. A LazyModule stands for such a module so importing the project module (for example to
+parse the options of the command line) does not import them. The module is imported by
+the first stage that uses it. The modules of the optional features of a project (output_store,
+pfb_dist, pf_segments, output_policy and solver_profiles) are imported the same way.
+
+Example:
+
+.. code-block:: python
+
+    st = lazy_import.LazyModule("subsettools")
+
+    # subsettools is imported here
+    st.write_mask_solid(mask=mask, grid=grid, write_dir=write_dir)
+"""
+
+import importlib
+import threading
+
+
+class LazyModule:
+    """
+    A module imported on the first get, set or delete of one of its attributes.
+
+    The import is protected by a lock because the stages of create_project may run in threads.
+
+    Parameters:
+        name:   The name of the module to import.
+    """
+
+    def __init__(self, name: str):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_module", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _load(self):
+        """Import the module if it is not imported yet and return it."""
+
+        module = object.__getattribute__(self, "_module")
+        if module is None:
+            with object.__getattribute__(self, "_lock"):
+                module = object.__getattribute__(self, "_module")
+                if module is None:
+                    module = importlib.import_module(object.__getattribute__(self, "_name"))
+                    object.__setattr__(self, "_module", module)
+        return module
+
+    @property
+    def loaded(self) -> bool:
+        """True if the module was imported."""
+
+        return object.__getattribute__(self, "_module") is not None
+
+    def __getattr__(self, attribute: str):
+        return getattr(self._load(), attribute)
+
+    def __setattr__(self, attribute: str, value):
+        setattr(self._load(), attribute, value)
+
+    def __delattr__(self, attribute: str):
+        delattr(self._load(), attribute)
+
+    def __repr__(self):
+        return f"<LazyModule '{object.__getattribute__(self, '_name')}'>"
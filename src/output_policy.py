@@ -0,0 +1,301 @@
+"""
+The output policy of a project: which output variables parflow writes, how often each variable
+is kept, how many layers are kept and whether the kept outputs are compressed.
+
+The output_policy option of create_project is a dict:
+
+    variables:      A dict of the output variable to the options of the variable. The variables
+                    not in the dict are not printed by parflow. The options of a variable are:
+                        interval:   Keep the outputs of every interval hours (defaults to the DumpInterval).
+                        top_layers: Keep only this number of top layers of the outputs (optional).
+    complevel:      Consolidate the kept outputs into the compressed netCDF store of the
+                    output_store module with this zlib level and remove the pfb files (optional).
+
+The variables are press, satur, clm_output, evaptrans, overland_sum and velocity (written at
+each dump) and subsurf_data and mask (written once). apply_policy sets the Solver print flags
+of the runscript and the TimingInfo.DumpInterval to the greatest common divisor of the intervals
+so parflow writes the fewest files, then thin_outputs is the post processing stage that removes
+the outputs of the timesteps between the interval of each variable, keeps the top_layers and
+compresses the outputs. thin_outputs may be called while the run is progressing (files still
+being written are skipped) or after each segment of pf_segments.run_segments.
+
+The policy must keep the outputs that the other stages of a run read:
+
+    - A spinup (see pf_spinup) computes the storage from the press, satur, subsurf_data and
+      mask pfb files, so the policy of a spinup must print them without top_layers or complevel.
+    - A segmented run (see pf_segments) restarts each segment from the press output at the
+      stop of the previous segment, so press must be printed without top_layers. thin_outputs
+      never removes the press output at the stop of a segment (nor deletes it when compressing).
+
+apply_policy raises a ValueError for a policy that does not keep these outputs.
+
+Example:
+
+.. code-block:: python
+
+    project_options = {
+        ...
+        "output_policy": {
+            "variables": {
+                "press": {"interval": 24, "top_layers": 1},
+                "satur": {"interval": 24, "top_layers": 1},
+                "clm_output": {"interval": 1},
+            },
+            "complevel": 4,
+        },
+    }
+    runscript_path = project.create_project(project_options, directory_path)
+    model = parflow.Run.from_definition(runscript_path)
+    model.run()
+    output_policy.thin_outputs(os.path.dirname(runscript_path))
+"""
+
+# pylint: disable = C0301,R0914
+import os
+import math
+import json
+import struct
+import pf_outputs
+import output_store
+import pf_segments
+import lazy_import
+
+parflow = lazy_import.LazyModule("parflow")
+
+POLICY_FILE_NAME = "output_policy.json"
+
+# The Solver print flag of each variable of the policy
+PRINT_FLAGS = {
+    "press": "PrintPressure",
+    "satur": "PrintSaturation",
+    "clm_output": "PrintCLM",
+    "evaptrans": "PrintEvapTrans",
+    "overland_sum": "PrintOverlandSum",
+    "velocity": "PrintVelocities",
+    "subsurf_data": "PrintSubsurfData",
+    "mask": "PrintMask",
+}
+
+# The names of the output files written at each dump for each variable of the policy
+DUMP_OUTPUTS = {
+    "press": ["press"],
+    "satur": ["satur"],
+    "clm_output": ["clm_output"],
+    "evaptrans": ["evaptrans"],
+    "overland_sum": ["overlandsum"],
+    "velocity": ["velx", "vely", "velz"],
+}
+
+# The variables that do not have soil layers
+NO_LAYER_VARIABLES = ["clm_output", "overland_sum"]
+
+# The variables read by pf_spinup to compute the storage of each pressure output
+SPINUP_VARIABLES = ["press", "satur", "subsurf_data", "mask"]
+
+
+def apply_policy(
+    model,
+    policy: dict,
+    directory_path: str,
+    run_type: str = "transient",
+    segment_hours: float = None,
+) -> dict:
+    """
+    Set the Solver print flags and the DumpInterval of the model for the output policy.
+
+    The policy with the DumpInterval of the run is saved in output_policy.json in the
+    directory_path to be used by thin_outputs.
+    Parameters:
+        model:          The parflow model of the runscript.
+        policy:         The output_policy dict (see the module documentation).
+        directory_path: The project directory.
+        run_type:       The run_type of the project (a spinup needs the SPINUP_VARIABLES).
+        segment_hours:  The segment_hours of the project if the run is segmented (optional).
+    Returns:
+        The saved policy dict.
+    """
+
+    variables = policy.get("variables", {})
+    unsupported = sorted(set(variables) - set(PRINT_FLAGS))
+    if unsupported:
+        raise ValueError(
+            f"Unsupported output variables {unsupported}. Must be one of {list(PRINT_FLAGS)}."
+        )
+    dump_interval = float(model.TimingInfo.DumpInterval)
+    intervals = []
+    for variable, options in variables.items():
+        options = options or {}
+        interval = options.get("interval")
+        if interval is not None:
+            if variable not in DUMP_OUTPUTS:
+                raise ValueError(f"The output variable '{variable}' is written once and has no interval.")
+            if float(interval) <= 0 or float(interval) != int(float(interval)):
+                raise ValueError(
+                    f"The interval {interval} of '{variable}' must be a positive whole number of hours."
+                )
+            intervals.append(int(float(interval)))
+        if options.get("top_layers") is not None:
+            if variable in NO_LAYER_VARIABLES or variable not in DUMP_OUTPUTS:
+                raise ValueError(f"The output variable '{variable}' has no layers to keep.")
+            if int(options["top_layers"]) <= 0:
+                raise ValueError(f"The top_layers of '{variable}' must be a positive number.")
+    _validate_run(variables, policy, run_type, segment_hours)
+    default_interval = dump_interval
+    if intervals:
+        if len(intervals) < len([v for v in variables if v in DUMP_OUTPUTS]):
+            # The variables without an interval are kept at each DumpInterval of the runscript
+            if dump_interval <= 0 or dump_interval != int(dump_interval):
+                raise ValueError(
+                    f"The DumpInterval {dump_interval:g} must be a positive whole number of hours to use output intervals."
+                )
+            intervals.append(int(dump_interval))
+        dump_interval = float(math.gcd(*intervals))
+        model.TimingInfo.DumpInterval = dump_interval
+
+    for variable, flag in PRINT_FLAGS.items():
+        setattr(model.Solver, flag, variable in variables)
+
+    saved = {
+        "variables": {
+            variable: {
+                "interval": float((options or {}).get("interval") or default_interval),
+                "top_layers": (options or {}).get("top_layers"),
+            }
+            for variable, options in variables.items()
+            if variable in DUMP_OUTPUTS
+        },
+        "complevel": policy.get("complevel"),
+        "dump_interval": dump_interval,
+        "start_time": float(model.TimingInfo.StartTime or 0),
+        "start_count": int(model.TimingInfo.StartCount or 0),
+    }
+    path = os.path.join(directory_path, POLICY_FILE_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as stream:
+        json.dump(saved, stream, indent=1)
+    os.replace(tmp_path, path)
+    return saved
+
+
+def _validate_run(variables: dict, policy: dict, run_type: str, segment_hours: float):
+    """Raise a ValueError if the policy removes outputs needed by a spinup or a segmented run."""
+
+    if run_type == "spinup":
+        missing = [variable for variable in SPINUP_VARIABLES if variable not in variables]
+        if missing:
+            raise ValueError(
+                f"A spinup computes the storage from the {SPINUP_VARIABLES} outputs. Add {missing} to the output_policy variables."
+            )
+        for variable in SPINUP_VARIABLES:
+            if (variables[variable] or {}).get("top_layers") is not None:
+                raise ValueError(f"A spinup reads all the layers of '{variable}'. Remove its top_layers.")
+        if policy.get("complevel") is not None:
+            raise ValueError("A spinup reads the pfb outputs. Remove the complevel of the output_policy.")
+    if run_type == "spinup" or segment_hours:
+        if "press" not in variables:
+            raise ValueError("The segments of the run restart from the press output. Add press to the output_policy variables.")
+        if (variables["press"] or {}).get("top_layers") is not None:
+            raise ValueError("The segments of the run restart from all the layers of the press output. Remove the top_layers of press.")
+
+
+def thin_outputs(directory_path: str, runname: str = None, policy: dict = None) -> dict:
+    """
+    Remove, truncate and compress the output files of a parflow run directory for the output policy.
+
+    The press outputs at the stop of the segments planned by pf_segments are kept.
+
+    Parameters:
+        directory_path: The parflow run directory.
+        runname:        The runname of the output files (defaults to the name of the directory).
+        policy:         The policy saved by apply_policy (defaults to the output_policy.json of the directory).
+    Returns:
+        A dict with the number of files removed and truncated and the timesteps stored by variable.
+    """
+
+    directory_path = os.path.abspath(directory_path)
+    if policy is None:
+        with open(os.path.join(directory_path, POLICY_FILE_NAME), "r", encoding="utf-8") as stream:
+            policy = json.load(stream)
+    outputs = pf_outputs.OutputDataset(directory_path, runname)
+    dump_interval = float(policy["dump_interval"])
+    start_time = float(policy.get("start_time") or 0)
+    start_count = int(policy.get("start_count") or 0)
+    result = {"removed": 0, "truncated": 0, "stored": {}}
+    output_names = []
+    # The restart files of the segments
+    segment_stops = {float(s["stop"]) for s in pf_segments.read_segments(directory_path)}
+    kept_paths = []
+    for variable, options in policy["variables"].items():
+        interval = float(options["interval"])
+        top_layers = options.get("top_layers")
+        if variable == "press" and segment_stops and top_layers:
+            raise ValueError("The segments of the run restart from all the layers of the press output. Remove the top_layers of press.")
+        for name in DUMP_OUTPUTS[variable]:
+            if name not in outputs:
+                continue
+            output_names.append(name)
+            output = outputs[name]
+            for timestep, path in zip(output.timesteps, output.paths):
+                header = _read_header(path)
+                if header is None:
+                    continue
+                time = start_time + (timestep - start_count) * dump_interval
+                if name == "press" and time in segment_stops:
+                    kept_paths.append(path)
+                elif time % interval != 0:
+                    os.remove(path)
+                    result["removed"] += 1
+                elif top_layers and header["nz"] > int(top_layers):
+                    _keep_top_layers(path, header, int(top_layers))
+                    result["truncated"] += 1
+
+    if policy.get("complevel") is not None and output_names:
+        result["stored"] = output_store.consolidate_outputs(
+            directory_path,
+            runname=outputs.runname,
+            variables=output_names,
+            timing={
+                "start_time": start_time,
+                "start_count": start_count,
+                "dump_interval": dump_interval,
+            },
+            complevel=int(policy["complevel"]),
+            delete_source=True,
+            keep_paths=kept_paths,
+        )
+    return result
+
+
+def _read_header(path: str):
+    """Get the header values of a completely written pfb file or None if the file is still being written."""
+
+    try:
+        with open(path, "rb") as stream:
+            values = struct.unpack(
+                pf_outputs.PFB_HEADER_FORMAT, stream.read(pf_outputs.PFB_HEADER_SIZE)
+            )
+    except (OSError, struct.error):
+        return None
+    header = dict(zip(["x", "y", "z", "nx", "ny", "nz", "dx", "dy", "dz"], values[0:9]))
+    if not pf_outputs.is_complete_pfb(path, (header["nz"], header["ny"], header["nx"])):
+        return None
+    return header
+
+
+def _keep_top_layers(path: str, header: dict, top_layers: int):
+    """Replace the pfb file by a file of only its top layers."""
+
+    data = parflow.read_pfb(path)
+    tmp_path = f"{path}.tmp"
+    parflow.write_pfb(
+        tmp_path,
+        data[-top_layers:],
+        x=header["x"],
+        y=header["y"],
+        z=header["z"] + header["dz"] * (header["nz"] - top_layers),
+        dx=header["dx"],
+        dy=header["dy"],
+        dz=header["dz"],
+        dist=False,
+    )
+    os.replace(tmp_path, path)
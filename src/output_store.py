@@ -0,0 +1,153 @@
+"""
+Consolidate the per-timestep pfb output files of a parflow run into one chunked,
+compressed netCDF file with one dataset per variable.
+
+A transient run with a DumpInterval of 1 writes one pfb file per variable per hour.
+consolidate_outputs streams these files into the store in blocks of timesteps and
+may be called repeatedly while the run is still progressing: only the timesteps
+newer than the last stored timestep are appended and files still being written are skipped.
+The source pfb files may optionally be deleted once they are stored.
+
+Each variable <var> is stored with the dimensions (time_<var>, z_<var>, y, x)
+and has the coordinate variables time_<var> (in the time units of the run) and
+timestep_<var> (the timestep number of the pfb file name).
+"""
+
+# pylint: disable = C0301,R0913,R0914
+import os
+import pf_outputs
+import lazy_import
+
+netCDF4 = lazy_import.LazyModule("netCDF4")
+
+DEFAULT_VARIABLES = ["press", "satur", "clm_output"]
+DEFAULT_CHUNKS = {"time": 24, "y": 32, "x": 32}
+
+
+def consolidate_outputs(
+    directory_path: str,
+    store_path: str = None,
+    runname: str = None,
+    variables=None,
+    timing: dict = None,
+    chunks: dict = None,
+    complevel: int = 4,
+    delete_source: bool = False,
+    keep_paths=None,
+) -> dict:
+    """
+    Append the new pfb output files of a parflow run directory to the netCDF store.
+
+    Parameters:
+        directory_path: The parflow run directory with the output files.
+        store_path:     The path of the netCDF store (defaults to <directory_path>/<runname>.out.nc).
+        runname:        The runname of the output files (defaults to the name of the directory).
+        variables:      The output variables to store (defaults to press, satur and clm_output).
+        timing:         A dict with start_time, start_count, dump_interval and time_step of the run
+                        used to compute the time of each timestep (defaults to the timestep number).
+        chunks:         A dict with the chunk size of the time, y and x dimensions (defaults to 24, 32, 32).
+                        The z dimension is always one chunk so a column is read from a single chunk.
+        complevel:      The zlib compression level of the datasets.
+        delete_source:  If True remove the pfb files after they are stored.
+        keep_paths:     The paths of pfb files that are stored but not removed by delete_source
+                        (for example the restart files of pf_segments).
+    Returns:
+        A dict with the number of timesteps appended to each variable.
+    """
+
+    directory_path = os.path.abspath(directory_path)
+    runname = runname if runname else os.path.basename(directory_path)
+    store_path = store_path if store_path else f"{directory_path}/{runname}.out.nc"
+    variables = variables if variables else DEFAULT_VARIABLES
+    chunks = {**DEFAULT_CHUNKS, **(chunks if chunks else {})}
+    timing = timing if timing else {}
+    keep_paths = {os.path.abspath(path) for path in keep_paths or []}
+    outputs = pf_outputs.OutputDataset(directory_path, runname)
+
+    appended = {}
+    mode = "a" if os.path.exists(store_path) else "w"
+    with netCDF4.Dataset(store_path, mode, format="NETCDF4") as store:
+        if mode == "w":
+            store.setncattr("runname", runname)
+            for key, value in timing.items():
+                if value is not None:
+                    store.setncattr(key, value)
+        for variable in variables:
+            if variable not in outputs:
+                continue
+            output = outputs[variable]
+            dataset = _get_dataset(store, variable, output.layout.shape, chunks, complevel)
+            stored = dataset.shape[0]
+            last_timestep = (
+                int(store.variables[f"timestep_{variable}"][stored - 1]) if stored else None
+            )
+            # Append the new files up to the first file that is still being written
+            contiguous = []
+            for i, timestep in enumerate(output.timesteps):
+                if last_timestep is not None and timestep <= last_timestep:
+                    continue
+                if not pf_outputs.is_complete_pfb(output.paths[i], output.layout.shape):
+                    break
+                contiguous.append(i)
+
+            block_size = int(chunks["time"])
+            for block_start in range(0, len(contiguous), block_size):
+                block = contiguous[block_start : block_start + block_size]
+                data = output[block[0] : block[-1] + 1]
+                end = stored + len(block)
+                dataset[stored:end] = data
+                timesteps = [output.timesteps[i] for i in block]
+                store.variables[f"timestep_{variable}"][stored:end] = timesteps
+                store.variables[f"time_{variable}"][stored:end] = [
+                    timestep_time(timestep, timing) for timestep in timesteps
+                ]
+                stored = end
+                store.sync()
+                if delete_source:
+                    for i in block:
+                        if os.path.abspath(output.paths[i]) not in keep_paths:
+                            os.remove(output.paths[i])
+            appended[variable] = len(contiguous)
+    return appended
+
+
+def _get_dataset(store, variable: str, shape, chunks: dict, complevel: int):
+    """Get the dataset of the variable from the store, creating it if it does not exist yet."""
+
+    if variable in store.variables:
+        return store.variables[variable]
+    nz, ny, nx = shape
+    if "y" not in store.dimensions:
+        store.createDimension("y", ny)
+        store.createDimension("x", nx)
+    store.createDimension(f"time_{variable}", None)
+    store.createDimension(f"z_{variable}", nz)
+    time = store.createVariable(f"time_{variable}", "f8", (f"time_{variable}",))
+    time.setncattr("long_name", "time of the output in the time units of the run")
+    store.createVariable(f"timestep_{variable}", "i4", (f"time_{variable}",))
+    return store.createVariable(
+        variable,
+        "f8",
+        (f"time_{variable}", f"z_{variable}", "y", "x"),
+        zlib=True,
+        complevel=complevel,
+        shuffle=True,
+        chunksizes=(
+            int(chunks["time"]),
+            nz,
+            min(int(chunks["y"]), ny),
+            min(int(chunks["x"]), nx),
+        ),
+    )
+
+
+def timestep_time(timestep: int, timing: dict) -> float:
+    """Get the time of the output file of a timestep from the timing options of the run."""
+
+    start_time = float(timing.get("start_time") or 0.0)
+    start_count = int(timing.get("start_count") or 0)
+    dump_interval = float(timing.get("dump_interval") or 1.0)
+    if dump_interval < 0:
+        # A negative dump interval is a number of time steps
+        dump_interval = -dump_interval * float(timing.get("time_step") or 1.0)
+    return start_time + (timestep - start_count) * dump_interval
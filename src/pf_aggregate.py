@@ -0,0 +1,367 @@
+"""
+Aggregate the outputs of many scenario directories into one columnar file to compare the scenarios.
+
+Each scenario directory <scenarios_dir>/<runname> created by pf_scenarios.run_scenarios is scanned
+in parallel by a pool of processes. The series of a list of locations are extracted from the
+output files of each variable (or from the <runname>.out.nc store of output_store) for every
+dumped timestep. A location is a dict with a name and a type:
+
+    "point":    The cell at the x, y and z indices of the grid of the scenario.
+    "column":   All the layers of the cell at the x, y indices (one series per layer).
+    "mean":     The mean of the layer z of the active cells of a 2D mask of the grid
+                (defaults to the mask.pfb of the scenario or all the cells).
+
+The z index of a point or mean counts from the bottom and a negative z counts from the top
+layer (defaults to -1, the top layer). For clm_output z is the index of the CLM output field.
+
+The values of all the locations are read from each output file with one read of the cells
+of the locations, so the cost of the aggregation is one read per output file.
+
+A scenario whose outputs cannot be read (for example a partial output store) is skipped with
+a warning and the columns of the other scenarios are still saved.
+
+The result is saved as columns of equal length in a netCDF file indexed by scenario, variable,
+location, layer, timestep and time. The scenario, variable and location columns are stored as
+indices into the lists of names. read_aggregate returns the columns as numpy arrays.
+
+Example:
+
+.. code-block:: python
+
+    locations = [
+        {"name": "well", "type": "point", "x": 5, "y": 5},
+        {"name": "well_column", "type": "column", "x": 5, "y": 5},
+        {"name": "basin", "type": "mean"},
+    ]
+    pf_aggregate.aggregate_scenarios("./scenarios", locations)
+    columns = pf_aggregate.read_aggregate("./scenarios/scenarios_aggregate.nc")
+    df = pandas.DataFrame(columns)
+"""
+
+# pylint: disable = C0301,R0913,R0914
+import os
+import warnings
+import concurrent.futures
+import numpy as np
+import parflow
+import pf_outputs
+import output_store
+import lazy_import
+
+netCDF4 = lazy_import.LazyModule("netCDF4")
+
+AGGREGATE_FILE_NAME = "scenarios_aggregate.nc"
+DEFAULT_VARIABLES = ["press", "satur", "clm_output"]
+LOCATION_TYPES = ["point", "column", "mean"]
+
+# The number of output files of a variable read into memory at a time
+TIME_BLOCK_SIZE = 24
+
+# The columns of the aggregate file stored as an index into a list of names
+NAME_COLUMNS = ["scenario", "variable", "location"]
+
+
+def aggregate_scenarios(
+    scenarios_dir: str,
+    locations: list,
+    variables=None,
+    aggregate_path: str = None,
+    max_workers: int = None,
+) -> dict:
+    """
+    Extract the series of the locations from the outputs of all the scenarios and save them in one file.
+
+    Parameters:
+        scenarios_dir:  The directory of the scenario directories (each with a <runname>.yaml runscript).
+        locations:      A list of location dicts (see the module documentation).
+        variables:      The output variables to extract (defaults to press, satur and clm_output).
+        aggregate_path: The path of the netCDF file (defaults to <scenarios_dir>/scenarios_aggregate.nc).
+        max_workers:    The maximum number of scenarios scanned at the same time (defaults to os.cpu_count()).
+    Returns:
+        A dict with the number of rows extracted from each scenario (None for a scenario that failed).
+    """
+
+    scenarios_dir = os.path.abspath(scenarios_dir)
+    variables = variables if variables else DEFAULT_VARIABLES
+    aggregate_path = (
+        aggregate_path if aggregate_path else os.path.join(scenarios_dir, AGGREGATE_FILE_NAME)
+    )
+    for location in locations:
+        _validate_location(location)
+    scenarios = sorted(
+        name
+        for name in os.listdir(scenarios_dir)
+        if os.path.isfile(os.path.join(scenarios_dir, name, f"{name}.yaml"))
+    )
+
+    results = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                _aggregate_scenario, os.path.join(scenarios_dir, name), locations, variables
+            ): name
+            for name in scenarios
+        }
+        for future in concurrent.futures.as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                results[name] = None
+                warnings.warn(f"The outputs of the scenario '{name}' were not aggregated: {e!r}")
+    aggregated = [name for name in scenarios if results[name] is not None]
+
+    columns = {
+        "scenario": [],
+        "variable": [],
+        "location": [],
+        "layer": [],
+        "timestep": [],
+        "time": [],
+        "value": [],
+    }
+    for index, name in enumerate(aggregated):
+        scenario_columns = results[name]
+        columns["scenario"].append(
+            np.full(len(scenario_columns["value"]), index, dtype=np.int32)
+        )
+        for key, values in scenario_columns.items():
+            columns[key].append(values)
+    names = {
+        "scenario": aggregated,
+        "variable": list(variables),
+        "location": [location["name"] for location in locations],
+    }
+    _write_aggregate(
+        aggregate_path,
+        {key: np.concatenate(values) if values else np.array([]) for key, values in columns.items()},
+        names,
+    )
+    return {
+        name: len(results[name]["value"]) if results[name] is not None else None
+        for name in scenarios
+    }
+
+
+def read_aggregate(aggregate_path: str) -> dict:
+    """
+    Read the columns of an aggregate file.
+    Returns:
+        A dict of the scenario, variable, location, layer, timestep, time and value numpy arrays.
+    """
+
+    with netCDF4.Dataset(aggregate_path, "r") as store:
+        columns = {}
+        for key in NAME_COLUMNS:
+            names = np.array(store.variables[f"{key}_names"][:], dtype=object)
+            indices = np.asarray(store.variables[key][:], dtype=int)
+            columns[key] = names[indices] if len(names) else np.array([], dtype=object)
+        for key in ["layer", "timestep", "time", "value"]:
+            columns[key] = np.asarray(store.variables[key][:])
+    return columns
+
+
+def _validate_location(location: dict):
+    """Raise ValueError if the location dict is not a supported location."""
+
+    location_type = location.get("type", "point")
+    if not location.get("name"):
+        raise ValueError(f"The location {location} has no name.")
+    if location_type not in LOCATION_TYPES:
+        raise ValueError(
+            f"Unsupported location type '{location_type}'. Must be one of {LOCATION_TYPES}."
+        )
+    if location_type != "mean" and (location.get("x") is None or location.get("y") is None):
+        raise ValueError(f"The {location_type} location '{location['name']}' needs x and y.")
+
+
+def _aggregate_scenario(directory_path: str, locations: list, variables: list) -> dict:
+    """
+    Extract the series of the locations from the outputs of one scenario in a worker process.
+    Returns:
+        A dict of the variable, location, layer, timestep, time and value numpy arrays.
+    """
+
+    runname = os.path.basename(directory_path)
+    model = parflow.Run.from_definition(os.path.join(directory_path, f"{runname}.yaml"))
+    timing = {
+        "start_time": model.TimingInfo.StartTime,
+        "start_count": model.TimingInfo.StartCount,
+        "dump_interval": model.TimingInfo.DumpInterval,
+        "time_step": model.TimeStep.Value if model.TimeStep.Type == "Constant" else None,
+    }
+    mask_path = os.path.join(directory_path, "mask.pfb")
+    mask = parflow.read_pfb(mask_path)[-1] > 0 if os.path.exists(mask_path) else None
+    outputs = pf_outputs.OutputDataset(directory_path, runname)
+    store_path = os.path.join(directory_path, f"{runname}.out.nc")
+
+    columns = {key: [] for key in ["variable", "location", "layer", "timestep", "time", "value"]}
+
+    def add(variable_index, plan, timesteps, values):
+        # values is (len(timesteps), len(plan.targets)) with the targets varying fastest
+        nt, ntargets = values.shape
+        columns["variable"].append(np.full(nt * ntargets, variable_index, dtype=np.int32))
+        columns["location"].append(np.tile(plan.location_indices, nt))
+        columns["layer"].append(np.tile(plan.layers, nt))
+        columns["timestep"].append(np.repeat(np.asarray(timesteps, dtype=np.int32), ntargets))
+        columns["time"].append(
+            np.repeat([output_store.timestep_time(t, timing) for t in timesteps], ntargets)
+        )
+        columns["value"].append(values.reshape(-1))
+
+    stored = _stored_timesteps(store_path)
+    for variable_index, variable in enumerate(variables):
+        files = []
+        if variable in outputs:
+            output = outputs[variable]
+            files = [
+                i
+                for i, path in enumerate(output.paths)
+                if pf_outputs.is_complete_pfb(path, output.layout.shape)
+            ]
+        if files:
+            plan = _ExtractionPlan(locations, output.layout.shape, mask)
+            for block_start in range(0, len(files), TIME_BLOCK_SIZE):
+                block = files[block_start : block_start + TIME_BLOCK_SIZE]
+                data = output[block, plan.z, plan.y, plan.x]
+                add(variable_index, plan, [output.timesteps[i] for i in block], plan.extract(data))
+        if variable in stored:
+            # Timesteps consolidated into the store whose pfb files were deleted
+            in_files = {output.timesteps[i] for i in files} if files else set()
+            with netCDF4.Dataset(store_path, "r") as store:
+                dataset = store.variables[variable]
+                plan = _ExtractionPlan(locations, dataset.shape[1:], mask)
+                indices = [i for i, t in enumerate(stored[variable]) if t not in in_files]
+                for block_start in range(0, len(indices), TIME_BLOCK_SIZE):
+                    block = indices[block_start : block_start + TIME_BLOCK_SIZE]
+                    data = np.asarray(dataset[block, plan.z, plan.y, plan.x], dtype=np.float64)
+                    add(variable_index, plan, [stored[variable][i] for i in block], plan.extract(data))
+
+    return {
+        key: np.concatenate(values) if values else np.array([], dtype=np.float64 if key in ("time", "value") else np.int32)
+        for key, values in columns.items()
+    }
+
+
+def _stored_timesteps(store_path: str) -> dict:
+    """Get the timesteps of each variable of the output_store file (empty if there is no store)."""
+
+    if not os.path.exists(store_path):
+        return {}
+    with netCDF4.Dataset(store_path, "r") as store:
+        return {
+            name[len("timestep_"):]: [int(t) for t in store.variables[name][:]]
+            for name in store.variables
+            if name.startswith("timestep_")
+        }
+
+
+class _ExtractionPlan:
+    """
+    The cells of the locations read from the output files of a variable of one shape.
+
+    The z, y and x arrays are the sorted indices of the cells to read from a file. extract
+    gets the values of all the targets (a point, a layer of a column or a mean) from the
+    block of those cells of any number of files at once.
+    """
+
+    def __init__(self, locations: list, shape, mask):
+        nz, ny, nx = shape
+        points = []
+        means = []
+        self.location_indices = []
+        self.layers = []
+        for index, location in enumerate(locations):
+            location_type = location.get("type", "point")
+            if location_type == "column":
+                layers = list(range(0, nz))
+            else:
+                z = int(location.get("z", -1))
+                layers = [z + nz if z < 0 else z]
+            for layer in layers:
+                if layer < 0 or layer >= nz:
+                    raise ValueError(
+                        f"The z of location '{location['name']}' is out of range for {nz} layers."
+                    )
+                if location_type == "mean":
+                    location_mask = location.get("mask")
+                    location_mask = (
+                        np.asarray(location_mask) > 0
+                        if location_mask is not None
+                        else mask if mask is not None and mask.shape == (ny, nx)
+                        else np.ones((ny, nx), dtype=bool)
+                    )
+                    means.append((len(self.layers), layer, location_mask))
+                else:
+                    x, y = int(location["x"]), int(location["y"])
+                    if not 0 <= x < nx or not 0 <= y < ny:
+                        raise ValueError(
+                            f"The x, y of location '{location['name']}' is out of the {nx} x {ny} grid."
+                        )
+                    points.append((len(self.layers), layer, y, x))
+                self.location_indices.append(index)
+                self.layers.append(layer)
+        self.location_indices = np.array(self.location_indices, dtype=np.int32)
+        self.layers = np.array(self.layers, dtype=np.int32)
+
+        self.z = sorted({target[1] for target in points + means})
+        if means:
+            self.y = list(range(0, ny))
+            self.x = list(range(0, nx))
+        else:
+            self.y = sorted({target[2] for target in points})
+            self.x = sorted({target[3] for target in points})
+        self._points = [
+            np.array([target[0] for target in points], dtype=int),
+            np.searchsorted(self.z, [target[1] for target in points]),
+            np.searchsorted(self.y, [target[2] for target in points]),
+            np.searchsorted(self.x, [target[3] for target in points]),
+        ]
+        self._means = [
+            np.array([target[0] for target in means], dtype=int),
+            np.searchsorted(self.z, [target[1] for target in means]),
+            np.array([target[2] for target in means], dtype=bool).reshape(-1, ny, nx),
+        ]
+
+    def extract(self, data):
+        """
+        Get the values of the targets from the block of cells of several files.
+
+        Parameters:
+            data:   An array (nt, len(z), len(y), len(x)) of the cells of the plan of nt files.
+        Returns:
+            An array (nt, number of targets).
+        """
+
+        result = np.empty((data.shape[0], len(self.layers)), dtype=np.float64)
+        targets, zi, yi, xi = self._points
+        if len(targets):
+            result[:, targets] = data[:, zi, yi, xi]
+        targets, zi, masks = self._means
+        if len(targets):
+            counts = masks.sum(axis=(1, 2))
+            sums = np.where(masks, data[:, zi], 0.0).sum(axis=(2, 3))
+            with np.errstate(invalid="ignore", divide="ignore"):
+                result[:, targets] = sums / counts
+        return result
+
+
+def _write_aggregate(aggregate_path: str, columns: dict, names: dict):
+    """Write the columns and the names of the name columns to the netCDF aggregate file."""
+
+    tmp_path = f"{aggregate_path}.tmp"
+    with netCDF4.Dataset(tmp_path, "w", format="NETCDF4") as store:
+        store.createDimension("row", len(columns["value"]))
+        for key in NAME_COLUMNS:
+            store.createDimension(f"{key}s", len(names[key]))
+            names_variable = store.createVariable(f"{key}_names", str, (f"{key}s",))
+            for i, name in enumerate(names[key]):
+                names_variable[i] = name
+            store.createVariable(key, "i4", ("row",), zlib=True)[:] = columns[key]
+        store.createVariable("layer", "i4", ("row",), zlib=True)[:] = columns["layer"]
+        store.createVariable("timestep", "i4", ("row",), zlib=True)[:] = columns["timestep"]
+        time = store.createVariable("time", "f8", ("row",), zlib=True)
+        time.setncattr("long_name", "time of the output in the time units of the run")
+        time[:] = columns["time"]
+        store.createVariable("value", "f8", ("row",), zlib=True)[:] = columns["value"]
+    os.replace(tmp_path, aggregate_path)
@@ -0,0 +1,136 @@
+"""
+Create an ensemble of parflow projects of the same domain that share their common input files.
+
+The members of an ensemble differ from the base options only in the MEMBER_OPTIONS (for example
+the precip or the forcing_day). The base project is created once in the shared directory of the
+ensemble. Each member directory gets links to the mask, static and clm files of the shared project
+and the manifest entries of those stages, so create_project only creates the forcing files and the
+runscript of the member. The member files that are the same as the files of the shared project
+(for example the forcing variables that do not depend on precip) are then replaced by links.
+
+The ensemble directory has the layout:
+
+    <directory_path>/shared/            The project of the base options.
+    <directory_path>/cache/             The data cache of the ensemble (unless a cache_dir is set).
+    <directory_path>/<member>/          The project of each member.
+
+Example:
+
+.. code-block:: python
+
+    base_options = {
+        "grid_bounds": [3749, 1583, 3759, 1593],
+        "start_date": "2005-10-01",
+        "end_date": "2005-10-03",
+        "forcing_day": "2005-10-01",
+    }
+    members = {f"precip_{i}": {"precip": i * 0.1} for i in range(0, 100)}
+    runscript_paths = pf_ensemble.create_ensemble(base_options, members, "./ensemble")
+"""
+
+# pylint: disable = C0301
+import os
+import copy
+import data_cache
+import project
+import project_manifest
+
+SHARED_DIR_NAME = "shared"
+CACHE_DIR_NAME = "cache"
+
+# The options that may be different in the members of an ensemble
+MEMBER_OPTIONS = ["forcing_day", "precip", "time_steps", "dump_interval", "segment_hours"]
+
+# The stages of create_project that do not depend on the MEMBER_OPTIONS
+SHARED_STAGES = ["mask", "static", "clm"]
+
+
+def create_ensemble(
+    base_options: dict,
+    members: dict,
+    directory_path: str = "ensemble_dir",
+    link_mode: str = "hardlink",
+) -> dict:
+    """
+    Create the projects of the members of an ensemble sharing the input files that are the same.
+
+    Parameters:
+        base_options:   The project options of create_project shared by all members.
+        members:        A dict of the member name to a dict of the MEMBER_OPTIONS of the member.
+        directory_path: The directory of the ensemble.
+        link_mode:      Either "hardlink", "symlink" or "copy" to share the files with the members.
+    Returns:
+        A dict of the member name to the path of the runscript of the member.
+    """
+
+    for name, member_options in members.items():
+        unsupported = sorted(set(member_options) - set(MEMBER_OPTIONS))
+        if unsupported:
+            raise ValueError(
+                f"The member '{name}' has options {unsupported} that are not one of {MEMBER_OPTIONS}."
+            )
+        if name in (SHARED_DIR_NAME, CACHE_DIR_NAME):
+            raise ValueError(f"The member name '{name}' is reserved.")
+
+    directory_path = os.path.abspath(directory_path)
+    base_options = dict(base_options)
+    base_options.setdefault("cache_dir", os.path.join(directory_path, CACHE_DIR_NAME))
+    shared_dir = os.path.join(directory_path, SHARED_DIR_NAME)
+    project.create_project(base_options, shared_dir)
+    shared_manifest = project_manifest.ProjectManifest(shared_dir)
+
+    runscript_paths = {}
+    for name, member_options in members.items():
+        member_dir = os.path.join(directory_path, name)
+        _link_shared_stages(shared_manifest, member_dir, link_mode)
+        runscript_paths[name] = project.create_project(
+            {**base_options, **member_options}, member_dir
+        )
+        _link_same_files(shared_dir, member_dir, link_mode)
+        project_manifest.ProjectManifest(member_dir).refresh()
+    return runscript_paths
+
+
+def _link_shared_stages(shared_manifest, member_dir: str, link_mode: str):
+    """
+    Link the output files of the SHARED_STAGES of the shared project into the member directory
+    (with their .dist files) and record the stages as complete in the manifest of the member.
+    """
+
+    os.makedirs(member_dir, exist_ok=True)
+    manifest = project_manifest.ProjectManifest(member_dir)
+    shared_dir = shared_manifest.directory_path
+    for stage in SHARED_STAGES:
+        entry = shared_manifest.stages.get(stage)
+        if not entry or not entry.get("complete"):
+            continue
+        for name in entry["outputs"]:
+            for file_name in [name, f"{name}.dist"]:
+                source_path = os.path.join(shared_dir, file_name)
+                if os.path.exists(source_path):
+                    target_path = os.path.join(member_dir, file_name)
+                    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                    data_cache.link_or_copy(source_path, target_path, link_mode)
+        manifest.stages[stage] = copy.deepcopy(entry)
+    manifest.write()
+
+
+def _link_same_files(shared_dir: str, member_dir: str, link_mode: str):
+    """Replace the files of the member directory that are the same as the files of the shared project by links."""
+
+    excluded = {
+        project_manifest.MANIFEST_FILE_NAME,
+        f"{os.path.basename(member_dir)}.yaml",
+        f"{os.path.basename(member_dir)}.pfidb",
+    }
+    for name, (size, _) in data_cache.snapshot_files(member_dir).items():
+        if name in excluded:
+            continue
+        source_path = os.path.join(shared_dir, name)
+        target_path = os.path.join(member_dir, name)
+        if not os.path.isfile(source_path) or os.path.getsize(source_path) != size:
+            continue
+        if os.path.samefile(source_path, target_path):
+            continue
+        if data_cache.file_sha256(source_path) == data_cache.file_sha256(target_path):
+            data_cache.link_or_copy(source_path, target_path, link_mode)
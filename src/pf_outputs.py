@@ -0,0 +1,253 @@
+"""
+Lazy access to the output files of a parflow run directory.
+
+A parflow run writes one pfb file per variable per dumped timestep, for example
+<runname>.out.press.00010.pfb or <runname>.out.clm_output.00010.C.pfb.
+OutputDataset indexes all these files by variable and timestep without reading them.
+Slicing a variable with [t, z, y, x] memory-maps each file and reads only the bytes
+of the subgrids that overlap the requested cells, so extracting a point or column
+time series does not load the full NZ x NY x NX array of every timestep.
+
+Example:
+
+.. code-block:: python
+
+    outputs = pf_outputs.OutputDataset("./box")
+    press = outputs["press"]
+    print(press.shape, press.timesteps[-1])
+
+    # Pressure time series of the top layer of one cell
+    series = press[:, 9, 5, 5]
+"""
+
+# pylint: disable = C0301
+import os
+import re
+import struct
+import lazy_import
+
+np = lazy_import.LazyModule("numpy")
+
+# The pfb file header is 64 bytes and each subgrid header is 36 bytes
+PFB_HEADER_FORMAT = ">dddiiidddi"
+PFB_SUBGRID_HEADER_FORMAT = ">iiiiiiiii"
+PFB_HEADER_SIZE = struct.calcsize(PFB_HEADER_FORMAT)
+PFB_SUBGRID_HEADER_SIZE = struct.calcsize(PFB_SUBGRID_HEADER_FORMAT)
+
+
+class OutputDataset:
+    """
+    The output files of a parflow run directory indexed by variable and timestep.
+
+    Parameters:
+        directory_path:     The parflow run directory.
+        runname:            The runname of the output files (defaults to the name of the directory).
+    """
+
+    def __init__(self, directory_path: str, runname: str = None):
+        self.directory_path = os.path.abspath(directory_path)
+        self.runname = runname if runname else os.path.basename(self.directory_path)
+        self._variables = {}
+        self.refresh()
+
+    def refresh(self):
+        """Index the output files of the directory again to find files written since the last refresh."""
+
+        pattern = re.compile(
+            rf"^{re.escape(self.runname)}\.out\.([A-Za-z_]+)\.(\d+)(\.C)?\.pfb$"
+        )
+        paths = {}
+        for file_name in os.listdir(self.directory_path):
+            match = pattern.match(file_name)
+            if match:
+                variable = match.group(1)
+                timestep = int(match.group(2))
+                paths.setdefault(variable, {})[timestep] = os.path.join(
+                    self.directory_path, file_name
+                )
+        for variable, timestep_paths in paths.items():
+            timesteps = sorted(timestep_paths.keys())
+            self._variables[variable] = OutputVariable(
+                variable, timesteps, [timestep_paths[t] for t in timesteps]
+            )
+
+    @property
+    def variables(self):
+        """The names of the variables with output files."""
+
+        return sorted(self._variables.keys())
+
+    def __getitem__(self, variable: str):
+        if variable not in self._variables:
+            raise KeyError(
+                f"No output files for variable '{variable}' of run '{self.runname}' in '{self.directory_path}'."
+            )
+        return self._variables[variable]
+
+    def __contains__(self, variable: str):
+        return variable in self._variables
+
+
+class OutputVariable:
+    """
+    The output files of one variable of a parflow run as a lazy 4D array [t, z, y, x].
+
+    The t index is the position in the list of timesteps and not the timestep number.
+    Each index may be an integer, a slice or a list of integers. Lists of integers on
+    several axes select the outer product of the indices of those axes.
+    """
+
+    def __init__(self, name: str, timesteps, paths):
+        self.name = name
+        self.timesteps = list(timesteps)
+        self.paths = list(paths)
+        self._layout = None
+
+    @property
+    def layout(self):
+        """The PfbLayout of the files of the variable (all files have the same layout)."""
+
+        if self._layout is None:
+            self._layout = PfbLayout(self.paths[0])
+        return self._layout
+
+    @property
+    def shape(self):
+        """The shape (nt, nz, ny, nx) of the variable."""
+
+        return (len(self.paths),) + self.layout.shape
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) > 4:
+            raise IndexError("Output variables are indexed by at most [t, z, y, x].")
+        key = key + (slice(None),) * (4 - len(key))
+        t_indices, t_scalar = _axis_indices(key[0], len(self.paths))
+        layout = self.layout
+        axes = [
+            _axis_indices(key[axis + 1], layout.shape[axis]) for axis in range(0, 3)
+        ]
+        result = np.empty(
+            (len(t_indices),) + tuple(len(indices) for indices, _ in axes),
+            dtype=np.float64,
+        )
+        for i, t in enumerate(t_indices):
+            path = self.paths[t]
+            if _file_layout_key(path) != layout.key:
+                result[i] = PfbLayout(path).read(*[indices for indices, _ in axes])
+            else:
+                result[i] = layout.read(*[indices for indices, _ in axes], path=path)
+        squeeze = tuple(
+            axis for axis, scalar in enumerate([t_scalar] + [s for _, s in axes]) if scalar
+        )
+        return result.squeeze(axis=squeeze) if squeeze else result
+
+
+class PfbLayout:
+    """
+    The header and subgrid layout of a pfb file used to read windows of the file by memory mapping.
+
+    Parameters:
+        path:   The path of the pfb file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.key = _file_layout_key(path)
+        with open(path, "rb") as stream:
+            header = struct.unpack(PFB_HEADER_FORMAT, stream.read(PFB_HEADER_SIZE))
+            nx, ny, nz = header[3:6]
+            num_subgrids = header[9]
+            self.shape = (nz, ny, nx)
+            self.spacing = tuple(header[6:9])
+            self.subgrids = []
+            offset = PFB_HEADER_SIZE
+            for _ in range(0, num_subgrids):
+                stream.seek(offset)
+                ix, iy, iz, snx, sny, snz = struct.unpack(
+                    PFB_SUBGRID_HEADER_FORMAT, stream.read(PFB_SUBGRID_HEADER_SIZE)
+                )[0:6]
+                data_offset = offset + PFB_SUBGRID_HEADER_SIZE
+                self.subgrids.append(
+                    ((iz, iy, ix), (snz, sny, snx), data_offset)
+                )
+                offset = data_offset + 8 * snx * sny * snz
+
+    def read(self, z_indices, y_indices, x_indices, path: str = None):
+        """
+        Read the values of the cells at the z, y, x indices from the pfb file.
+
+        Parameters:
+            z_indices, y_indices, x_indices:    numpy arrays of the cell indices of each axis.
+            path:   A pfb file with the same layout (defaults to the file of the layout).
+        Returns:
+            A numpy array of shape (len(z_indices), len(y_indices), len(x_indices)).
+        """
+
+        path = path if path else self.path
+        indices = (np.asarray(z_indices), np.asarray(y_indices), np.asarray(x_indices))
+        result = np.empty(tuple(len(i) for i in indices), dtype=np.float64)
+        if result.size == 0:
+            return result
+        data = np.memmap(path, dtype=np.uint8, mode="r")
+        for lower, size, data_offset in self.subgrids:
+            selected = []
+            for axis in range(0, 3):
+                inside = (indices[axis] >= lower[axis]) & (
+                    indices[axis] < lower[axis] + size[axis]
+                )
+                selected.append(np.nonzero(inside)[0])
+            if any(len(s) == 0 for s in selected):
+                continue
+            subgrid = np.ndarray(size, dtype=">f8", buffer=data, offset=data_offset)
+            local = [
+                indices[axis][selected[axis]] - lower[axis] for axis in range(0, 3)
+            ]
+            result[np.ix_(*selected)] = subgrid[np.ix_(*local)]
+        del data
+        return result
+
+
+def is_complete_pfb(path: str, shape) -> bool:
+    """
+    Returns True if the size of the pfb file at path is the size of a completely
+    written file of the (nz, ny, nx) shape with any number of subgrids.
+    """
+
+    nz, ny, nx = shape
+    extra_bytes = os.path.getsize(path) - PFB_HEADER_SIZE - 8 * nx * ny * nz
+    return (
+        extra_bytes >= PFB_SUBGRID_HEADER_SIZE
+        and extra_bytes % PFB_SUBGRID_HEADER_SIZE == 0
+    )
+
+
+def _file_layout_key(path: str):
+    """The size of a file identifies the layout of the files of a variable written with the same topology."""
+
+    return os.path.getsize(path)
+
+
+def _axis_indices(key, length: int):
+    """
+    Convert an index of one axis into an array of indices.
+    Returns:
+        (indices, scalar) where scalar is True if the key was a single integer index
+    """
+
+    if isinstance(key, slice):
+        return np.arange(*key.indices(length)), False
+    if isinstance(key, (int, np.integer)):
+        index = int(key) + length if key < 0 else int(key)
+        if index < 0 or index >= length:
+            raise IndexError(f"Index {key} is out of range for axis of length {length}.")
+        return np.array([index]), True
+    indices = np.asarray(key, dtype=int)
+    indices = np.where(indices < 0, indices + length, indices)
+    if np.any((indices < 0) | (indices >= length)):
+        raise IndexError(f"Index {key} is out of range for axis of length {length}.")
+    return indices, False
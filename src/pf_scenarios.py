@@ -1,53 +1,218 @@
 """
     Create scenarios of .csv files that can be used to plot examples of parflow results.
+
+    The matrix of start pressure and forcing scenarios is built (and optionally run with parflow)
+    in parallel by a pool of processes. The timings and failures of every scenario are collected
+    into one summary saved in the scenarios directory.
+    The outputs of the scenarios are compared with pf_aggregate.aggregate_scenarios.
 """
 import os
+import json
+import time
+import traceback
+import functools
+import concurrent.futures
 import parflow
 import project
+import pf_outputs
+
+START_PRESSURE_OPTIONS = ["small", "large"]
+FORCING_INPUT_OPTIONS = ["zero", "real", "large"]
+
+
+def generate_scenarios(max_workers=None, run_parflow=False, total_cores=None, scenarios_dir="./scenarios"):
+    """
+    Build all the scenarios of the start pressure and forcing matrix in parallel in the scenarios_dir.
+    Returns:
+        The summary dict returned by run_scenarios.
+    """
+    scenarios = [
+        scenario_options(sp, forcing)
+        for sp in START_PRESSURE_OPTIONS
+        for forcing in FORCING_INPUT_OPTIONS
+    ]
+    return run_scenarios(
+        scenarios,
+        max_workers=max_workers,
+        run_parflow=run_parflow,
+        total_cores=total_cores,
+        scenarios_dir=scenarios_dir,
+    )
+
+
+def generate_scenario(start_pressure_option, forcing_input_option, scenarios_dir="./scenarios"):
+    runname, options = scenario_options(start_pressure_option, forcing_input_option)
+    execute_run(scenarios_dir, runname, options)
 
-def generate_scenarios():
-    start_pressure_options = ["small", "large"]
-    forcing_input = ["zero", "real" "large"]
-    for sp in start_pressure_options:
-        for forcing in forcing_input:
-            generate_scenario(sp, forcing)
-            return
 
-def generate_scenario(start_pressure_option, forcing_input_option):
+def scenario_options(start_pressure_option, forcing_input_option):
+    """
+    Get the options of a scenario of the matrix.
+    Returns:
+        (runname, scenario_options)
+    """
     scenario_options = {}
     scenario_options["start_date"] = "2005-10-01"
     scenario_options["end_date"] = "2005-10-02"
-    scenario_options["timesteps"] = 10
+    scenario_options["time_steps"] = 10
     if start_pressure_option == "small":
         scenario_options["target_x"] = 3754
         scenario_options["target_y"] = 1588
         # 4037, 1949, 4038, 1951   -- Robinsville NJ WTD < 3 meters *oewaayew is negative
         scenario_options["target_x"] = (4037 + 4038)/2
         scenario_options["target_y"] = (1949 + 1951)/2
-        print(scenario_options)
     elif start_pressure_option == "large":
         scenario_options["target_x"] = 3750
         scenario_options["target_y"] = 1500
     else:
         raise ValueError(f"Unsupport start pressure option '{start_pressure_option}")
-    
+
     if forcing_input_option == "real":
         scenario_options["forcing_day"] = None
-        scenario_options["preip"] = None
+        scenario_options["precip"] = None
     elif forcing_input_option == "zero":
         scenario_options["forcing_day"] = "2005-10-01"
-        scenario_options["preip"] = 0.0
+        scenario_options["precip"] = 0.0
     elif forcing_input_option == "large":
         scenario_options["forcing_day"] = "2000-01-01"
-        scenario_options["preip"] = 10.0
+        scenario_options["precip"] = 10.0
+    else:
+        raise ValueError(f"Unsupport forcing input option '{forcing_input_option}")
     runname = f"{start_pressure_option}_{forcing_input_option}"
-    directory_path = f"./scenarios/{runname}"
-    execute_run(runname, scenario_options)
-    #generate_csv(directory_path, scenario_options)
+    return runname, scenario_options
+
+
+def run_scenarios(
+    scenarios,
+    max_workers=None,
+    run_parflow=False,
+    total_cores=None,
+    scenarios_dir="./scenarios",
+    execute=None,
+):
+    """
+    Build (and optionally run) scenarios in parallel using a pool of processes.
+
+    Parameters:
+        scenarios:      A list of (runname, scenario_options) tuples.
+        max_workers:    The maximum number of scenarios processed at the same time (defaults to total_cores).
+        run_parflow:    If True run parflow for each scenario after the project is built.
+        total_cores:    The number of cores that may be used by all scenarios (defaults to os.cpu_count()).
+        scenarios_dir:  The directory containing the scenario directories and the summary.json file.
+        execute:        A picklable function called with (runname, scenario_options) in a worker process
+                        that creates the project and returns the runscript path (defaults to execute_run
+                        building the project in the scenarios_dir).
+
+    When run_parflow is True a scenario uses P*Q*R cores of the topology in its scenario_options
+    (or its available_cores for an "auto" topology) and is only started when that many cores
+    of total_cores are free. Otherwise each scenario uses one core.
+
+    Returns:
+        A summary dict with the timings and failures of every scenario in the order of scenarios.
+    """
+    execute = execute or functools.partial(execute_run, scenarios_dir)
+    total_cores = int(total_cores or os.cpu_count() or 1)
+    max_workers = int(max_workers or total_cores)
+    start = time.perf_counter()
+    results = {}
+    pending = []
+    for runname, options in scenarios:
+        cores = _scenario_cores(options) if run_parflow else 1
+        if cores > total_cores:
+            results[runname] = _scenario_result(runname, cores)
+            results[runname]["status"] = "failed"
+            results[runname][
+                "error"
+            ] = f"The topology needs {cores} cores but only {total_cores} cores are available."
+        else:
+            pending.append((runname, options, cores))
 
-def execute_run(runname, scenario_options):
-    print(runname, scenario_options)
-    directory_path = f"./scenarios/{runname}"
+    free_cores = total_cores
+    running = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            # Start every pending scenario that fits in the free cores
+            for item in list(pending):
+                runname, options, cores = item
+                if len(running) >= max_workers or cores > free_cores:
+                    continue
+                future = executor.submit(
+                    _execute_scenario, runname, options, run_parflow, cores, execute
+                )
+                running[future] = (runname, cores)
+                free_cores -= cores
+                pending.remove(item)
+            done, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                runname, cores = running.pop(future)
+                free_cores += cores
+                try:
+                    results[runname] = future.result()
+                except (Exception, SystemExit):
+                    results[runname] = _scenario_result(runname, cores)
+                    results[runname]["status"] = "failed"
+                    results[runname]["error"] = traceback.format_exc()
+
+    summary = {
+        "total_seconds": time.perf_counter() - start,
+        "max_workers": max_workers,
+        "total_cores": total_cores,
+        "run_parflow": run_parflow,
+        "failed": sum(1 for r in results.values() if r["status"] != "ok"),
+        "scenarios": [results[runname] for runname, _ in scenarios],
+    }
+    os.makedirs(scenarios_dir, exist_ok=True)
+    with open(os.path.join(scenarios_dir, "summary.json"), "w", encoding="utf-8") as stream:
+        json.dump(summary, stream, indent=2)
+    return summary
+
+
+def _execute_scenario(runname, scenario_options, run_parflow, cores, execute):
+    """Build (and optionally run) one scenario in a worker process and return its result dict."""
+    result = _scenario_result(runname, cores)
+    try:
+        start = time.perf_counter()
+        runscript_path = execute(runname, scenario_options)
+        result["build_seconds"] = time.perf_counter() - start
+        if run_parflow:
+            start = time.perf_counter()
+            model = parflow.Run.from_definition(runscript_path)
+            model.run(working_directory=os.path.dirname(runscript_path))
+            result["run_seconds"] = time.perf_counter() - start
+    except (Exception, SystemExit):
+        # parflow exits with sys.exit(1) when a run fails
+        result["status"] = "failed"
+        result["error"] = traceback.format_exc()
+    return result
+
+
+def _scenario_result(runname, cores):
+    return {
+        "runname": runname,
+        "status": "ok",
+        "cores": cores,
+        "build_seconds": None,
+        "run_seconds": None,
+        "error": None,
+    }
+
+
+def _scenario_cores(scenario_options):
+    """Get the number of cores used by parflow for the topology of the scenario."""
+    topology = scenario_options.get("topology") or [1, 1, 1]
+    if topology == "auto":
+        # An auto topology uses at most the available_cores reserved for the scenario
+        return int(scenario_options.get("available_cores") or 1)
+    cores = 1
+    for value in topology:
+        cores = cores * int(value)
+    return cores
+
+
+def execute_run(scenarios_dir, runname, scenario_options):
+    directory_path = os.path.join(scenarios_dir, runname)
     os.makedirs(directory_path, exist_ok=True)
 
 
@@ -66,6 +231,7 @@ def execute_run(runname, scenario_options):
         target_y + target_radius,
     ]
     options = {
+        "run_type": "transient",
         "grid_bounds": grid_bounds,
         "grid": "conus2",
         "start_date": start_date,
@@ -75,18 +241,20 @@ def execute_run(runname, scenario_options):
     }
     if time_steps:
         options["time_steps"] = time_steps
+    if scenario_options.get("topology"):
+        options["topology"] = scenario_options.get("topology")
+        options["available_cores"] = _scenario_cores(scenario_options)
 
     # Create the parflow model and generated input files
     runscript_path = project.create_project(options, directory_path)
-    model = parflow.Run.from_definition(runscript_path)
-    model.write(file_format="yaml")
 
     # Run the parflow model
-    # 
-    # 
+    #
+    # model = parflow.Run.from_definition(runscript_path)
     # model.run()
 
     generate_csv(directory_path, scenario_options)
+    return runscript_path
 
 def generate_csv(directory_path, scenario_options):
     print(directory_path)
@@ -94,16 +262,16 @@ def generate_csv(directory_path, scenario_options):
     target_y = scenario_options.get("target_y")
     target_radius = 5
 
-    initial_press_np = parflow.read_pfb(f"{directory_path}/ss_pressure_head.pfb")
+    # Read only the row of the top layer of the initial pressure that is printed
+    initial_press = pf_outputs.PfbLayout(f"{directory_path}/ss_pressure_head.pfb")
     print("Initial Pressure")
-    print(initial_press_np.shape)
-    for r in range(-target_radius+1, target_radius):
-        x = target_radius - r
-        y = target_radius
-        print(f"({x},{y}) {initial_press_np[9, y, x]}")
-
-
-generate_scenarios()
-    
+    print(initial_press.shape)
+    y = target_radius
+    xs = [target_radius - r for r in range(-target_radius+1, target_radius)]
+    row = initial_press.read([9], [y], xs)
+    for i, x in enumerate(xs):
+        print(f"({x},{y}) {row[0, 0, i]}")
 
 
+if __name__ == "__main__":
+    generate_scenarios()
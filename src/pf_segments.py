@@ -0,0 +1,255 @@
+"""
+Run a long transient parflow run as a sequence of segments that restart from the previous segment.
+
+The TimingInfo.StartTime to StopTime of the runscript is split into segments of segment_hours.
+Each segment is a parflow run of the same runscript with the timing of the segment. A segment
+after the first starts from the checkpoint of the previous segment:
+
+    - Geom.domain.ICPressure.FileName is the final pressure output of the previous segment
+      (distributed to the topology of the run).
+    - The CLM restart files clm.rst.* of the previous segment are restored into the
+      CLMFileDir and the drv_clmin.dat startcode is set to 1 (restart file).
+    - TimingInfo.StartCount and Solver.CLM.IstepStart continue the numbering of the outputs.
+
+The segments and the segments that are complete are saved in segments.json in the run directory.
+When a segment is complete its final pressure output and CLM restart files are copied to
+segments/<segment>/ so run_segments can resume from the last complete segment after a failure
+and at most one segment of compute is lost.
+
+Example:
+
+.. code-block:: python
+
+    pf_segments.plan_segments(runscript_path, segment_hours=24 * 30)
+
+    # Run (or resume) the segments that are not complete yet
+    pf_segments.run_segments(runscript_path)
+"""
+
+# pylint: disable = C0301
+import os
+import re
+import json
+import glob
+import shutil
+import pfb_dist
+import lazy_import
+
+parflow = lazy_import.LazyModule("parflow")
+
+SEGMENTS_FILE_NAME = "segments.json"
+CHECKPOINT_DIR_NAME = "segments"
+CLM_DRIVER_FILE_NAME = "drv_clmin.dat"
+
+
+def plan_segments(runscript_path: str, segment_hours: int) -> list:
+    """
+    Split the timing of the runscript into segments and save them in segments.json.
+
+    The segments already complete are kept if the segments are unchanged.
+    Parameters:
+        runscript_path:     The path of the runscript returned by create_project.
+        segment_hours:      The hours of each segment (the last segment may be shorter).
+    Returns:
+        The list of the segment dicts with the start, stop and complete keys.
+    """
+
+    model = parflow.Run.from_definition(runscript_path)
+    start_time = float(model.TimingInfo.StartTime or 0)
+    stop_time = float(model.TimingInfo.StopTime)
+    dump_interval = float(model.TimingInfo.DumpInterval)
+    segment_hours = float(segment_hours)
+    if segment_hours <= 0:
+        raise ValueError("The segment_hours must be a positive number of hours.")
+    if (
+        segment_hours % dump_interval != 0
+        or (stop_time - start_time) % dump_interval != 0
+    ):
+        raise ValueError(
+            f"The segment_hours {segment_hours:g} and the hours of the run must be multiples of the DumpInterval {dump_interval:g}."
+        )
+    if (
+        model.Solver.LSM == "CLM"
+        and model.Solver.CLM.DailyRST
+        and segment_hours % 24 != 0
+    ):
+        raise ValueError(
+            f"The segment_hours {segment_hours:g} must be a multiple of 24 because the CLM restart files are written daily."
+        )
+
+    segments = []
+    start = start_time
+    while start < stop_time:
+        stop = min(start + segment_hours, stop_time)
+        segments.append({"start": start, "stop": stop, "complete": False})
+        start = stop
+    directory_path = os.path.dirname(os.path.abspath(runscript_path))
+    previous = read_segments(directory_path)
+    if [(s["start"], s["stop"]) for s in previous] == [
+        (s["start"], s["stop"]) for s in segments
+    ]:
+        return previous
+    shutil.rmtree(os.path.join(directory_path, CHECKPOINT_DIR_NAME), ignore_errors=True)
+    _write_segments(directory_path, segments)
+    return segments
+
+
+def read_segments(directory_path: str) -> list:
+    """Get the list of the segment dicts saved in the segments.json of the directory (empty if none)."""
+
+    path = os.path.join(directory_path, SEGMENTS_FILE_NAME)
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as stream:
+        return json.load(stream).get("segments", [])
+
+
+def run_segments(runscript_path: str, run=None, max_segments: int = None) -> list:
+    """
+    Run the segments planned for the runscript that are not complete yet.
+
+    Parameters:
+        runscript_path:     The path of the runscript with segments planned by plan_segments.
+        run:                A function called with the parflow model of a segment to run it
+                            (defaults to model.run in the directory of the runscript).
+        max_segments:       The maximum number of segments to run in this call (optional),
+                            for example to fit the wall time limit of a scheduler job.
+    Returns:
+        The list of the indexes of the segments that were run.
+    """
+
+    directory_path = os.path.dirname(os.path.abspath(runscript_path))
+    segments = read_segments(directory_path)
+    if not segments:
+        raise ValueError(
+            f"No segments are planned in '{directory_path}'. Call plan_segments first."
+        )
+    if run is None:
+
+        def run(model):
+            model.run(working_directory=directory_path)
+
+    parflow.tools.settings.set_working_directory(directory_path)
+    completed = []
+    for index, segment in enumerate(segments):
+        if segment["complete"]:
+            continue
+        if max_segments is not None and len(completed) >= max_segments:
+            break
+        model = parflow.Run.from_definition(runscript_path)
+        _configure_segment(model, directory_path, index, segments)
+        run(model)
+        _save_checkpoint(model, directory_path, index, segment)
+        segment["complete"] = True
+        _write_segments(directory_path, segments)
+        completed.append(index)
+    return completed
+
+
+def checkpoint_pressure_path(directory_path: str, index: int) -> str:
+    """Get the path of the final pressure of the segment at index (the initial pressure of the next segment)."""
+
+    return os.path.join(_checkpoint_dir(directory_path, index), "press.pfb")
+
+
+def _configure_segment(model, directory_path: str, index: int, segments: list):
+    """Set the timing and the initial conditions of the model to run the segment at index."""
+
+    segment = segments[index]
+    dump_interval = float(model.TimingInfo.DumpInterval)
+    model.TimingInfo.StartTime = segment["start"]
+    model.TimingInfo.StopTime = segment["stop"]
+    model.TimingInfo.StartCount = int(round(segment["start"] / dump_interval))
+    clm = model.Solver.LSM == "CLM"
+    if clm:
+        # CLM runs use a constant TimeStep.Value (the spinup runs use a growing time step without CLM)
+        time_step = float(model.TimeStep.Value)
+        model.Solver.CLM.IstepStart = int(round(segment["start"] / time_step)) + 1
+    if index == 0:
+        if clm:
+            _edit_clm_startcode(directory_path, 2)
+        return
+
+    checkpoint_dir = _checkpoint_dir(directory_path, index - 1)
+    model.Geom.domain.ICPressure.FileName = os.path.relpath(
+        checkpoint_pressure_path(directory_path, index - 1), directory_path
+    )
+    # The initial conditions of the segment are the last outputs of the previous segment
+    model.Solver.PrintInitialConditions = False
+    if clm:
+        clm_dir = _clm_dir(model, directory_path)
+        for path in glob.glob(os.path.join(checkpoint_dir, "clm.rst.*")):
+            shutil.copyfile(path, os.path.join(clm_dir, os.path.basename(path)))
+        _edit_clm_startcode(directory_path, 1)
+
+
+def _save_checkpoint(model, directory_path: str, index: int, segment: dict):
+    """Copy the final pressure output and the CLM restart files of a completed segment to its checkpoint directory."""
+
+    runname = model.get_name()
+    dump_count = int(round(segment["stop"] / float(model.TimingInfo.DumpInterval)))
+    press_path = os.path.join(
+        directory_path, f"{runname}.out.press.{dump_count:05d}.pfb"
+    )
+    if not os.path.exists(press_path):
+        raise FileNotFoundError(
+            f"The segment {index} did not write the pressure output '{os.path.basename(press_path)}'."
+        )
+    checkpoint_dir = _checkpoint_dir(directory_path, index)
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    os.makedirs(checkpoint_dir)
+    checkpoint_press_path = checkpoint_pressure_path(directory_path, index)
+    shutil.copyfile(press_path, checkpoint_press_path)
+    pfb_dist.dist_file(
+        checkpoint_press_path,
+        int(model.Process.Topology.P),
+        int(model.Process.Topology.Q),
+    )
+    if model.Solver.LSM == "CLM":
+        for path in glob.glob(
+            os.path.join(_clm_dir(model, directory_path), "clm.rst.*")
+        ):
+            shutil.copyfile(path, os.path.join(checkpoint_dir, os.path.basename(path)))
+
+
+def _edit_clm_startcode(directory_path: str, startcode: int):
+    """Set the startcode and clm_ic of the CLM driver file (1 = restart file, 2 = defined)."""
+
+    path = os.path.join(directory_path, CLM_DRIVER_FILE_NAME)
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as stream:
+        lines = stream.readlines()
+    for i, line in enumerate(lines):
+        match = re.match(r"^(startcode|clm_ic)\s", line)
+        if match:
+            lines[i] = (
+                f"{match.group(1):<15}{startcode:<37} 1=restart file, 2=defined\n"
+            )
+    # Replace the file rather than writing into it because it may be linked to the files of other projects
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as stream:
+        stream.writelines(lines)
+    os.replace(tmp_path, path)
+
+
+def _clm_dir(model, directory_path: str) -> str:
+    """Get the CLMFileDir of the model as an absolute path."""
+
+    return os.path.join(directory_path, model.Solver.CLM.CLMFileDir or "")
+
+
+def _checkpoint_dir(directory_path: str, index: int) -> str:
+    """Get the directory of the checkpoint of the segment at index."""
+
+    return os.path.join(directory_path, CHECKPOINT_DIR_NAME, f"{index:03d}")
+
+
+def _write_segments(directory_path: str, segments: list):
+    """Save the segments in segments.json of the directory."""
+
+    path = os.path.join(directory_path, SEGMENTS_FILE_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as stream:
+        json.dump({"segments": segments}, stream, indent=1)
+    os.replace(tmp_path, path)
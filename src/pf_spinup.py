@@ -0,0 +1,237 @@
+"""
+Run a spinup until the subsurface storage and the water table depth converge.
+
+A spinup runscript (run_type "spinup") runs to a fixed TimingInfo.StopTime whether or not the
+domain reached equilibrium. run_spinup runs the spinup as segments of pf_segments and after
+each segment compares the consecutive pressure outputs dumped so far:
+
+    storage_change:     The change of the total subsurface storage between two dumps
+                        relative to the storage of the earlier dump.
+    wtd_change:         The largest change of the water table depth (m) of an active
+                        column between two dumps.
+
+The spinup stops after the first segment that ends with both changes below the tolerances
+and the remaining segments are not run. The final pressure of that segment is the initial
+pressure for later runs. The convergence of every dump is saved in spinup_report.json in
+the run directory. The storage is computed from the porosity, specific storage and mask
+outputs written by the run (Solver.PrintSubsurfData and Solver.PrintMask).
+
+Example:
+
+.. code-block:: python
+
+    report = pf_spinup.run_spinup(runscript_path, segment_hours=5000, storage_tolerance=1e-5, wtd_tolerance=0.01)
+    if report["converged"]:
+        print(report["converged_time"], report["initial_pressure"])
+"""
+
+# pylint: disable = C0301,R0913,R0914
+import os
+import json
+import numpy as np
+import parflow
+from parflow.tools import hydrology
+import pf_outputs
+import pf_segments
+
+REPORT_FILE_NAME = "spinup_report.json"
+DEFAULT_STORAGE_TOLERANCE = 1.0e-5
+DEFAULT_WTD_TOLERANCE = 0.01
+
+
+def run_spinup(
+    runscript_path: str,
+    segment_hours: float,
+    storage_tolerance: float = DEFAULT_STORAGE_TOLERANCE,
+    wtd_tolerance: float = DEFAULT_WTD_TOLERANCE,
+    run=None,
+    max_segments: int = None,
+) -> dict:
+    """
+    Run the segments of a spinup until the storage and water table depth converge.
+
+    The convergence is checked before the first segment, so calling run_spinup again
+    resumes an interrupted spinup and does nothing if the spinup already converged.
+    Parameters:
+        runscript_path:     The path of the spinup runscript returned by create_project.
+        segment_hours:      The hours of each segment between convergence checks.
+        storage_tolerance:  The relative change of the subsurface storage between dumps to converge.
+        wtd_tolerance:      The change of the water table depth (m) between dumps to converge.
+        run:                A function called with the parflow model of a segment to run it (see pf_segments.run_segments).
+        max_segments:       The maximum number of segments to run in this call (optional).
+    Returns:
+        The convergence report saved in spinup_report.json.
+    """
+
+    directory_path = os.path.dirname(os.path.abspath(runscript_path))
+    pf_segments.plan_segments(runscript_path, segment_hours)
+    ran = 0
+    while True:
+        report = spinup_report(runscript_path, storage_tolerance, wtd_tolerance)
+        _write_report(directory_path, report)
+        if report["converged"] or report["segments_complete"] == report["segments"]:
+            return report
+        if max_segments is not None and ran >= max_segments:
+            return report
+        if not pf_segments.run_segments(runscript_path, run=run, max_segments=1):
+            return report
+        ran += 1
+
+
+def spinup_report(
+    runscript_path: str,
+    storage_tolerance: float = DEFAULT_STORAGE_TOLERANCE,
+    wtd_tolerance: float = DEFAULT_WTD_TOLERANCE,
+) -> dict:
+    """
+    Get the convergence report of the pressure outputs of a spinup run directory.
+
+    The storage and water table depth of a dump recorded in an existing spinup_report.json
+    are reused if the pressure output did not change.
+    Parameters:
+        runscript_path:     The path of the spinup runscript.
+        storage_tolerance:  The relative change of the subsurface storage between dumps to converge.
+        wtd_tolerance:      The change of the water table depth (m) between dumps to converge.
+    Returns:
+        A dict with the list of the dumps, the converged flag and time and the initial_pressure path.
+    """
+
+    directory_path = os.path.dirname(os.path.abspath(runscript_path))
+    model = parflow.Run.from_definition(runscript_path)
+    runname = model.get_name()
+    dump_interval = float(model.TimingInfo.DumpInterval)
+    segments = pf_segments.read_segments(directory_path)
+    complete = [index for index, segment in enumerate(segments) if segment["complete"]]
+    previous = {dump["timestep"]: dump for dump in _read_report(directory_path).get("dumps", [])}
+
+    outputs = pf_outputs.OutputDataset(directory_path, runname)
+    dumps = []
+    if "press" in outputs and "satur" in outputs:
+        subsurface = _SubsurfaceData(model, directory_path, runname)
+        press = outputs["press"]
+        satur = outputs["satur"]
+        satur_paths = dict(zip(satur.timesteps, satur.paths))
+        # The dump before the current dump as (dump, water table depth or None, pressure path, saturation path)
+        before = None
+        changed = False
+        for timestep, path in zip(press.timesteps, press.paths):
+            if timestep not in satur_paths:
+                continue
+            mtime_ns = os.stat(path).st_mtime_ns
+            dump = previous.get(timestep)
+            if changed or dump is None or dump["mtime_ns"] != mtime_ns:
+                # The changes of all later dumps are computed again
+                changed = True
+                pressure = parflow.read_pfb(path)
+                saturation = parflow.read_pfb(satur_paths[timestep])
+                wtd = subsurface.water_table_depth(pressure, saturation)
+                storage = subsurface.storage(pressure, saturation)
+                dump = {
+                    "timestep": timestep,
+                    "time": timestep * dump_interval,
+                    "mtime_ns": mtime_ns,
+                    "storage": storage,
+                    "wtd_mean": float(np.mean(wtd)) if wtd.size else 0.0,
+                }
+                if before is not None:
+                    before_dump, wtd_before, before_path, before_satur_path = before
+                    if wtd_before is None:
+                        wtd_before = subsurface.water_table_depth(
+                            parflow.read_pfb(before_path), parflow.read_pfb(before_satur_path)
+                        )
+                    storage_before = before_dump["storage"]
+                    dump["storage_change"] = (
+                        abs(storage - storage_before) / storage_before if storage_before else 0.0
+                    )
+                    dump["wtd_change"] = float(np.max(np.abs(wtd - wtd_before))) if wtd.size else 0.0
+                before = (dump, wtd, path, satur_paths[timestep])
+            else:
+                before = (dump, None, path, satur_paths[timestep])
+            dumps.append(dump)
+
+    last = dumps[-1] if dumps else {}
+    converged = (
+        bool(complete)
+        and "storage_change" in last
+        and last["storage_change"] <= storage_tolerance
+        and last["wtd_change"] <= wtd_tolerance
+        and last["time"] == segments[complete[-1]]["stop"]
+    )
+    return {
+        "storage_tolerance": storage_tolerance,
+        "wtd_tolerance": wtd_tolerance,
+        "stop_time": float(model.TimingInfo.StopTime),
+        "segments": len(segments),
+        "segments_complete": len(complete),
+        "converged": converged,
+        "converged_time": last["time"] if converged else None,
+        "initial_pressure": (
+            os.path.relpath(pf_segments.checkpoint_pressure_path(directory_path, complete[-1]), directory_path)
+            if complete
+            else None
+        ),
+        "dumps": dumps,
+    }
+
+
+class _SubsurfaceData:
+    """The porosity, specific storage, mask and layer thicknesses used to compute the storage of a pressure output."""
+
+    def __init__(self, model, directory_path: str, runname: str):
+        def read(name):
+            path = os.path.join(directory_path, f"{runname}.out.{name}.pfb")
+            if not os.path.exists(path):
+                raise FileNotFoundError(
+                    f"The spinup output '{os.path.basename(path)}' is required. Set Solver.PrintSubsurfData and Solver.PrintMask."
+                )
+            return parflow.read_pfb(path)
+
+        self.porosity = read("porosity")
+        self.specific_storage = read("specific_storage")
+        self.mask = read("mask")
+        self.dx = float(model.ComputationalGrid.DX)
+        self.dy = float(model.ComputationalGrid.DY)
+        self.dz = _layer_thicknesses(model, self.mask.shape[0])
+        self.active = self.mask.max(axis=0) > 0
+
+    def storage(self, pressure, saturation) -> float:
+        """The total subsurface storage (m^3) of the active cells."""
+
+        storage = hydrology.calculate_subsurface_storage(
+            self.porosity, pressure, saturation, self.specific_storage, self.dx, self.dy, self.dz, mask=self.mask
+        )
+        return float(np.sum(storage))
+
+    def water_table_depth(self, pressure, saturation):
+        """The water table depth (m) of the active columns."""
+
+        return hydrology.calculate_water_table_depth(pressure, saturation, self.dz)[self.active]
+
+
+def _layer_thicknesses(model, nz: int):
+    """Get the thickness of each layer from the bottom layer (with the variable dz scales of the model)."""
+
+    dz = float(model.ComputationalGrid.DZ)
+    if not model.Solver.Nonlinear.VariableDz:
+        return np.full(nz, dz)
+    return np.array([dz * float(model.Cell[str(layer)].dzScale.Value) for layer in range(0, nz)])
+
+
+def _read_report(directory_path: str) -> dict:
+    """Get the report saved in spinup_report.json of the directory (empty if none)."""
+
+    path = os.path.join(directory_path, REPORT_FILE_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as stream:
+        return json.load(stream)
+
+
+def _write_report(directory_path: str, report: dict):
+    """Save the report in spinup_report.json of the directory."""
+
+    path = os.path.join(directory_path, REPORT_FILE_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as stream:
+        json.dump(report, stream, indent=1)
+    os.replace(tmp_path, path)
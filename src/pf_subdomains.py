@@ -0,0 +1,253 @@
+"""
+Split the domain of a project into independent sub-projects that are built and run in parallel
+and merge their outputs back onto the grid of the parent domain.
+
+The bounding box of a list of HUCs or of an irregular watershed may be mostly inactive cells
+that parflow still allocates and partitions. For basins that do not exchange water the domain
+can be split into tighter sub-domains:
+
+    "huc":      One sub-domain per HUC of the huc_id list.
+    "region":   One sub-domain per connected region of active cells of the mask (cells connected
+                by a face), with the grid_bounds of the region and a mask of only its cells.
+                A region of fewer than min_cells cells is merged into the nearest larger region
+                so small islands of the mask do not become projects of their own.
+
+Each sub-domain is a project in <directory_path>/<name> created with create_project (and
+optionally run with parflow) in parallel by pf_scenarios.run_scenarios, so the core budget
+of the topology of each sub-project is respected. The sub-domains are saved in subdomains.json
+and their masks in subdomains.npz of the directory_path. merge_outputs writes the outputs of
+the sub-projects as the outputs of the parent domain <directory_path>/<runname>.out.<var>.<t>.pfb
+with the inactive cells of the sub-projects set to a fill value.
+
+Example:
+
+.. code-block:: python
+
+    project_options = {"huc_id": "02080203", "start_date": "2005-10-01", "end_date": "2005-10-02"}
+    summary = pf_subdomains.create_subprojects(project_options, "./basins", split="region", run_parflow=True)
+    pf_subdomains.merge_outputs("./basins")
+"""
+
+# pylint: disable = C0301,R0913,R0914
+import os
+import json
+import functools
+import numpy as np
+import scipy.ndimage
+import parflow
+import project
+import pf_outputs
+import pf_scenarios
+
+SUBDOMAINS_FILE_NAME = "subdomains.json"
+SUBDOMAIN_MASKS_FILE_NAME = "subdomains.npz"
+SPLIT_MODES = ["huc", "region"]
+
+# The minimum number of active cells of the sub-domain of a region
+MIN_REGION_CELLS = 100
+
+
+def split_domain(project_options: dict, split: str = "region", min_cells: int = MIN_REGION_CELLS) -> list:
+    """
+    Split the domain of the project options into sub-domains.
+
+    Parameters:
+        project_options:    The options of create_project of the parent domain.
+        split:              Either "huc" (one sub-domain per HUC) or "region" (one per connected region of the mask).
+        min_cells:          The regions with fewer active cells are merged into the nearest region with
+                            at least min_cells cells (or into the largest region if there is none).
+    Returns:
+        A list of (name, ij_bounds, mask, sub_project_options) of the sub-domains.
+    """
+
+    if split not in SPLIT_MODES:
+        raise ValueError(f"Unsupported split '{split}'. Must be one of {SPLIT_MODES}.")
+    sub_domains = []
+    if split == "huc":
+        huc_id = project_options.get("huc_id")
+        if not huc_id:
+            raise ValueError("A huc_id option is required to split the domain by HUC.")
+        hucs = huc_id if isinstance(huc_id, (list, tuple)) else huc_id.split(",")
+        for huc in hucs:
+            huc = str(huc).strip()
+            options = {**project_options, "huc_id": [huc]}
+            domain = project.resolve_domain(options)
+            sub_domains.append((f"huc_{huc}", list(domain.ij_bounds), np.array(domain.mask), options))
+        return sub_domains
+
+    domain = project.resolve_domain(project_options)
+    labels, count = scipy.ndimage.label(np.asarray(domain.mask) > 0)
+    if count == 0:
+        raise ValueError("The mask of the domain has no active cells.")
+    labels = _merge_small_regions(labels, count, min_cells)
+    base_options = {
+        key: value
+        for key, value in project_options.items()
+        if key not in ("huc_id", "latlon_bounds", "grid_bounds", "mask")
+    }
+    for label, (y_slice, x_slice) in enumerate(scipy.ndimage.find_objects(labels), start=1):
+        ij_bounds = [
+            domain.ij_bounds[0] + x_slice.start,
+            domain.ij_bounds[1] + y_slice.start,
+            domain.ij_bounds[0] + x_slice.stop,
+            domain.ij_bounds[1] + y_slice.stop,
+        ]
+        mask = (labels[y_slice, x_slice] == label).astype(int)
+        options = {**base_options, "grid_bounds": ij_bounds, "mask": mask}
+        sub_domains.append((f"region_{label:03d}", ij_bounds, mask, options))
+    return sub_domains
+
+
+def _merge_small_regions(labels, count: int, min_cells: int):
+    """
+    Merge the regions of labels with fewer than min_cells cells into the nearest larger region.
+    Returns:
+        The labels of the merged regions numbered from 1 in the order of the larger regions.
+    """
+
+    sizes = np.bincount(labels.ravel(), minlength=count + 1)
+    sizes[0] = 0
+    kept = sizes >= min_cells
+    kept[0] = False
+    if not kept.any():
+        kept[np.argmax(sizes)] = True
+    # The index of the nearest cell of a kept region of every cell
+    _, (y_nearest, x_nearest) = scipy.ndimage.distance_transform_edt(
+        ~kept[labels], return_indices=True
+    )
+    nearest = labels[y_nearest, x_nearest]
+    merged = labels.copy()
+    for label in np.flatnonzero(~kept)[1:]:
+        cells = labels == label
+        merged[cells] = np.argmax(np.bincount(nearest[cells]))
+    numbers = np.zeros(count + 1, dtype=labels.dtype)
+    numbers[kept] = np.arange(1, int(kept.sum()) + 1)
+    return numbers[merged]
+
+
+def create_subprojects(
+    project_options: dict,
+    directory_path: str,
+    split: str = "region",
+    max_workers: int = None,
+    run_parflow: bool = False,
+    total_cores: int = None,
+    min_cells: int = MIN_REGION_CELLS,
+) -> dict:
+    """
+    Create (and optionally run) the sub-projects of the sub-domains of the project options in parallel.
+
+    Parameters:
+        project_options:    The options of create_project of the parent domain.
+        directory_path:     The directory of the sub-project directories and the subdomains.json file.
+        split:              Either "huc" or "region" (see split_domain).
+        max_workers:        The maximum number of sub-projects processed at the same time (defaults to total_cores).
+        run_parflow:        If True run parflow for each sub-project after it is created.
+        total_cores:        The number of cores that may be used by all sub-projects (defaults to os.cpu_count()).
+        min_cells:          The minimum number of active cells of the sub-domain of a region (see split_domain).
+    Returns:
+        The summary dict of pf_scenarios.run_scenarios with the timings and failures of every sub-project.
+    """
+
+    directory_path = os.path.abspath(directory_path)
+    sub_domains = split_domain(project_options, split, min_cells)
+    parent = project.resolve_domain(project_options)
+    os.makedirs(directory_path, exist_ok=True)
+    with open(os.path.join(directory_path, SUBDOMAINS_FILE_NAME), "w", encoding="utf-8") as stream:
+        json.dump(
+            {
+                "split": split,
+                "ij_bounds": [int(value) for value in parent.ij_bounds],
+                "subdomains": [
+                    {"name": name, "ij_bounds": [int(value) for value in ij_bounds]}
+                    for name, ij_bounds, _, _ in sub_domains
+                ],
+            },
+            stream,
+            indent=1,
+        )
+    np.savez_compressed(
+        os.path.join(directory_path, SUBDOMAIN_MASKS_FILE_NAME),
+        **{name: mask for name, _, mask, _ in sub_domains},
+    )
+    return pf_scenarios.run_scenarios(
+        [(name, options) for name, _, _, options in sub_domains],
+        max_workers=max_workers,
+        run_parflow=run_parflow,
+        total_cores=total_cores,
+        scenarios_dir=directory_path,
+        execute=functools.partial(_create_subproject, directory_path),
+    )
+
+
+def merge_outputs(
+    directory_path: str, runname: str = None, variables=None, fill_value: float = np.nan
+) -> dict:
+    """
+    Write the outputs of the sub-projects as outputs of the grid of the parent domain.
+
+    A timestep is merged when the output files of the timestep of all the sub-projects with
+    the variable are completely written. Timesteps already merged are skipped so merge_outputs may be
+    called while the sub-projects are running.
+    Parameters:
+        directory_path: The directory of the sub-projects created by create_subprojects.
+        runname:        The runname of the merged output files (defaults to the name of the directory).
+        variables:      The output variables to merge (defaults to all the variables of the sub-projects).
+        fill_value:     The value of the cells of the parent grid that are not active in any sub-project.
+    Returns:
+        A dict with the number of timesteps merged of each variable.
+    """
+
+    directory_path = os.path.abspath(directory_path)
+    runname = runname if runname else os.path.basename(directory_path)
+    with open(os.path.join(directory_path, SUBDOMAINS_FILE_NAME), "r", encoding="utf-8") as stream:
+        subdomains = json.load(stream)
+    masks = np.load(os.path.join(directory_path, SUBDOMAIN_MASKS_FILE_NAME))
+    parent_bounds = subdomains["ij_bounds"]
+    parent_shape = (parent_bounds[3] - parent_bounds[1], parent_bounds[2] - parent_bounds[0])
+
+    sub_outputs = []
+    for subdomain in subdomains["subdomains"]:
+        sub_dir = os.path.join(directory_path, subdomain["name"])
+        if os.path.isdir(sub_dir):
+            sub_outputs.append(
+                (subdomain, masks[subdomain["name"]] > 0, pf_outputs.OutputDataset(sub_dir, subdomain["name"]))
+            )
+    if variables is None:
+        variables = sorted({variable for _, _, outputs in sub_outputs for variable in outputs.variables})
+
+    merged = {}
+    for variable in variables:
+        merged[variable] = 0
+        files = {}
+        with_variable = [outputs for _, _, outputs in sub_outputs if variable in outputs]
+        for subdomain, mask, outputs in sub_outputs:
+            if variable in outputs:
+                for timestep, path in zip(outputs[variable].timesteps, outputs[variable].paths):
+                    files.setdefault(timestep, []).append((subdomain, mask, path))
+        for timestep, timestep_files in sorted(files.items()):
+            suffix = ".C" if timestep_files[0][2].endswith(".C.pfb") else ""
+            merged_path = os.path.join(directory_path, f"{runname}.out.{variable}.{timestep:05d}{suffix}.pfb")
+            if os.path.exists(merged_path) or len(timestep_files) < len(with_variable):
+                continue
+            layouts = [pf_outputs.PfbLayout(path) for _, _, path in timestep_files]
+            if not all(pf_outputs.is_complete_pfb(layout.path, layout.shape) for layout in layouts):
+                continue
+            data = np.full((layouts[0].shape[0],) + parent_shape, fill_value, dtype=np.float64)
+            for (subdomain, mask, path), layout in zip(timestep_files, layouts):
+                x0 = subdomain["ij_bounds"][0] - parent_bounds[0]
+                y0 = subdomain["ij_bounds"][1] - parent_bounds[1]
+                window = data[:, y0 : y0 + mask.shape[0], x0 : x0 + mask.shape[1]]
+                window[:, mask] = parflow.read_pfb(path)[:, mask]
+            dx, dy, dz = layouts[0].spacing
+            tmp_path = f"{merged_path}.tmp"
+            parflow.write_pfb(tmp_path, data, dx=dx, dy=dy, dz=dz, dist=False)
+            os.replace(tmp_path, merged_path)
+            merged[variable] += 1
+    return merged
+
+
+def _create_subproject(directory_path: str, runname: str, options: dict) -> str:
+    """Create the project of a sub-domain in a worker process of run_scenarios."""
+
+    return project.create_project(options, os.path.join(directory_path, runname))
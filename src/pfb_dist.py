@@ -0,0 +1,194 @@
+"""
+Distribute parflow pfb input files to the subgrids of a P x Q topology in parallel.
+
+Distributing a pfb file rewrites it with one subgrid per rank of the topology and
+writes a <file>.pfb.dist file with the offset of each subgrid. This writes the same
+files as parflow Run.dist (and subsettools dist_run) with these differences:
+
+    - The files are distributed by a process pool with the file list sharded across the workers.
+    - A file whose subgrids and .dist file already match the topology is skipped.
+    - A file is written to a temporary file that replaces the original file, so a file
+      linked from a cache or from another file is never changed in place.
+    - Files that are links to the same data are distributed once and linked again.
+
+Example:
+
+.. code-block:: python
+
+    paths = pfb_dist.input_paths(directory_path)
+    result = pfb_dist.distribute_files(paths, p=2, q=2, workers=4)
+    print(len(result["distributed"]), len(result["skipped"]))
+"""
+
+# pylint: disable = C0301
+import os
+import concurrent.futures
+import data_cache
+import lazy_import
+import pf_outputs
+
+parflow = lazy_import.LazyModule("parflow")
+parflow_io = lazy_import.LazyModule("parflow.tools.io")
+
+
+def input_paths(*directory_paths):
+    """
+    Get the pfb input files of the directories in the order of the file names.
+
+    The parflow output files (with .out. in the name) are not input files.
+    Returns:
+        A list of the paths of the pfb files (each path only once).
+    """
+
+    paths = []
+    for directory_path in directory_paths:
+        if not directory_path or not os.path.isdir(directory_path):
+            continue
+        for file_name in sorted(os.listdir(directory_path)):
+            path = os.path.join(os.path.abspath(directory_path), file_name)
+            if file_name.endswith(".pfb") and ".out." not in file_name and path not in paths:
+                paths.append(path)
+    return paths
+
+
+def is_dist_current(path: str, p: int, q: int) -> bool:
+    """
+    Returns True if the pfb file at path is already distributed for the p x q topology.
+
+    The subgrids of the file must be the subgrids of the topology, the file must be
+    complete and the .dist file must contain the offsets of those subgrids.
+    """
+
+    dist_path = f"{path}.dist"
+    if not os.path.exists(dist_path):
+        return False
+    try:
+        layout = pf_outputs.PfbLayout(path)
+    except Exception:
+        return False
+    nz, ny, nx = layout.shape
+    sg_offs, _, sg_starts, sg_shapes = parflow_io.precalculate_subgrid_info(nx, ny, nz, p, q, 1)
+    expected = [
+        ((iz, iy, ix), (snz, sny, snx))
+        for (ix, iy, iz), (snx, sny, snz) in zip(sg_starts, sg_shapes)
+    ]
+    if [(lower, size) for lower, size, _ in layout.subgrids] != expected:
+        return False
+    if not pf_outputs.is_complete_pfb(path, layout.shape):
+        return False
+    with open(dist_path, "r", encoding="utf-8") as stream:
+        return stream.read() == _dist_text(sg_offs)
+
+
+def dist_file(path: str, p: int, q: int) -> bool:
+    """
+    Distribute a pfb file to the subgrids of the p x q topology unless it is already current.
+    Returns:
+        True if the file was distributed, False if it was skipped.
+    """
+
+    if is_dist_current(path, p, q):
+        return False
+    with parflow_io.ParflowBinaryReader(path, read_sg_info=True) as pfb:
+        array = pfb.read_all_subgrids()
+        header = pfb.header
+    nz, ny, nx = array.shape
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    try:
+        parflow.write_pfb(
+            tmp_path,
+            array,
+            p=p,
+            q=q,
+            r=1,
+            dx=header["dx"],
+            dy=header["dy"],
+            dz=header["dz"],
+            dist=False,
+        )
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    sg_offs = parflow_io.precalculate_subgrid_info(nx, ny, nz, p, q, 1)[0]
+    dist_path = f"{path}.dist"
+    if os.path.lexists(dist_path):
+        os.remove(dist_path)
+    with open(dist_path, "w", encoding="utf-8") as stream:
+        stream.write(_dist_text(sg_offs))
+    return True
+
+
+def distribute_files(paths, p: int, q: int, workers: int = None, callback=None) -> dict:
+    """
+    Distribute pfb files to the subgrids of the p x q topology using a pool of processes.
+
+    Parameters:
+        paths:      The paths of the pfb files.
+        p, q:       The number of subgrids in the x and y directions.
+        workers:    The number of processes (defaults to os.cpu_count()). With 1 worker
+                    the files are distributed in this process.
+        callback:   A function called in this process with the list of the paths of each file
+                    (and of its links) as soon as the file is distributed or skipped (optional).
+    Returns:
+        A dict with the lists of the "distributed" and "skipped" paths.
+    """
+
+    p = int(p)
+    q = int(q)
+    groups = _link_groups(paths)
+    first_paths = list(groups.keys())
+    workers = max(1, min(int(workers or os.cpu_count() or 1), len(first_paths)))
+    result = {"distributed": [], "skipped": []}
+
+    def done(first_path, was_distributed):
+        for path in groups[first_path]:
+            if path != first_path:
+                # Link the distributed pfb and .dist files again in the same way as before
+                link_mode = "symlink" if os.path.islink(path) else "hardlink"
+                data_cache.link_or_copy(first_path, path, link_mode)
+                data_cache.link_or_copy(f"{first_path}.dist", f"{path}.dist", link_mode)
+            result["distributed" if was_distributed else "skipped"].append(path)
+        if callback:
+            callback(groups[first_path])
+
+    if workers == 1 or len(first_paths) < 2:
+        for path in first_paths:
+            done(path, dist_file(path, p, q))
+    else:
+        chunk_size = max(1, len(first_paths) // (workers * 4))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            distributed = executor.map(
+                dist_file,
+                first_paths,
+                [p] * len(first_paths),
+                [q] * len(first_paths),
+                chunksize=chunk_size,
+            )
+            for first_path, was_distributed in zip(first_paths, distributed):
+                done(first_path, was_distributed)
+    return result
+
+
+def _link_groups(paths):
+    """
+    Group the paths of files with the same data (hardlinks or symlinks to the same file).
+    Returns:
+        A dict of the first path of each group to the list of the paths of the group.
+    """
+
+    groups = {}
+    first_by_inode = {}
+    for path in paths:
+        stat = os.stat(path)
+        first_path = first_by_inode.setdefault((stat.st_dev, stat.st_ino), path)
+        groups.setdefault(first_path, []).append(path)
+    return groups
+
+
+def _dist_text(sg_offs) -> str:
+    """Get the contents of the .dist file of the subgrid offsets (as written by parflow write_dist)."""
+
+    return "".join(
+        f"{offset - 100 if i == 0 else offset - 36}\n" for i, offset in enumerate(sg_offs)
+    )
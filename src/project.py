@@ -9,10 +9,66 @@ This uses subsettools functions to create and populate the parflow directory.
 import os
 import shutil
 import datetime
-import parflow
-import numpy as np
-import hf_hydrodata as hf
-import subsettools as st
+import hashlib
+import functools
+import concurrent.futures
+import data_cache
+import lazy_import
+import project_manifest
+import instrumentation
+import data_provider
+import pf_outputs
+
+# hf_hydrodata, subsettools, parflow and numpy are imported by the first stage that uses them
+hf = lazy_import.LazyModule("hf_hydrodata")
+st = lazy_import.LazyModule("subsettools")
+parflow = lazy_import.LazyModule("parflow")
+np = lazy_import.LazyModule("numpy")
+
+# The modules of the optional features are imported by the first project that uses them
+output_store = lazy_import.LazyModule("output_store")
+pfb_dist = lazy_import.LazyModule("pfb_dist")
+pf_segments = lazy_import.LazyModule("pf_segments")
+output_policy = lazy_import.LazyModule("output_policy")
+solver_profiles = lazy_import.LazyModule("solver_profiles")
+
+# The minimum number of active cells and subgrid width of each rank of an "auto" topology
+MIN_CELLS_PER_RANK = 10000
+MIN_SUBGRID_WIDTH = 8
+
+# The number of distributed files recorded in the project manifest at a time by the dist stage
+DIST_RECORD_FILES = 64
+
+# The templates of the run_type option in template_runscripts
+TEMPLATES = {
+    "transient": "conus2_transient_solid.yaml",
+    "spinup": "conus2_spinup_solid.yaml",
+}
+
+# The keys a template runscript must define that are not set from the domain
+TEMPLATE_REQUIRED_KEYS = [
+    "ComputationalGrid.DX",
+    "ComputationalGrid.DY",
+    "ComputationalGrid.DZ",
+    "ComputationalGrid.NZ",
+]
+
+# The default number of days of forcing subset at a time
+FORCING_CHUNK_DAYS = 30
+
+# The bytes of each hf_hydrodata read of a forcing variable by subsettools.subset_forcing
+FORCING_READ_BLOCK_BYTES = 1500000000
+
+FORCING_VARIABLES = [
+    "downward_shortwave",
+    "precipitation",
+    "downward_longwave",
+    "specific_humidity",
+    "air_temp",
+    "atmospheric_pressure",
+    "east_windspeed",
+    "north_windspeed",
+]
 
 
 def create_project(project_options: dict, directory_path: str = "project_dir") -> str:
@@ -27,24 +83,85 @@ def create_project(project_options: dict, directory_path: str = "project_dir") -
     The project_options dict supports the keys:
         run_type:       Either "transient" or "spinup" (defaults to "transient").
         template:       The path to a parflow yaml file for parflow parameters (optional).
+                        Defaults to the template of the run_type in template_runscripts.
         start_date:     The start date of the run as as string YYYY-mm-dd.
         end_date:       The end date of the run as as string YYYY-mm-dd.
         time_steps:     The number of timesteps to run parflow (defaults to hours between start/end).
         dump_interval:  The number of timesteps to dump parflow output files
         huc_id:         An array or comma seperated list of HUC id to subset inputs and outputs (optional).
         grid_bounds:    The conus2 points to subset (min_x, min_y, max_x, max_y) (optional).
+        mask:           A 2D array (ny, nx) of 1 for the active cells of the grid_bounds (defaults to all cells active).
         latlon_bounds:  The latlon bounds to subset ((min,lat, min_lon),(max_lat, max_lon) (optional).
         forcing_day:    Use fixed forcing data for every input hour using this day (YYYY-mm-dd).
         forcing_precip: Use this fixed precipitation value for every input hour (optional).
         grid:           The grid size (only conus2 is supported now) (defaults to conus2).
-        topology:       An array or tuple [p, q, r] that defines the topology for generated pfb files.
+        topology:       An array or tuple [p, q, r] that defines the topology for generated pfb files
+                        or "auto" to choose p and q from the domain size, the mask and the available cores.
+        available_cores: The number of cores used to choose an "auto" topology (defaults to os.cpu_count()).
+        min_cells_per_rank: The minimum number of active cells per rank of an "auto" topology (defaults to 10000).
+        cache_dir:      A directory to cache downloaded hf_hydrodata and subsettools files (optional).
+        cache_max_bytes: The maximum size of the cache_dir in bytes (defaults to 50 GB).
+        cache_link_mode: Either "copy", "hardlink" or "symlink" to put cached files into the project (defaults to "copy").
+        forcing_link_mode: Either "copy", "hardlink" or "symlink" to create the fixed forcing_day files (defaults to "hardlink").
+        forcing_workers: The number of forcing variables to download concurrently for forcing_day (defaults to 8).
+        forcing_chunk_days: The number of days of forcing to subset at a time when not using forcing_day (defaults to 30).
+        forcing_memory_bytes: A budget in bytes of the forcing read buffers that reduces the days of each forcing chunk
+                        (optional, see forcing_chunk_days).
+        pipeline:       If True run the independent stages concurrently and distribute the forcing files
+                        as each chunk of days is written (defaults to False).
+        segment_hours:  Split the run into segments of this many hours run by pf_segments.run_segments (optional).
+        solver_profile: Either "auto", the name of a solver profile or a dict of solver settings to set the linear solver
+                        for the size of the domain and the topology (see the solver_profiles module) (optional).
+        solver_profiles_path: A JSON file of the tuned solver profiles saved by solver_profiles.tune_profile (optional).
+        output_policy:  A dict of the output variables to print with the interval and top_layers of each variable
+                        and the complevel to compress the outputs (see the output_policy module) (optional).
+        dist_workers:   The number of processes used to distribute the pfb files to the topology (defaults to os.cpu_count()).
+        resume:         If True skip the stages already completed in the directory_path with the same options (defaults to True).
+        instrument:     If True write a timeline report of the stages and external calls to project_timeline.json (defaults to False).
+        instrument_listeners: A list of callables called with the start and end event dict of each stage and external call (optional).
+        profile:        Either "cprofile" or "tracemalloc" to profile each stage into the profiles directory (optional).
+        data_provider:  Either "hydrodata" or "local" to get the static, clm and forcing data (defaults to "hydrodata").
+        data_mirror_dir: The directory of the local mirror of the full CONUS files used by the "local" data_provider.
 
     Only one of hucs, grid_bounds or latlon_bounds may be provided.
     If template is provided this overrides the run_type.
-    The topology defaults to (1,1,1).
+    The topology defaults to (1,1,1). The reason for an "auto" topology is recorded
+    in the Metadata.Description of the runscript.
+
+    The options and the files created by each stage are recorded in a project_manifest.json
+    file in the directory_path. When create_project is called again for the same directory_path
+    the stages with unchanged options and intact files are skipped and the forcing files
+    are resumed from the last complete day.
+
+    The stages and the calls to subsettools, hf_hydrodata and parflow emit start and end events
+    with the duration, bytes and files of each call to the instrument_listeners (see the
+    instrumentation module). With instrument the timeline of the events is written to
+    project_timeline.json in the directory_path.
+
+    The forcing files are subset in chunks of forcing_chunk_days (reduced so the read buffers fit in
+    forcing_memory_bytes) and each day is written as soon as its chunk is complete. The end event of
+    the forcing_chunk span of each chunk has the first_day, last_day and the days of the run to report the progress.
+
+    With segment_hours the segments of the run are planned in segments.json in the directory_path.
+    pf_segments.run_segments runs each segment from the final pressure and CLM restart files of
+    the previous segment and resumes from the last complete segment after a failure.
+
+    With output_policy only the variables of the policy are printed by parflow with the DumpInterval
+    set to the greatest common divisor of the variable intervals. The policy is saved in
+    output_policy.json and output_policy.thin_outputs removes the outputs between the interval of
+    each variable, keeps the top layers and compresses the outputs after (or during) the run.
+
+    The pfb input files are distributed to the topology by a pool of dist_workers processes
+    (see the pfb_dist module). Files already distributed for the same topology are skipped.
+    Use redistribute_project to change the topology of an existing project without fetching
+    the data again.
 
     The hucs may be a string of a comma seperated list of HUC id or an array of HUC id.
 
+    With the "local" data_provider the static, clm and forcing files are read by memory mapping the
+    ij_bounds window of the full CONUS files in data_mirror_dir (see the data_provider module)
+    instead of using the hf_hydrodata service.
+
     Collects all required parflow input files into the directory_path.
     This uses subsettools and hf_hydrodata to subset the input files to the domain
     defined by hucs, grid_bounds, or latlon_bounds.
@@ -81,33 +198,284 @@ def create_project(project_options: dict, directory_path: str = "project_dir") -
     """
 
     runname = os.path.basename(directory_path)
-    run_type = project_options.get("run_type")
+    template = resolve_template(project_options)
+
+    events, collector = _create_instrumentation(project_options, directory_path)
+    with events.span("runscript", "stage"):
+        runscript_path, model = _create_runscript(runname, directory_path, template)
+    build = _ProjectBuild(project_options, runname, runscript_path, model)
+    build.events = events
+    with events.span("domain", "stage"):
+        build.domain = resolve_domain(project_options)
+    build.manifest = project_manifest.ProjectManifest(
+        build.directory_path,
+        exclude=[os.path.basename(runscript_path)],
+        enabled=project_options.get("resume", True),
+    )
+    with events.span("topology", "stage"):
+        _create_topology(build)
+    _create_static_and_forcing(build)
+    _create_dist_files(build)
+    with events.span("write", "stage"):
+        if project_options.get("solver_profile"):
+            solver_profiles.apply_profile(
+                build.model,
+                project_options["solver_profile"],
+                project_options.get("solver_profiles_path"),
+            )
+        if project_options.get("output_policy"):
+            output_policy.apply_policy(
+                build.model,
+                project_options["output_policy"],
+                build.directory_path,
+                run_type=project_options.get("run_type", "transient"),
+                segment_hours=project_options.get("segment_hours"),
+            )
+        build.write()
+        build.manifest.refresh()
+        if project_options.get("segment_hours"):
+            pf_segments.plan_segments(runscript_path, project_options["segment_hours"])
+    if collector:
+        collector.write(
+            os.path.join(build.directory_path, instrumentation.TIMELINE_FILE_NAME)
+        )
+
+    return runscript_path
+
+
+def _create_instrumentation(project_options: dict, directory_path: str):
+    """
+    Create the Instrumentation of the stages configured by the project options.
+    Returns:
+        (events, collector) the Instrumentation and the TimelineCollector (or None if not instrument)
+    """
+
+    listeners = list(project_options.get("instrument_listeners") or [])
+    collector = None
+    if project_options.get("instrument"):
+        collector = instrumentation.TimelineCollector()
+        listeners.append(collector)
+    profile = project_options.get("profile")
+    if not listeners and not profile:
+        return instrumentation.DISABLED, None
+    profile_dir = os.path.join(
+        os.path.abspath(directory_path), instrumentation.PROFILE_DIR_NAME
+    )
+    return instrumentation.Instrumentation(listeners, profile, profile_dir), collector
+
+
+class _ProjectBuild:
+    """
+    The state shared by the stages of create_project.
+
+    The stages update the parflow model in memory. The model is only written to the
+    runscript file before calling a subsettools function that reads or edits the
+    runscript file and once at the end of create_project.
+    """
+
+    def __init__(
+        self, project_options: dict, runname: str, runscript_path: str, model
+    ):
+        self.project_options = project_options
+        self.runname = runname
+        self.runscript_path = runscript_path
+        self.directory_path = os.path.dirname(runscript_path)
+        self.model = model
+        self.domain = None
+        self.manifest = None
+        self.events = instrumentation.DISABLED
+        self.pipeline = bool(project_options.get("pipeline"))
+        self.dist_executor = None
+
+    def write(self):
+        """Write the parflow model to the runscript file."""
+
+        self.model.write(file_format="yaml")
+
+    def edit_runscript(self, *edit_functions):
+        """
+        Call functions that read or edit the runscript file.
+
+        The model is written to the runscript file, each function is called with the
+        runscript path and then the model is reloaded from the edited runscript file.
+        """
+
+        with self.events.span("edit_runscript", "call", self.directory_path):
+            self.write()
+            for edit_function in edit_functions:
+                edit_function(self.runscript_path)
+            self.model = parflow.Run.from_definition(self.runscript_path)
+
+    def run_stage(
+        self, stage: str, inputs: dict, function, depends=(), write_dir: str = None
+    ):
+        """
+        Run a stage with the manifest as a span of the instrumentation.
+        Returns:
+            The value returned by the stage (see ProjectManifest.run).
+        """
+
+        with self.events.span(stage, "stage", write_dir or self.directory_path) as span:
+            result = self.manifest.run(stage, inputs, function, depends, write_dir)
+            span.set(skipped=stage in self.manifest.skipped)
+            return result
+
+    def write_dir(self, stage: str) -> str:
+        """
+        Get the directory where a stage writes its files.
+
+        This is the staging directory of the stage in the manifest. The files are moved
+        into the project directory with os.replace so a file of the project that is a link
+        to a shared file (see pf_ensemble) is replaced and the shared file is never written.
+        """
+
+        return self.manifest.staging_dir(stage)
+
+    def run_all(self, functions):
+        """
+        Call the functions of stages that do not depend on each other.
+
+        In pipeline mode the functions run concurrently in threads and the pfb files passed
+        to distribute are distributed by a pool of dist_workers threads while the stages run.
+        An exception raised by any function is raised by this function.
+        Returns:
+            The list of the values returned by the functions.
+        """
+
+        if not self.pipeline:
+            return [function() for function in functions]
+        dist_workers = int(
+            self.project_options.get("dist_workers") or os.cpu_count() or 1
+        )
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=dist_workers
+        ) as dist_executor, concurrent.futures.ThreadPoolExecutor(
+            max_workers=len(functions)
+        ) as executor:
+            self.dist_executor = dist_executor
+            futures = [executor.submit(function) for function in functions]
+            try:
+                return [future.result() for future in futures]
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+            finally:
+                self.dist_executor = None
+
+    def distribute(self, paths):
+        """
+        Start distributing pfb files to the topology of the model in pipeline mode.
+        Returns:
+            The list of the futures of pfb_dist.dist_file (empty if not in pipeline mode).
+        """
+
+        if self.dist_executor is None:
+            return []
+        p = int(self.model.Process.Topology.P)
+        q = int(self.model.Process.Topology.Q)
+        return [
+            self.dist_executor.submit(pfb_dist.dist_file, path, p, q) for path in paths
+        ]
+
+
+def consolidate_outputs(runscript_path: str, delete_source: bool = False, **kwargs):
+    """
+    Consolidate the per-timestep output files of a parflow run into one chunked,
+    compressed netCDF store <runname>.out.nc in the directory of the runscript.
+
+    The time coordinate of the store is computed from the TimingInfo of the runscript.
+    This may be called repeatedly while the run is progressing to append the new output files.
+
+    Parameters:
+        runscript_path:     The path of the runscript returned by create_project.
+        delete_source:      If True remove the pfb output files once they are stored.
+        kwargs:             Other arguments of output_store.consolidate_outputs (variables, chunks, complevel).
+    Returns:
+        A dict with the number of timesteps appended to each variable.
+    """
+
+    model = parflow.Run.from_definition(runscript_path)
+    timing = {
+        "start_time": model.TimingInfo.StartTime,
+        "start_count": model.TimingInfo.StartCount,
+        "dump_interval": model.TimingInfo.DumpInterval,
+        "time_step": (
+            model.TimeStep.Value if model.TimeStep.Type == "Constant" else None
+        ),
+    }
+    runname = os.path.splitext(os.path.basename(runscript_path))[0]
+    return output_store.consolidate_outputs(
+        os.path.dirname(runscript_path),
+        runname=runname,
+        timing=timing,
+        delete_source=delete_source,
+        **kwargs,
+    )
+
+
+def resolve_template(project_options: dict) -> str:
+    """
+    Get the path of the template runscript of the project options.
+
+    The template option is a path to a yaml file or the name of a file in template_runscripts.
+    Without a template option the template of the run_type is used.
+    Returns:
+        The absolute path of the template yaml file.
+    """
+
     template = project_options.get("template")
+    run_type = project_options.get("run_type")
     if not template:
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        if run_type == "transient":
-            template = f"{base_dir}/template_runscripts/conus2_transient_solid.yaml"
-            if not os.path.exists(template):
-                template = f"{base_dir}/conus2_transient_solid.yaml"
-        elif run_type == "spinup":
-            template = f"{base_dir}/template_runscripts/conus2_spinup_solid.yaml"
-            if not os.path.exists(template):
-                template = f"{base_dir}/conus2_spinup_solid.yaml"
-        elif run_type:
+        if run_type and run_type not in TEMPLATES:
             raise ValueError(
                 f"Unsupported run_type '{run_type}'. Must be transient or spinup."
             )
-        else:
-            template = "conus2_transient_solid.yaml"
-    else:
-        template = "conus2_transient_solid.yaml"
+        template = TEMPLATES[run_type if run_type else "transient"]
+    if os.path.exists(template):
+        return os.path.abspath(template)
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    for template_dir in [os.path.join(base_dir, "template_runscripts"), base_dir]:
+        template_path = os.path.join(template_dir, template)
+        if os.path.exists(template_path):
+            return template_path
+    raise ValueError(f"The template '{template}' does not exist.")
 
-    runscript_path = _create_runscript(runname, directory_path, template)
-    _create_topology(runscript_path, project_options)
-    _create_static_and_forcing(runscript_path, project_options, runname)
-    _create_dist_files(runscript_path, project_options)
 
-    return runscript_path
+def load_template(template_path: str) -> dict:
+    """
+    Get the parflow keys of a template runscript.
+
+    The template is parsed and validated once per process (and again only if the file is
+    changed) so creating many projects from the same template does not read the yaml file again.
+    Returns:
+        A new flat dict of the parflow keys and values of the template.
+    """
+
+    template_path = os.path.abspath(template_path)
+    if not os.path.exists(template_path):
+        raise ValueError(f"The template '{template_path}' does not exist.")
+    stat = os.stat(template_path)
+    return dict(_load_template(template_path, stat.st_mtime_ns, stat.st_size))
+
+
+@functools.lru_cache(maxsize=16)
+def _load_template(template_path: str, mtime_ns: int, size: int) -> dict:
+    """
+    Parse and validate a template runscript.
+    The mtime_ns and size of the file are part of the cache key so an edited template is parsed again.
+    Returns:
+        The flat dict of the parflow keys and values of the template.
+    """
+
+    # pylint: disable=W0613
+    if os.path.splitext(template_path)[1] not in (".yaml", ".yml"):
+        raise ValueError(f"The template '{template_path}' is not a yaml file.")
+    keys = parflow.Run.from_definition(template_path).to_dict()
+    missing = [key for key in TEMPLATE_REQUIRED_KEYS if keys.get(key) is None]
+    if missing:
+        raise ValueError(f"The template '{template_path}' does not define {missing}.")
+    return keys
 
 
 def _create_runscript(
@@ -117,41 +485,67 @@ def _create_runscript(
 ):
     """
     Create a parflow model using the template.
+
+    The model of a new runscript is created from the parflow keys of the template loaded
+    by load_template. The runscript file is written by the stages of create_project.
+    An existing runscript of the directory is loaded to resume a previous create_project.
     Returns:
-        the path to the runscript of the model
+        (runscript_path, model) the path to the runscript and the parflow model
     """
 
     directory_path = os.path.abspath(directory_path)
 
     os.makedirs(directory_path, exist_ok=True)
-    template_dir = os.path.dirname(os.path.abspath(__file__))
-    if not template_path.startswith("/"):
-        template_path = os.path.join(template_dir, template_path)
-    parflow.tools.settings.set_working_directory(directory_path)
     runscript_path = os.path.abspath(f"{directory_path}/{runname}.yaml")
-
-    # Create Parfow runscript_path using the template if it does not exist yet
-    if not os.path.exists(runscript_path):
-        shutil.copy(template_path, runscript_path)
+    if os.path.exists(runscript_path):
         model = parflow.Run.from_definition(runscript_path)
-        model.write(file_format="yaml")
+    else:
+        keys = load_template(resolve_template({"template": template_path}))
+        model = parflow.Run(runname, directory_path)
+        # The keys are in the order of the model parsed by from_definition so the keys
+        # that depend on other keys (for example the Geom names) are set after them
+        model.pfset(flat_map=keys, silence_if_undefined=True)
+    parflow.tools.settings.set_working_directory(directory_path)
 
-    return runscript_path
+    return runscript_path, model
 
 
-def _create_topology(runscript_path: str, project_options: dict):
+def _create_topology(build: _ProjectBuild):
     """
-    Create the topology files and add the references to the model and runscript.yaml file
+    Create the topology files and add the references to the model
     """
-    model = parflow.Run.from_definition(runscript_path)
-    _, grid, ij_bounds, latlon_bounds, _, _ = _get_time_space_options(project_options)
+    model = build.model
+    project_options = build.project_options
+    grid = build.domain.grid
+    ij_bounds = build.domain.ij_bounds
 
+    nx = ij_bounds[2] - ij_bounds[0]
+    ny = ij_bounds[3] - ij_bounds[1]
+    nz = 5 if grid == "conus1" else 10
     topology = project_options.get("topology")
+    if topology == "auto":
+        mask = build.domain.mask
+        active_fraction = (
+            float(np.count_nonzero(mask)) / mask.size
+            if mask is not None and mask.size
+            else 1.0
+        )
+        topology, reason = choose_topology(
+            nx,
+            ny,
+            nz,
+            active_fraction=active_fraction,
+            cores=project_options.get("available_cores"),
+            min_cells_per_rank=project_options.get(
+                "min_cells_per_rank", MIN_CELLS_PER_RANK
+            ),
+        )
+        model.Metadata.Description = reason
     topology = list(topology) if isinstance(topology, tuple) else topology
     topology = [1, 1, 1] if not topology else topology
     if not len(topology) == 3:
         raise ValueError(
-            "The topology option in project options must be an array [p, q, r]"
+            "The topology option in project options must be an array [p, q, r] or 'auto'"
         )
 
     p = int(topology[0])
@@ -164,8 +558,6 @@ def _create_topology(runscript_path: str, project_options: dict):
     model.Process.Topology.R = r
     model.FileVersion = 4
 
-    ij_bounds, _ = st.define_latlon_domain(latlon_bounds, grid)
-
     model.ComputationalGrid.Lower.X = ij_bounds[0]
     model.ComputationalGrid.Lower.Y = ij_bounds[1]
     model.ComputationalGrid.Lower.Z = 0.0
@@ -176,208 +568,842 @@ def _create_topology(runscript_path: str, project_options: dict):
     model.ComputationalGrid.DZ = 200.0
 
     # Define the number of grid blocks in the domain.
-    model.ComputationalGrid.NX = ij_bounds[2] - ij_bounds[0]
-    model.ComputationalGrid.NY = ij_bounds[3] - ij_bounds[1]
-    if grid == "conus1":
-        model.ComputationalGrid.NZ = 5
-    elif grid == "conus2":
-        model.ComputationalGrid.NZ = 10
+    model.ComputationalGrid.NX = nx
+    model.ComputationalGrid.NY = ny
+    model.ComputationalGrid.NZ = nz
 
-    model.write(file_format="yaml")
 
-
-def _create_static_and_forcing(
-    runscript_path: str, project_options: dict, runname: str
+def choose_topology(
+    nx: int,
+    ny: int,
+    nz: int = 10,
+    active_fraction: float = 1.0,
+    cores: int = None,
+    min_cells_per_rank: int = MIN_CELLS_PER_RANK,
 ):
     """
-    Create the static input and forcing files and add the references to the model and runscript.yaml file
+    Choose the process topology [p, q, 1] of a parflow run of a domain.
+
+    The number of ranks is the largest number not more than the available cores such that
+    every rank has at least min_cells_per_rank active cells and every subgrid is at least
+    MIN_SUBGRID_WIDTH cells wide in x and y. Of the topologies with that many ranks the one
+    with the most square subgrids is chosen to minimize the ghost cells exchanged between ranks.
+
+    Parameters:
+        nx, ny, nz:         The size of the computational grid.
+        active_fraction:    The fraction of the cells that are active in the mask of the domain.
+        cores:              The number of cores available to the run (defaults to os.cpu_count()).
+        min_cells_per_rank: The minimum number of active cells computed by each rank.
+    Returns:
+        (topology, reason) where reason is a string explaining the choice.
     """
-    model = parflow.Run.from_definition(runscript_path)
-    directory_path = os.path.dirname(runscript_path)
 
-    mask, grid, ij_bounds, _, start_date, end_date = _get_time_space_options(
-        project_options
+    cores = max(int(cores or os.cpu_count() or 1), 1)
+    min_cells_per_rank = max(int(min_cells_per_rank), 1)
+    active_cells = int(nx * ny * nz * active_fraction)
+    max_ranks = max(min(cores, active_cells // min_cells_per_rank), 1)
+    best = (1, 1)
+    best_score = None
+    for p in range(1, max_ranks + 1):
+        if p > 1 and nx // p < MIN_SUBGRID_WIDTH:
+            break
+        for q in range(1, max_ranks // p + 1):
+            if q > 1 and ny // q < MIN_SUBGRID_WIDTH:
+                break
+            sub_x = nx / p
+            sub_y = ny / q
+            score = (p * q, -max(sub_x, sub_y) / min(sub_x, sub_y))
+            if best_score is None or score > best_score:
+                best = (p, q)
+                best_score = score
+    p, q = best
+    reason = (
+        f"auto topology {p}x{q}x1: {active_cells} active cells of {nx}x{ny}x{nz} "
+        f"(active fraction {active_fraction:.2f}), {cores} cores available, "
+        f"at least {min_cells_per_rank} active cells per rank and {MIN_SUBGRID_WIDTH} cells "
+        f"per subgrid side allow {max_ranks} ranks, "
+        f"{p * q} ranks used with subgrids of about {nx // p}x{ny // q} cells"
     )
+    return [p, q, 1], reason
 
-    st.write_mask_solid(mask=mask, grid=grid, write_dir=directory_path)
+
+def _create_static_and_forcing(build: _ProjectBuild):
+    """
+    Create the static input and forcing files and add the references to the model.
+
+    The mask, static, clm and forcing stages are independent. In pipeline mode they run
+    concurrently, each of the mask, static and clm stages writing into its staging directory,
+    and the model is only edited once all the stages are complete.
+    """
+    project_options = build.project_options
+    directory_path = build.directory_path
+    manifest = build.manifest
+    events = build.events
+    provider = _get_provider(project_options)
+    runscript_edits = []
+
+    mask = build.domain.mask
+    grid = build.domain.grid
+    ij_bounds = build.domain.ij_bounds
+    start_date = build.domain.start_date
+    end_date = build.domain.end_date
+
+    mask_dir = build.write_dir("mask")
+    stages = [
+        lambda: build.run_stage(
+            "mask",
+            {
+                "grid": grid,
+                "grid_bounds": list(ij_bounds),
+                "mask": hashlib.sha256(
+                    np.ascontiguousarray(mask).tobytes()
+                ).hexdigest(),
+            },
+            lambda: events.call(
+                "st.write_mask_solid",
+                lambda: st.write_mask_solid(mask=mask, grid=grid, write_dir=mask_dir),
+            ),
+            write_dir=mask_dir,
+        )
+    ]
 
     var_ds = "conus2_domain"
-    static_paths = st.subset_static(ij_bounds, dataset=var_ds, write_dir=directory_path)
-    st.config_clm(
-        ij_bounds,
-        start=start_date,
-        end=end_date,
-        dataset=var_ds,
-        write_dir=directory_path,
+    static_request = {
+        "function": "subset_static",
+        "dataset": var_ds,
+        "grid_bounds": list(ij_bounds),
+    }
+    static_dir = build.write_dir("static")
+    stages.append(
+        lambda: build.run_stage(
+            "static",
+            static_request,
+            lambda: _fetch_files(
+                project_options,
+                static_request,
+                static_dir,
+                lambda: events.call(
+                    provider.event_name("subset_static"),
+                    lambda: provider.subset_static(
+                        ij_bounds, dataset=var_ds, write_dir=static_dir
+                    ),
+                    static_dir,
+                ),
+            ),
+            write_dir=static_dir,
+        )
+    )
+    clm_request = {
+        "function": "config_clm",
+        "dataset": var_ds,
+        "grid_bounds": list(ij_bounds),
+        "start_date": start_date,
+        "end_date": end_date,
+    }
+    clm_dir = build.write_dir("clm")
+    stages.append(
+        lambda: build.run_stage(
+            "clm",
+            clm_request,
+            lambda: _fetch_files(
+                project_options,
+                clm_request,
+                clm_dir,
+                lambda: events.call(
+                    provider.event_name("config_clm"),
+                    lambda: provider.config_clm(
+                        ij_bounds,
+                        start=start_date,
+                        end=end_date,
+                        dataset=var_ds,
+                        write_dir=clm_dir,
+                    ),
+                    clm_dir,
+                ),
+            ),
+            write_dir=clm_dir,
+        )
     )
 
+    forcing_dir_path = directory_path
     if _is_transient(project_options):
-        forcing_dir_path = directory_path
         os.makedirs(forcing_dir_path, exist_ok=True)
-        forcing_day = project_options.get("forcing_day", None)
-        forcing_ds = "CW3E"
-        if forcing_day:
-            # use fixed values for all forcing hour inputs
-            precip = project_options.get("precip", None)
-            start_time_dt = datetime.datetime.strptime(start_date, "%Y-%m-%d")
-            end_time_dt = datetime.datetime.strptime(end_date, "%Y-%m-%d")
-            forcing_variables = [
-                "downward_shortwave",
-                "precipitation",
-                "downward_longwave",
-                "specific_humidity",
-                "air_temp",
-                "atmospheric_pressure",
-                "east_windspeed",
-                "north_windspeed",
-            ]
-            for variable in forcing_variables:
-                # Get the forcing data for all variables
-                options = {
-                    "dataset": forcing_ds,
-                    "variable": variable,
-                    "grid_bounds": list(ij_bounds),
-                    "temporal_resolution": "daily",
-                    "start_time": forcing_day,
-                    "aggregation": "sum" if variable == "precipitation" else "mean",
-                    "dataset_version": "1.0",
-                }
-                metadata = hf.get_catalog_entry(options)
-                dataset_var = (
-                    "Press"
-                    if variable == "atmospheric_pressure"
-                    else (
-                        "Temp"
-                        if variable == "air_temp"
-                        else metadata.get("dataset_var")
-                    )
-                )
-
-                data = hf.get_gridded_data(options)
-                if variable == "precipitation":
-                    data = data / 24
-                    if precip:
-                        data[:, :, :] = float(precip)
-                day_data = np.zeros((24, data.shape[1], data.shape[2]))
-                for i in range(0, 24):
-                    # Set the data to be the same for all 24 hours in the PFB file
-                    day_data[i, :, :] = data[0, :, :]
-                dt = start_time_dt
-                day = 1
-                while dt < end_time_dt:
-                    # Create hourly pfb files for each day in the parflow run range to all be the same
-                    forcing_file_path = f"{forcing_dir_path}/{forcing_ds}.{dataset_var}.{day:06d}_to_{day+23:06d}.pfb"
-                    parflow.write_pfb(forcing_file_path, day_data)
-                    dt = dt + datetime.timedelta(days=1)
-                    day = day + 24
-        else:
-            # Get the forcing data from the CW3E dataset for the days in the parflow run range
-            st.subset_forcing(
-                ij_bounds,
-                grid=grid,
-                start=start_date,
-                end=end_date,
-                dataset=forcing_ds,
-                write_dir=forcing_dir_path,
+        forcing_inputs = {
+            "dataset": "CW3E",
+            "grid": grid,
+            "grid_bounds": list(ij_bounds),
+            "start_date": start_date,
+            "end_date": end_date,
+            "forcing_day": project_options.get("forcing_day", None),
+            "precip": project_options.get("precip", None),
+            "forcing_link_mode": project_options.get("forcing_link_mode", "hardlink"),
+        }
+        resume = manifest.is_resumable("forcing", forcing_inputs)
+        stages.append(
+            lambda: build.run_stage(
+                "forcing",
+                forcing_inputs,
+                lambda: _create_forcing(build, forcing_dir_path, resume),
             )
+        )
+
+    static_paths = build.run_all(stages)[1]
 
+    if _is_transient(project_options):
         # Update the runscript yaml file with the forcing_dir_path
-        st.edit_runscript_for_subset(
-            ij_bounds,
-            runscript_path=runscript_path,
-            runname=runname,
-            forcing_dir=forcing_dir_path,
+        runscript_edits.append(
+            lambda path: st.edit_runscript_for_subset(
+                ij_bounds,
+                runscript_path=path,
+                runname=build.runname,
+                forcing_dir=forcing_dir_path,
+            )
         )
 
     # Update the file names of the generated parflow static files
     init_press_path = os.path.basename(static_paths["ss_pressure_head"])
     depth_to_bedrock_path = os.path.basename(static_paths["pf_flowbarrier"])
 
-    st.change_filename_values(
-        runscript_path=runscript_path,
-        init_press=init_press_path,
-        depth_to_bedrock=depth_to_bedrock_path,
+    runscript_edits.append(
+        lambda path: st.change_filename_values(
+            runscript_path=path,
+            init_press=init_press_path,
+            depth_to_bedrock=depth_to_bedrock_path,
+        )
     )
+    build.edit_runscript(*runscript_edits)
 
-    # Set the forcing file dataset name in the runscript yaml file
-    model = parflow.Run.from_definition(runscript_path)
-    model.Solver.CLM.MetFileName = "CW3E"
-    model.write(file_format="yaml")
+    # Set the forcing file dataset name in the model
+    build.model.Solver.CLM.MetFileName = "CW3E"
+
+
+def _create_forcing(build: _ProjectBuild, forcing_dir_path: str, resume: bool):
+    """
+    Create the hourly forcing files for each day in the parflow run range in the forcing_dir_path.
+
+    If resume is True the forcing files of the days that were completely written by
+    a previous attempt with the same options are kept and only the remaining days are subset.
+    """
+
+    project_options = build.project_options
+    ij_bounds = build.domain.ij_bounds
+    start_date = build.domain.start_date
+    end_date = build.domain.end_date
+    forcing_day = project_options.get("forcing_day", None)
+    forcing_ds = "CW3E"
+    if forcing_day:
+        # use fixed values for all forcing hour inputs
+        precip = project_options.get("precip", None)
+        start_time_dt = datetime.datetime.strptime(start_date, "%Y-%m-%d")
+        end_time_dt = datetime.datetime.strptime(end_date, "%Y-%m-%d")
+        forcing_data = _fetch_fixed_forcing(
+            project_options, ij_bounds, forcing_day, forcing_ds, build.events
+        )
+        for variable, dataset_var, data in forcing_data:
+            if variable == "precipitation":
+                data = data / 24
+                if precip:
+                    data[:, :, :] = float(precip)
+            # Set the data to be the same for all 24 hours in the PFB file
+            day_data = np.repeat(data[0:1, :, :], 24, axis=0)
+            _write_fixed_forcing_days(
+                forcing_dir_path,
+                f"{forcing_ds}.{dataset_var}",
+                day_data,
+                start_time_dt,
+                end_time_dt,
+                project_options.get("forcing_link_mode", "hardlink"),
+                build.events,
+            )
+        return
+
+    first_day = 1
+    if resume:
+        first_day = _first_incomplete_forcing_day(
+            forcing_dir_path, forcing_ds, ij_bounds, start_date, end_date
+        )
+    days = (
+        datetime.datetime.strptime(end_date, "%Y-%m-%d")
+        - datetime.datetime.strptime(start_date, "%Y-%m-%d")
+    ).days
+    chunk_days = forcing_chunk_days(
+        ij_bounds,
+        project_options.get("forcing_chunk_days", FORCING_CHUNK_DAYS),
+        project_options.get("forcing_memory_bytes"),
+    )
+    dist_futures = []
+    for chunk_first_day, chunk_last_day, chunk_start, chunk_end in _forcing_chunks(
+        start_date, end_date, first_day, chunk_days
+    ):
+        with build.events.span("forcing_chunk", "call", forcing_dir_path) as span:
+            span.set(first_day=chunk_first_day, last_day=chunk_last_day, days=days)
+            _subset_forcing_chunk(
+                build, forcing_dir_path, chunk_first_day, chunk_start, chunk_end
+            )
+        # In pipeline mode distribute the days of the chunk while the next chunk is subset
+        dist_futures.extend(
+            build.distribute(
+                _forcing_day_paths(
+                    forcing_dir_path, forcing_ds, chunk_first_day, chunk_last_day
+                )
+            )
+        )
+    for future in dist_futures:
+        future.result()
+
+
+def forcing_chunk_days(
+    ij_bounds, chunk_days: int = FORCING_CHUNK_DAYS, memory_bytes: int = None
+) -> int:
+    """
+    Get the number of days of forcing to subset at a time so the read buffers fit in a memory budget.
 
+    subsettools.subset_forcing reads the forcing variables concurrently and each variable holds
+    one block of hours read from hf_hydrodata and a buffer of one day of the ij_bounds. A block
+    is at most the hours of the chunk and at most FORCING_READ_BLOCK_BYTES, so the memory_bytes
+    limits these buffers by reducing the days of a chunk. The memory used by hf_hydrodata while
+    reading a block is not included.
 
-def _create_dist_files(runscript_path: str, project_options: dict):
+    Parameters:
+        ij_bounds:      The grid bounds (min_x, min_y, max_x, max_y) of the domain.
+        chunk_days:     The maximum number of days of a chunk.
+        memory_bytes:   The memory budget of the forcing read buffers in bytes (optional).
+    Returns:
+        The number of days of a chunk (at least 1).
+    Raises:
+        ValueError if the memory_bytes cannot hold the buffers of a chunk of one day.
+    """
+
+    chunk_days = max(int(chunk_days), 1)
+    if not memory_bytes:
+        return chunk_days
+    nx = ij_bounds[2] - ij_bounds[0]
+    ny = ij_bounds[3] - ij_bounds[1]
+    hour_bytes = nx * ny * 8
+    # The hours of a block read by subsettools (at most 366 days)
+    read_hours = min(FORCING_READ_BLOCK_BYTES // (hour_bytes * 24), 366) * 24
+    read_hours = read_hours or FORCING_READ_BLOCK_BYTES // hour_bytes
+
+    def buffer_bytes(days):
+        return len(FORCING_VARIABLES) * (min(days * 24, read_hours) + 24) * hour_bytes
+
+    if buffer_bytes(1) > int(memory_bytes):
+        raise ValueError(
+            f"The forcing_memory_bytes {memory_bytes} cannot hold the {buffer_bytes(1)} bytes of the read buffers of one day."
+        )
+    if buffer_bytes(chunk_days) <= int(memory_bytes):
+        return chunk_days
+    day_bytes = len(FORCING_VARIABLES) * 24 * hour_bytes
+    return max(min(chunk_days, int(memory_bytes) // day_bytes - 1), 1)
+
+
+def _forcing_chunks(start_date: str, end_date: str, first_day: int, chunk_days: int):
+    """
+    Split the days of the run range from first_day to the end_date into chunks of chunk_days.
+    Returns:
+        A list of (first_day, last_day, chunk_start, chunk_end) of each chunk where the days are
+        numbered from 1 at the start_date and the dates are strings YYYY-mm-dd (chunk_end is exclusive).
+    """
+
+    start_dt = datetime.datetime.strptime(start_date, "%Y-%m-%d")
+    end_dt = datetime.datetime.strptime(end_date, "%Y-%m-%d")
+    chunks = []
+    day = first_day
+    chunk_start_dt = start_dt + datetime.timedelta(days=day - 1)
+    while chunk_start_dt < end_dt:
+        chunk_end_dt = min(chunk_start_dt + datetime.timedelta(days=chunk_days), end_dt)
+        last_day = day + (chunk_end_dt - chunk_start_dt).days - 1
+        chunks.append(
+            (
+                day,
+                last_day,
+                chunk_start_dt.strftime("%Y-%m-%d"),
+                chunk_end_dt.strftime("%Y-%m-%d"),
+            )
+        )
+        day = last_day + 1
+        chunk_start_dt = chunk_end_dt
+    return chunks
+
+
+def _subset_forcing_chunk(
+    build: _ProjectBuild,
+    forcing_dir_path: str,
+    first_day: int,
+    chunk_start: str,
+    chunk_end: str,
+):
+    """
+    Subset the forcing files of the days from chunk_start to chunk_end into the forcing_dir_path.
+
+    The files are named by the hours of the run starting at the first_day of the chunk.
+    The days of the chunk are complete in the forcing_dir_path when this returns so a
+    later chunk that fails is resumed from the first day of that chunk.
+    """
+
+    project_options = build.project_options
+    grid = build.domain.grid
+    ij_bounds = build.domain.ij_bounds
+    forcing_ds = "CW3E"
+    provider = _get_provider(project_options)
+    # Subset the days into a temporary directory and rename the files to the run hours.
+    # The files replace the files of the forcing_dir_path so links to shared files are not written.
+    # In pipeline mode the directory is only used by this stage while other stages write files.
+    subset_dir_path = os.path.join(forcing_dir_path, "forcing_resume")
+    shutil.rmtree(subset_dir_path, ignore_errors=True)
+    os.makedirs(subset_dir_path)
+
+    # Get the forcing data from the CW3E dataset for the days of the chunk
+    _fetch_files(
+        project_options,
+        {
+            "function": "subset_forcing",
+            "dataset": forcing_ds,
+            "grid": grid,
+            "grid_bounds": list(ij_bounds),
+            "start_date": chunk_start,
+            "end_date": chunk_end,
+        },
+        subset_dir_path,
+        lambda: build.events.call(
+            provider.event_name("subset_forcing"),
+            lambda: provider.subset_forcing(
+                ij_bounds,
+                start=chunk_start,
+                end=chunk_end,
+                dataset=forcing_ds,
+                write_dir=subset_dir_path,
+            ),
+            subset_dir_path,
+        ),
+    )
+    _move_forcing_files(subset_dir_path, forcing_dir_path, (first_day - 1) * 24)
+    shutil.rmtree(subset_dir_path)
+
+
+def _first_incomplete_forcing_day(
+    forcing_dir_path: str, forcing_ds: str, ij_bounds, start_date: str, end_date: str
+) -> int:
+    """
+    Find the first day of the run range without a complete forcing file for every forcing variable.
+    Returns:
+        the day number starting at 1 (the number of days + 1 if all days are complete)
+    """
+
+    nx = ij_bounds[2] - ij_bounds[0]
+    ny = ij_bounds[3] - ij_bounds[1]
+    start_time_dt = datetime.datetime.strptime(start_date, "%Y-%m-%d")
+    end_time_dt = datetime.datetime.strptime(end_date, "%Y-%m-%d")
+    days = (end_time_dt - start_time_dt).days
+    complete_files = {}
+    for file_name in os.listdir(forcing_dir_path):
+        parts = file_name.split(".")
+        if len(parts) == 4 and parts[0] == forcing_ds and parts[3] == "pfb":
+            if pf_outputs.is_complete_pfb(
+                os.path.join(forcing_dir_path, file_name), (24, ny, nx)
+            ):
+                complete_files[parts[2]] = complete_files.get(parts[2], 0) + 1
+    for day in range(1, days + 1):
+        hours = f"{day * 24 - 23:06d}_to_{day * 24:06d}"
+        if complete_files.get(hours, 0) < len(FORCING_VARIABLES):
+            return day
+    return days + 1
+
+
+def _forcing_day_paths(
+    forcing_dir_path: str, forcing_ds: str, first_day: int, last_day: int
+):
+    """Get the paths of the forcing pfb files of the days from first_day to last_day."""
+
+    hours = {
+        f"{day * 24 - 23:06d}_to_{day * 24:06d}"
+        for day in range(first_day, last_day + 1)
+    }
+    paths = []
+    for file_name in sorted(os.listdir(forcing_dir_path)):
+        parts = file_name.split(".")
+        if len(parts) == 4 and parts[0] == forcing_ds and parts[3] == "pfb":
+            if parts[2] in hours:
+                paths.append(os.path.join(forcing_dir_path, file_name))
+    return paths
+
+
+def _move_forcing_files(source_dir_path: str, target_dir_path: str, hour_offset: int):
+    """
+    Move the forcing pfb files from source_dir_path to target_dir_path adding hour_offset
+    to the hours in the file names. For example with an hour_offset of 24 the file
+    CW3E.APCP.000001_to_000024.pfb is renamed to CW3E.APCP.000025_to_000048.pfb.
+    """
+
+    for file_name in os.listdir(source_dir_path):
+        parts = file_name.split(".")
+        if len(parts) != 4 or parts[3] != "pfb" or "_to_" not in parts[2]:
+            continue
+        first_hour, last_hour = parts[2].split("_to_")
+        parts[2] = (
+            f"{int(first_hour) + hour_offset:06d}_to_{int(last_hour) + hour_offset:06d}"
+        )
+        os.replace(
+            os.path.join(source_dir_path, file_name),
+            os.path.join(target_dir_path, ".".join(parts)),
+        )
+
+
+def _fetch_fixed_forcing(
+    project_options: dict,
+    ij_bounds,
+    forcing_day: str,
+    forcing_ds: str = "CW3E",
+    events: instrumentation.Instrumentation = instrumentation.DISABLED,
+):
+    """
+    Get the daily forcing data of the forcing_day for all the FORCING_VARIABLES.
+
+    The variables are downloaded concurrently using a pool of forcing_workers threads.
+    An exception raised while downloading any variable is raised by this function.
+    The calls to the data provider are emitted to the events Instrumentation.
+    Returns:
+        A list of (variable, dataset_var, data) in the order of FORCING_VARIABLES
+    """
+
+    provider = _get_provider(project_options)
+
+    def fetch(variable):
+        options = {
+            "dataset": forcing_ds,
+            "variable": variable,
+            "grid_bounds": list(ij_bounds),
+            "temporal_resolution": "daily",
+            "start_time": forcing_day,
+            "aggregation": "sum" if variable == "precipitation" else "mean",
+            "dataset_version": "1.0",
+        }
+        metadata = provider.get_catalog_entry(options)
+        dataset_var = (
+            "Press"
+            if variable == "atmospheric_pressure"
+            else ("Temp" if variable == "air_temp" else metadata.get("dataset_var"))
+        )
+        data = _fetch_array(
+            project_options,
+            {"function": "get_gridded_data", **options},
+            lambda: events.call(
+                provider.event_name("get_gridded_data"),
+                lambda: provider.get_gridded_data(options),
+            ),
+        )
+        return (variable, dataset_var, data)
+
+    workers = int(project_options.get("forcing_workers", len(FORCING_VARIABLES)))
+    if workers <= 1:
+        return [fetch(variable) for variable in FORCING_VARIABLES]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(fetch, variable) for variable in FORCING_VARIABLES]
+        try:
+            return [future.result() for future in futures]
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+
+
+def _write_fixed_forcing_days(
+    forcing_dir_path: str,
+    file_prefix: str,
+    day_data,
+    start_time_dt: datetime.datetime,
+    end_time_dt: datetime.datetime,
+    link_mode: str,
+    events: instrumentation.Instrumentation = instrumentation.DISABLED,
+):
+    """
+    Create the hourly forcing pfb files for each day in the parflow run range to all be the same.
+
+    Only the file of the first day is written. The files of the other days are linked
+    to the first file using link_mode (or copied if links are not supported).
+    Returns:
+        the list of paths of the forcing files of the days
+    """
+
+    forcing_paths = []
+    dt = start_time_dt
+    day = 1
+    while dt < end_time_dt:
+        forcing_file_path = (
+            f"{forcing_dir_path}/{file_prefix}.{day:06d}_to_{day+23:06d}.pfb"
+        )
+        if not forcing_paths:
+            # Replace the file so a link to a shared forcing file is not written through
+            events.call(
+                "parflow.write_pfb",
+                lambda path=forcing_file_path: parflow.write_pfb(path + ".tmp", day_data),
+                forcing_dir_path,
+            )
+            os.replace(forcing_file_path + ".tmp", forcing_file_path)
+        else:
+            data_cache.link_or_copy(forcing_paths[0], forcing_file_path, link_mode)
+        forcing_paths.append(forcing_file_path)
+        dt = dt + datetime.timedelta(days=1)
+        day = day + 24
+    return forcing_paths
+
+
+def _create_dist_files(build: _ProjectBuild):
     """
     Create the parflow .dist files for the generated pfb files in the parflow directory.
     """
-    model = parflow.Run.from_definition(runscript_path)
+    project_options = build.project_options
+    model = build.model
     p = model.Process.Topology.P
     q = model.Process.Topology.Q
 
-    st.dist_run(
-        topo_p=p,
-        topo_q=q,
-        runscript_path=runscript_path,
-        dist_clim_forcing=_is_transient(project_options),
+    def dist_files():
+        directory_paths = [build.directory_path]
+        if _is_transient(project_options):
+            directory_paths.append(build.model.Solver.CLM.MetFilePath)
+        paths = pfb_dist.input_paths(*directory_paths)
+        return build.events.call(
+            "pfb_dist.distribute_files",
+            lambda: _distribute_files(
+                build.manifest, paths, p, q, project_options.get("dist_workers")
+            ),
+            build.directory_path,
+        )
+
+    build.run_stage(
+        "dist",
+        {"topology": [p, q, 1], "transient": _is_transient(project_options)},
+        dist_files,
+        depends=["mask", "static", "clm", "forcing"],
     )
+    model = build.model
 
     # Set the timesteps to use in the parflow run
-    model = parflow.Run.from_definition(runscript_path)
     time_steps = project_options.get("time_steps", None)
     if time_steps is None:
         # If time_steps is not set in the options use the hours between start and end time
-        _, _, _, _, start_date, end_date = _get_time_space_options(project_options)
-        start_time_dt = datetime.datetime.strptime(start_date, "%Y-%m-%d")
-        end_time_dt = datetime.datetime.strptime(end_date, "%Y-%m-%d")
+        start_time_dt = datetime.datetime.strptime(build.domain.start_date, "%Y-%m-%d")
+        end_time_dt = datetime.datetime.strptime(build.domain.end_date, "%Y-%m-%d")
         days_between = (end_time_dt - start_time_dt).days
         model.TimingInfo.StopTime = 24 * int(days_between)
     else:
         # If time_steps is set in the options then use that number of steps
         model.TimingInfo.StopTime = int(time_steps)
 
-    # Reset the NZ that can be incorrectly set by st.dist_run
+    # Reset the NZ to the number of layers of the subsurface
     model.ComputationalGrid.NZ = 10
     if project_options.get("dump_interval"):
         model.TimingInfo.DumpInterval = float(project_options.get("dump_interval"))
+
+
+def redistribute_project(runscript_path: str, topology, workers: int = None) -> dict:
+    """
+    Distribute the pfb input files of an existing project to a new topology without fetching any data.
+
+    The Process.Topology of the runscript is updated and the dist stage of the project manifest
+    is recorded with the new topology so create_project with the same topology skips all stages.
+
+    Parameters:
+        runscript_path:     The path of the runscript returned by create_project.
+        topology:           An array or tuple [p, q, r] of the new topology (r must be 1).
+        workers:            The number of processes used to distribute the files (defaults to os.cpu_count()).
+    Returns:
+        A dict with the lists of the "distributed" and "skipped" paths (see pfb_dist.distribute_files).
+    """
+
+    if len(topology) != 3 or int(topology[2]) != 1:
+        raise ValueError("The topology must be an array [p, q, 1]")
+    p = int(topology[0])
+    q = int(topology[1])
+    directory_path = os.path.dirname(os.path.abspath(runscript_path))
+    parflow.tools.settings.set_working_directory(directory_path)
+    model = parflow.Run.from_definition(runscript_path)
+    manifest = project_manifest.ProjectManifest(
+        directory_path, exclude=[os.path.basename(runscript_path)]
+    )
+    inputs = dict(manifest.stages.get("dist", {}).get("inputs", {}))
+    inputs["topology"] = [p, q, 1]
+    directory_paths = [directory_path]
+    if inputs.get("transient", True):
+        directory_paths.append(model.Solver.CLM.MetFilePath)
+    paths = pfb_dist.input_paths(*directory_paths)
+    result = manifest.run(
+        "dist",
+        inputs,
+        lambda: _distribute_files(manifest, paths, p, q, workers),
+    )
+
+    model.Process.Topology.P = p
+    model.Process.Topology.Q = q
+    model.Process.Topology.R = 1
     model.write(file_format="yaml")
+    manifest.refresh()
+    return result
+
+
+def _distribute_files(
+    manifest: project_manifest.ProjectManifest, paths, p: int, q: int, workers: int = None
+) -> dict:
+    """
+    Distribute the pfb files and record the distributed files in the manifest of the dist stage.
+
+    The files are recorded every DIST_RECORD_FILES files and when the distribution fails, so
+    a dist stage that fails part way does not invalidate the stages that wrote the files and
+    the resumed dist stage only distributes the files without a current .dist file.
+    Returns:
+        The dict returned by pfb_dist.distribute_files.
+    """
+
+    pending = []
+
+    def record(group_paths):
+        pending.extend(group_paths)
+        if len(pending) >= DIST_RECORD_FILES:
+            manifest.record_outputs("dist", pending)
+            pending.clear()
+
+    try:
+        return pfb_dist.distribute_files(paths, p, q, workers=workers, callback=record)
+    finally:
+        if pending:
+            manifest.record_outputs("dist", pending)
+
+
+def _get_provider(project_options: dict):
+    """Get the data provider of the static, clm and forcing data configured by the project options."""
+
+    return data_provider.get_provider(project_options, st, hf)
+
+
+def _fetch_files(project_options: dict, request: dict, write_dir: str, fetch):
+    """
+    Call fetch to write files into write_dir or get the files from the cache if a cache_dir is configured.
+    Returns:
+        the value returned by fetch
+    """
+
+    cache = data_cache.get_cache(project_options)
+    if cache is None:
+        return fetch()
+    # The same request to another provider (or mirror) is another cache entry
+    request = {**request, "provider": _get_provider(project_options).identity}
+    return cache.fetch_files(request, write_dir, fetch)
 
 
-def _get_time_space_options(options):
+def _fetch_array(project_options: dict, request: dict, fetch):
     """
-    Get the time and space options from the input options.
+    Call fetch to get a numpy array or get the array from the cache if a cache_dir is configured.
     Returns:
-        (grid, ij_bounds, latlon_bounds, start_date, end_date)
+        the numpy array returned by fetch
     """
 
-    grid_bounds = options.get("grid_bounds", None)
-    latlon_bounds = options.get("latlon_bounds", None)
-    huc_id = options.get("huc_id", None)
-    grid = options.get("grid", "conus2")
-    start_date = options.get("start_date", "2001-01-01")
-    end_date = options.get("end_date", "2001-01-02")
+    cache = data_cache.get_cache(project_options)
+    if cache is None:
+        return fetch()
+    request = {**request, "provider": _get_provider(project_options).identity}
+    return cache.fetch_array(request, fetch)
+
+
+class ResolvedDomain:
+    """
+    The space and time options of a project resolved to the grid.
+
+    Attributes:
+        mask:           A 2D numpy array of the active cells within the ij_bounds (read only).
+        grid:           The grid name (conus1 or conus2).
+        ij_bounds:      The grid bounds (min_x, min_y, max_x, max_y) of the domain.
+        latlon_bounds:  The latlon bounds [[min_lat, min_lon], [max_lat, max_lon]] of the domain.
+        start_date:     The start date of the run as a string YYYY-mm-dd.
+        end_date:       The end date of the run as a string YYYY-mm-dd.
+    """
+
+    def __init__(
+        self, mask, grid: str, ij_bounds, latlon_bounds, start_date: str, end_date: str
+    ):
+        self.mask = mask
+        self.grid = grid
+        self.ij_bounds = ij_bounds
+        self.latlon_bounds = latlon_bounds
+        self.start_date = start_date
+        self.end_date = end_date
+
+
+def resolve_domain(project_options: dict) -> ResolvedDomain:
+    """
+    Resolve the time and space options of the project options to the grid.
+
+    The spatial domain is resolved with subsettools and hf_hydrodata only once per process
+    for the same grid and huc_id, grid_bounds or latlon_bounds options so projects of the
+    same or overlapping domains share the resolved mask and bounds.
+
+    Parameters:
+        project_options:    A dict of options passed to create_project.
+    Returns:
+        The ResolvedDomain of the project options.
+    """
+
+    grid_bounds = project_options.get("grid_bounds", None)
+    latlon_bounds = project_options.get("latlon_bounds", None)
+    huc_id = project_options.get("huc_id", None)
+    grid = project_options.get("grid", "conus2")
+    start_date = project_options.get("start_date", "2001-01-01")
+    end_date = project_options.get("end_date", "2001-01-02")
     if huc_id:
         hucs = (
             list(huc_id)
             if isinstance(huc_id, tuple)
             else huc_id if isinstance(huc_id, list) else huc_id.split(",")
         )
-        ij_bounds, mask = st.define_huc_domain(hucs=hucs, grid=grid)
-        lat_min, lon_min = hf.to_latlon(grid, ij_bounds[0], ij_bounds[1])
-        lat_max, lon_max = hf.to_latlon(grid, ij_bounds[2] - 1, ij_bounds[3] - 1)
-        latlon_bounds = [[lat_min, lon_min], [lat_max, lon_max]]
+        spatial_key = ("huc_id", tuple(sorted(str(huc).strip() for huc in hucs)))
     elif grid_bounds:
-        lat_min, lon_min = hf.to_latlon(grid, grid_bounds[0], grid_bounds[1])
-        lat_max, lon_max = hf.to_latlon(grid, grid_bounds[2] - 1, grid_bounds[3] - 1)
-        latlon_bounds = [[lat_min, lon_min], [lat_max, lon_max]]
-        ij_bounds, mask = st.define_latlon_domain(latlon_bounds, grid)
+        spatial_key = ("grid_bounds", tuple(grid_bounds))
     elif latlon_bounds:
         if len(latlon_bounds) != 2:
             raise ValueError("The latlon_bounds must be an array of 2 lat/lon pairs")
         if len(latlon_bounds[0]) != 2:
             raise ValueError("The latlon_bounds must be an array of 2 lat/lon pairs")
-        ij_bounds, mask = st.define_latlon_domain(latlon_bounds, grid)
+        spatial_key = ("latlon_bounds", tuple(tuple(point) for point in latlon_bounds))
     else:
         raise ValueError("Must specify in options hucs, grid_bounds, or latlon_bounds")
-    return (mask, grid, ij_bounds, latlon_bounds, start_date, end_date)
+
+    mask, ij_bounds, latlon_bounds = _resolve_spatial_domain(grid, *spatial_key)
+    if project_options.get("mask") is not None:
+        if not grid_bounds or huc_id:
+            raise ValueError("A mask option is only supported with grid_bounds.")
+        mask = np.array(project_options.get("mask"), dtype=int)
+        shape = (ij_bounds[3] - ij_bounds[1], ij_bounds[2] - ij_bounds[0])
+        if mask.shape != shape:
+            raise ValueError(
+                f"The mask shape {mask.shape} is not the shape {shape} of the grid_bounds."
+            )
+        mask.setflags(write=False)
+    return ResolvedDomain(mask, grid, ij_bounds, latlon_bounds, start_date, end_date)
+
+
+@functools.lru_cache(maxsize=64)
+def _resolve_spatial_domain(grid: str, kind: str, value: tuple):
+    """
+    Get the mask and bounds of a huc_id, grid_bounds or latlon_bounds spatial option.
+    The result is cached and shared by all projects so the mask is made read only.
+    Returns:
+        (mask, ij_bounds, latlon_bounds)
+    """
+
+    if kind == "huc_id":
+        ij_bounds, mask = st.define_huc_domain(hucs=list(value), grid=grid)
+        lat_min, lon_min = hf.to_latlon(grid, ij_bounds[0], ij_bounds[1])
+        lat_max, lon_max = hf.to_latlon(grid, ij_bounds[2] - 1, ij_bounds[3] - 1)
+        latlon_bounds = [[lat_min, lon_min], [lat_max, lon_max]]
+    elif kind == "grid_bounds":
+        lat_min, lon_min = hf.to_latlon(grid, value[0], value[1])
+        lat_max, lon_max = hf.to_latlon(grid, value[2] - 1, value[3] - 1)
+        latlon_bounds = [[lat_min, lon_min], [lat_max, lon_max]]
+        ij_bounds, mask = st.define_latlon_domain(latlon_bounds, grid)
+    else:
+        latlon_bounds = [list(point) for point in value]
+        ij_bounds, mask = st.define_latlon_domain(latlon_bounds, grid)
+    mask.setflags(write=False)
+    return (mask, tuple(ij_bounds), latlon_bounds)
 
 
 def _is_transient(project_options: dict):
@@ -0,0 +1,268 @@
+"""
+A manifest of the stages used to create a parflow project directory.
+
+Each stage of create_project records the options used as input to the stage,
+the files written by the stage with their sizes and checksums and the value
+returned by the stage. The manifest is saved as a json file in the project directory.
+
+When create_project is run again for the same project directory a stage is skipped
+if its input options are unchanged, the files it wrote are intact and no stage it
+depends on was run again. A stage that was started but not completed may be resumed.
+
+Stages may run concurrently in threads. A stage run with a write_dir writes its files into
+a staging directory below STAGING_DIR_NAME and the files are moved into the project directory
+when the stage completes, so the files of each stage are known even when the stages overlap.
+"""
+
+# pylint: disable = C0301
+import os
+import json
+import shutil
+import threading
+import data_cache
+
+MANIFEST_FILE_NAME = "project_manifest.json"
+STAGING_DIR_NAME = ".staging"
+
+
+class ProjectManifest:
+    """
+    The manifest of the stages of a project directory.
+
+    Parameters:
+        directory_path:     The project directory containing the manifest file.
+        exclude:            File names in the project directory that are not outputs of any stage.
+        enabled:            If False every stage is run and the manifest is only written.
+    """
+
+    def __init__(self, directory_path: str, exclude=(), enabled: bool = True):
+        self.directory_path = os.path.abspath(directory_path)
+        self.path = os.path.join(self.directory_path, MANIFEST_FILE_NAME)
+        self.exclude = set(exclude)
+        self.exclude.add(MANIFEST_FILE_NAME)
+        self.exclude.add(f"{MANIFEST_FILE_NAME}.tmp")
+        self.enabled = enabled
+        self.ran = []
+        self.skipped = []
+        self.stages = {}
+        self._published = []
+        self._lock = threading.RLock()
+        if enabled and os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as stream:
+                    self.stages = json.load(stream).get("stages", {})
+            except (OSError, ValueError):
+                self.stages = {}
+
+    def run(
+        self, stage: str, inputs: dict, function, depends=(), write_dir: str = None
+    ):
+        """
+        Run the function of a stage unless the stage is already complete.
+
+        Parameters:
+            stage:      The name of the stage.
+            inputs:     A dict of the options used by the stage.
+            function:   A function with no arguments that writes the output files of the stage.
+            depends:    The names of the stages that must not have run again for this stage to be skipped.
+            write_dir:  The staging directory (see staging_dir) where function writes the output files
+                        if the stage runs concurrently with other stages (optional).
+        Returns:
+            The value returned by function. If the stage is skipped the value returned
+            when the stage was completed with the paths relocated to the project directory.
+        """
+
+        with self._lock:
+            if self.is_complete(stage, inputs, depends):
+                self.skipped.append(stage)
+                return data_cache.absolutize_paths(
+                    self.stages[stage].get("result"), self.directory_path
+                )
+
+            resumable = self.is_resumable(stage, inputs)
+            entry = self.stages.get(stage, {}) if resumable else {}
+            entry.update({"inputs": _normalize(inputs), "complete": False})
+            entry.setdefault("outputs", {})
+            self.stages[stage] = entry
+            self.write()
+            published = len(self._published)
+
+        if write_dir and os.path.abspath(write_dir) != self.directory_path:
+            write_dir = os.path.abspath(write_dir)
+            shutil.rmtree(write_dir, ignore_errors=True)
+            os.makedirs(write_dir)
+            result = function()
+            result = data_cache.absolutize_paths(
+                data_cache.relativize_paths(result, write_dir), self.directory_path
+            )
+            with self._lock:
+                for name in data_cache.snapshot_files(write_dir):
+                    path = os.path.join(self.directory_path, name)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(os.path.join(write_dir, name), path)
+                    stat = os.stat(path)
+                    entry["outputs"][name] = self._output_entry(
+                        name, (stat.st_size, stat.st_mtime_ns)
+                    )
+                    self._published.append(name)
+                shutil.rmtree(write_dir, ignore_errors=True)
+                try:
+                    os.rmdir(os.path.dirname(write_dir))
+                except OSError:
+                    # Other stages are still writing into their staging directories
+                    pass
+        else:
+            before = data_cache.snapshot_files(self.directory_path)
+            result = function()
+            after = data_cache.snapshot_files(self.directory_path)
+            with self._lock:
+                # Files moved into the directory by concurrent stages are not outputs of this stage
+                excluded = set(self._published[published:])
+                for name, stat in after.items():
+                    if (
+                        before.get(name) != stat
+                        and name not in self.exclude
+                        and name not in excluded
+                        and not name.startswith(STAGING_DIR_NAME + os.sep)
+                        and not self._is_recorded(entry, name, stat)
+                    ):
+                        entry["outputs"][name] = self._output_entry(name, stat)
+        with self._lock:
+            entry["result"] = data_cache.relativize_paths(result, self.directory_path)
+            entry["complete"] = True
+            self.ran.append(stage)
+            self.write()
+        return result
+
+    def staging_dir(self, stage: str) -> str:
+        """Get the staging directory of a stage that runs concurrently with other stages."""
+
+        return os.path.join(self.directory_path, STAGING_DIR_NAME, stage)
+
+    def is_complete(self, stage: str, inputs: dict, depends=()) -> bool:
+        """
+        Returns True if the stage was completed with the same inputs, all the
+        output files of the stage are intact and none of the depends stages ran again.
+        """
+
+        entry = self.stages.get(stage)
+        if not self.enabled or entry is None or not entry.get("complete"):
+            return False
+        if entry.get("inputs") != _normalize(inputs):
+            return False
+        if any(name in self.ran for name in depends):
+            return False
+        return all(
+            self._is_intact(name, output) for name, output in entry["outputs"].items()
+        )
+
+    def is_resumable(self, stage: str, inputs: dict) -> bool:
+        """Returns True if the stage was started with the same inputs but not completed."""
+
+        entry = self.stages.get(stage)
+        return (
+            self.enabled
+            and entry is not None
+            and not entry.get("complete")
+            and entry.get("inputs") == _normalize(inputs)
+        )
+
+    def record_outputs(self, stage: str, paths):
+        """
+        Record the files of a running stage that rewrites the files of other stages.
+
+        The outputs of the stages that wrote the paths are updated and the paths and their
+        .dist files are recorded as outputs of the stage. This is called while the dist stage
+        runs so the files distributed before a failure keep the other stages complete and
+        the resumed stage only distributes the remaining files.
+        """
+
+        with self._lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                return
+            for path in paths:
+                name = os.path.relpath(os.path.abspath(path), self.directory_path)
+                if name.startswith(os.pardir + os.sep):
+                    continue
+                for dist_name in [name, f"{name}.dist"]:
+                    dist_path = os.path.join(self.directory_path, dist_name)
+                    if not os.path.exists(dist_path):
+                        continue
+                    stat = os.stat(dist_path)
+                    output = self._output_entry(dist_name, (stat.st_size, stat.st_mtime_ns))
+                    for other in self.stages.values():
+                        if dist_name in other.get("outputs", {}):
+                            other["outputs"][dist_name] = output
+                    entry["outputs"][dist_name] = output
+            self.write()
+
+    def refresh(self):
+        """
+        Record the current sizes and checksums of the output files of all stages.
+
+        This is called after the last stage because later stages may rewrite the
+        output files of earlier stages (for example distributing pfb files).
+        """
+
+        for entry in self.stages.values():
+            outputs = entry.get("outputs", {})
+            for name in list(outputs.keys()):
+                path = os.path.join(self.directory_path, name)
+                if not os.path.exists(path):
+                    del outputs[name]
+                    continue
+                stat = os.stat(path)
+                output = outputs[name]
+                if output["size"] != stat.st_size or output["mtime_ns"] != stat.st_mtime_ns:
+                    outputs[name] = self._output_entry(
+                        name, (stat.st_size, stat.st_mtime_ns)
+                    )
+        self.write()
+
+    def write(self):
+        """Save the manifest to the json file in the project directory."""
+
+        with self._lock:
+            os.makedirs(self.directory_path, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as stream:
+                json.dump({"stages": self.stages}, stream, indent=1)
+            os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _is_recorded(entry: dict, name: str, stat) -> bool:
+        """Returns True if the output of the entry was recorded with the size and mtime of stat."""
+
+        output = entry["outputs"].get(name)
+        return output is not None and (output["size"], output["mtime_ns"]) == tuple(stat)
+
+    def _output_entry(self, name: str, stat) -> dict:
+        path = os.path.join(self.directory_path, name)
+        return {
+            "size": stat[0],
+            "mtime_ns": stat[1],
+            "sha256": data_cache.file_sha256(path),
+        }
+
+    def _is_intact(self, name: str, output: dict) -> bool:
+        """
+        Returns True if the output file exists with the recorded size and checksum.
+        The checksum is only computed if the modification time of the file changed.
+        """
+
+        path = os.path.join(self.directory_path, name)
+        if not os.path.exists(path):
+            return False
+        stat = os.stat(path)
+        if stat.st_size != output["size"]:
+            return False
+        if stat.st_mtime_ns == output["mtime_ns"]:
+            return True
+        return data_cache.file_sha256(path) == output["sha256"]
+
+
+def _normalize(inputs: dict):
+    """Convert the stage inputs into the json value saved in the manifest."""
+
+    return json.loads(json.dumps(inputs, sort_keys=True, default=str))
@@ -0,0 +1,267 @@
+"""
+Solver parameter profiles chosen from the size of the domain and the topology of a project.
+
+Both templates use the Krylov dimension, restarts and preconditioner suited to large domains.
+A profile is a dict with a name, the settings (flat parflow keys) and the tuned results of the
+run that measured it:
+
+    {"name": "box", "settings": {"Solver.Linear.KrylovDimension": 60, ...}, "tuned": {"cells_per_rank": 1000, ...}}
+
+The solver_profile option of create_project is "auto", the name of a profile or a dict of settings.
+With "auto" a tuned profile of the solver_profiles_path file is used if it was tuned on a domain
+with a number of cells per rank within TUNED_RANGE_FACTOR of the project, otherwise no solver
+keys are set so the settings of the template (or of a user template) are kept.
+
+Only the template settings are built in: the settings of other domain sizes depend on the
+machine and the domain, so they are measured with tune_profile instead of being guessed.
+
+tune_profile is the local tuning harness: it runs a short parflow run of a representative project
+for each candidate settings, records the seconds per timestep and the nonlinear and linear
+iterations from the kinsol log and saves the fastest settings as a tuned profile
+(see benchmarks/tune_solver.py).
+
+Example:
+
+.. code-block:: python
+
+    results = solver_profiles.tune_profile(
+        runscript_path,
+        {"Solver.Linear.KrylovDimension": [30, 100, 500], "Solver.Linear.Preconditioner": ["PFMG", "PFMGOctree"]},
+        profiles_path="./solver_profiles.json",
+    )
+    project_options = {..., "solver_profile": "auto", "solver_profiles_path": "./solver_profiles.json"}
+"""
+
+# pylint: disable = C0301,R0913,R0914
+import os
+import re
+import json
+import math
+import time
+import itertools
+import traceback
+import lazy_import
+
+parflow = lazy_import.LazyModule("parflow")
+
+TUNING_FILE_NAME = "solver_tuning.json"
+
+# A tuned profile is used for projects with cells per rank within this factor of the tuned domain
+TUNED_RANGE_FACTOR = 4.0
+
+# The linear solver settings of the templates that may be set by the "template" solver_profile
+BUILTIN_PROFILES = [
+    {
+        "name": "template",
+        "settings": {
+            "Solver.Linear.KrylovDimension": 500,
+            "Solver.Linear.MaxRestarts": 8,
+            "Solver.Linear.Preconditioner": "PFMG",
+            "Solver.Linear.Preconditioner.PCMatrixType": "PFSymmetric",
+        },
+    },
+]
+
+
+def domain_size(model):
+    """
+    Get the size of the domain of the model.
+    Returns:
+        (cells, ranks) the NX * NY * NZ cells and the P * Q * R ranks of the topology.
+    """
+
+    grid = model.ComputationalGrid
+    topology = model.Process.Topology
+    cells = int(grid.NX) * int(grid.NY) * int(grid.NZ)
+    ranks = int(topology.P or 1) * int(topology.Q or 1) * int(topology.R or 1)
+    return cells, ranks
+
+
+def select_profile(cells: int, ranks: int, profiles_path: str = None) -> dict:
+    """
+    Select the profile for a domain of cells run with ranks.
+
+    Parameters:
+        cells:          The number of cells of the domain.
+        ranks:          The number of ranks of the topology.
+        profiles_path:  A JSON file of tuned profiles saved by tune_profile (optional).
+    Returns:
+        The closest tuned profile within TUNED_RANGE_FACTOR or the template profile.
+    """
+
+    cells_per_rank = cells / max(ranks, 1)
+    tuned = [
+        profile
+        for profile in read_profiles(profiles_path)
+        if abs(math.log(cells_per_rank / profile["tuned"]["cells_per_rank"]))
+        <= math.log(TUNED_RANGE_FACTOR)
+    ]
+    if tuned:
+        return min(
+            tuned,
+            key=lambda profile: abs(
+                math.log(cells_per_rank / profile["tuned"]["cells_per_rank"])
+            ),
+        )
+    return BUILTIN_PROFILES[0]
+
+
+def apply_profile(model, solver_profile, profiles_path: str = None) -> dict:
+    """
+    Set the solver settings of a profile in the model.
+
+    Parameters:
+        model:          The parflow model.
+        solver_profile: "auto", the name of a built in or tuned profile or a dict of settings.
+        profiles_path:  A JSON file of tuned profiles saved by tune_profile (optional).
+    Returns:
+        The profile dict applied or None if "auto" found no tuned profile and kept the settings of the model.
+    """
+
+    if isinstance(solver_profile, dict):
+        profile = {"name": "custom", "settings": solver_profile}
+    elif solver_profile == "auto":
+        profile = select_profile(*domain_size(model), profiles_path)
+        if "tuned" not in profile:
+            return None
+    else:
+        profiles = {
+            profile["name"]: profile
+            for profile in BUILTIN_PROFILES + read_profiles(profiles_path)
+        }
+        if solver_profile not in profiles:
+            raise ValueError(
+                f"Unknown solver_profile '{solver_profile}'. Must be 'auto', a dict or one of {sorted(profiles)}."
+            )
+        profile = profiles[solver_profile]
+    for key, value in profile["settings"].items():
+        model.pfset(key=key, value=value)
+    return profile
+
+
+def read_profiles(profiles_path: str) -> list:
+    """Get the list of the tuned profiles saved in the profiles_path file (empty if none)."""
+
+    if not profiles_path or not os.path.exists(profiles_path):
+        return []
+    with open(profiles_path, "r", encoding="utf-8") as stream:
+        return json.load(stream).get("profiles", [])
+
+
+def save_profile(profiles_path: str, profile: dict):
+    """Save a tuned profile in the profiles_path file replacing a profile with the same name."""
+
+    profiles = [p for p in read_profiles(profiles_path) if p["name"] != profile["name"]]
+    profiles.append(profile)
+    os.makedirs(os.path.dirname(os.path.abspath(profiles_path)), exist_ok=True)
+    tmp_path = f"{profiles_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as stream:
+        json.dump({"profiles": profiles}, stream, indent=1)
+    os.replace(tmp_path, profiles_path)
+
+
+def read_kinsol_log(path: str) -> dict:
+    """
+    Get the number of timesteps and the nonlinear and linear iterations from a parflow kinsol log.
+    Returns:
+        A dict with timesteps, nonlinear_iterations and linear_iterations.
+    """
+
+    result = {"timesteps": 0, "nonlinear_iterations": 0, "linear_iterations": 0}
+    with open(path, "r", encoding="utf-8", errors="replace") as stream:
+        for line in stream:
+            if line.startswith("KINSOL starting step"):
+                result["timesteps"] += 1
+            match = re.match(r"^\s*(Nonlin\.|Lin\.) Its\.:\s+(\d+)", line)
+            if match:
+                key = "nonlinear_iterations" if match.group(1) == "Nonlin." else "linear_iterations"
+                result[key] += int(match.group(2))
+    return result
+
+
+def tune_profile(
+    runscript_path: str,
+    candidates: dict,
+    hours: float = 24,
+    profiles_path: str = None,
+    name: str = None,
+    run=None,
+) -> dict:
+    """
+    Run a short parflow run of a project with each combination of candidate settings.
+
+    The results are saved in solver_tuning.json in the directory of the runscript and
+    the settings with the fewest seconds per timestep are saved as a tuned profile.
+    Parameters:
+        runscript_path: The runscript of a representative project created by create_project.
+        candidates:     A dict of a parflow key to the list of the values to try.
+        hours:          The hours of each run.
+        profiles_path:  The JSON file to save the tuned profile (optional).
+        name:           The name of the tuned profile (defaults to tuned_<cells_per_rank>).
+        run:            A function called with the parflow model to run it (defaults to model.run).
+    Returns:
+        A dict with the results of each candidate and the winning profile.
+    """
+
+    directory_path = os.path.dirname(os.path.abspath(runscript_path))
+    if run is None:
+
+        def run(model):
+            model.run(working_directory=directory_path)
+
+    parflow.tools.settings.set_working_directory(directory_path)
+    keys = list(candidates.keys())
+    results = []
+    cells = ranks = None
+    for values in itertools.product(*[candidates[key] for key in keys]):
+        settings = dict(zip(keys, values))
+        model = parflow.Run.from_definition(runscript_path)
+        cells, ranks = domain_size(model)
+        start_time = float(model.TimingInfo.StartTime or 0)
+        model.TimingInfo.StopTime = start_time + float(hours)
+        for key, value in settings.items():
+            model.pfset(key=key, value=value)
+        log_path = os.path.join(directory_path, f"{model.get_name()}.out.kinsol.log")
+        if os.path.exists(log_path):
+            os.remove(log_path)
+        result = {"settings": settings, "status": "ok", "error": None}
+        start = time.perf_counter()
+        try:
+            run(model)
+        except (Exception, SystemExit):
+            result["status"] = "failed"
+            result["error"] = traceback.format_exc()
+        result["seconds"] = time.perf_counter() - start
+        if os.path.exists(log_path):
+            result.update(read_kinsol_log(log_path))
+        if result["status"] == "ok" and not result.get("timesteps"):
+            result["status"] = "failed"
+            result["error"] = "The run did not write a kinsol log."
+        if result["status"] == "ok":
+            result["seconds_per_timestep"] = result["seconds"] / result["timesteps"]
+        results.append(result)
+
+    succeeded = [result for result in results if result["status"] == "ok"]
+    profile = None
+    if succeeded:
+        best = min(succeeded, key=lambda result: result["seconds_per_timestep"])
+        cells_per_rank = cells / max(ranks, 1)
+        profile = {
+            "name": name if name else f"tuned_{int(cells_per_rank)}",
+            "settings": best["settings"],
+            "tuned": {
+                "cells": cells,
+                "ranks": ranks,
+                "cells_per_rank": cells_per_rank,
+                "hours": float(hours),
+                "seconds_per_timestep": best["seconds_per_timestep"],
+                "nonlinear_iterations": best["nonlinear_iterations"],
+                "linear_iterations": best["linear_iterations"],
+            },
+        }
+        if profiles_path:
+            save_profile(profiles_path, profile)
+    tuning = {"cells": cells, "ranks": ranks, "results": results, "profile": profile}
+    with open(os.path.join(directory_path, TUNING_FILE_NAME), "w", encoding="utf-8") as stream:
+        json.dump(tuning, stream, indent=1)
+    return tuning
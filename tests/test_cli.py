@@ -0,0 +1,105 @@
+"""
+Unit tests for cli module.
+The create test uses the local hf_hydrodata and subsettools stand-ins of the benchmarks.
+"""
+
+# pylint: disable=C0301,R0914,C0413,E0401
+import sys
+import os
+import json
+import subprocess
+import parflow
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../benchmarks")))
+import cli
+import project
+import pf_scenarios
+import fake_providers
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../src"))
+
+
+def test_project_options(tmp_path):
+    """Test that the flags and settings override the options of the options file."""
+
+    options_path = tmp_path / "box.yaml"
+    options_path.write_text("grid_bounds: [1, 2, 3, 4]\nstart_date: '2005-10-01'\ntime_steps: 5\n", encoding="utf-8")
+    args = cli._create_parser().parse_args(
+        ["create", "box", "--options", str(options_path), "--grid-bounds", "3749,1583,3759,1593", "--topology", "2,2,1", "--set", "precip=0.5", "--set", "pipeline=true"]
+    )
+    assert cli.project_options(args) == {
+        "grid_bounds": [3749, 1583, 3759, 1593],
+        "start_date": "2005-10-01",
+        "time_steps": 5,
+        "topology": [2, 2, 1],
+        "precip": 0.5,
+        "pipeline": True,
+    }
+    args = cli._create_parser().parse_args(["create", "box", "--latlon-bounds", "40,-75,41,-74", "--topology", "auto"])
+    assert cli.project_options(args) == {"latlon_bounds": [[40.0, -75.0], [41.0, -74.0]], "topology": "auto"}
+
+    with pytest.raises(ValueError):
+        cli.project_options(cli._create_parser().parse_args(["create", "box", "--set", "precip"]))
+    options_path.write_text("- 1\n- 2\n", encoding="utf-8")
+    with pytest.raises(SystemExit):
+        cli.main(["create", "box", "--options", str(options_path)])
+
+
+def test_lazy_imports():
+    """Test that the cli does not import the project and the project does not import its heavy and optional modules."""
+
+    code = (
+        f"import sys; sys.path.insert(0, {SRC_DIR!r}); import cli; print('parflow' in sys.modules); "
+        "import project; print(*[m in sys.modules for m in ('hf_hydrodata', 'subsettools', 'parflow', 'numpy', 'pfb_dist', 'output_policy')]); "
+        "import pf_aggregate; print('netCDF4' in sys.modules); "
+        "project.st.__name__; print('subsettools' in sys.modules)"
+    )
+    output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    assert output.split() == ["False"] + ["False"] * 7 + ["True"]
+
+
+def test_create(tmp_path, monkeypatch, capsys):
+    """Test that the create command creates the project of the options file and prints the runscript path."""
+
+    # parflow.Run parses the command line arguments of pytest
+    monkeypatch.setattr(sys, "argv", ["pytest"])
+    monkeypatch.setattr(project, "hf", project.hf)
+    monkeypatch.setattr(project, "st", project.st)
+    fake_providers.install(project)
+    monkeypatch.chdir(tmp_path)
+    options_path = tmp_path / "box.json"
+    options_path.write_text(
+        json.dumps({"run_type": "transient", "grid_bounds": [3749, 1583, 3759, 1593], "start_date": "2005-10-01", "end_date": "2005-10-02"}),
+        encoding="utf-8",
+    )
+    directory_path = str(tmp_path / "box")
+    assert cli.main(["create", directory_path, "--options", str(options_path), "--forcing-day", "2005-10-01", "--set", "time_steps=3"]) == 0
+    project._resolve_spatial_domain.cache_clear()
+
+    runscript_path = capsys.readouterr().out.strip().splitlines()[-1]
+    assert runscript_path == os.path.join(directory_path, "box.yaml")
+    model = parflow.Run.from_definition(runscript_path)
+    assert model.TimingInfo.StopTime == 3
+
+
+def test_run_scenarios_dir(tmp_path, monkeypatch, capsys):
+    """Test that the run-scenarios command builds the scenarios of the matrix in the --scenarios-dir."""
+
+    calls = []
+
+    def run_scenarios(scenarios, **kwargs):
+        calls.append((scenarios, kwargs))
+        return {"failed": 0, "total_seconds": 0.0, "scenarios": [{"runname": runname, "status": "ok"} for runname, _ in scenarios]}
+
+    monkeypatch.setattr(pf_scenarios, "run_scenarios", run_scenarios)
+    monkeypatch.chdir(tmp_path)
+    scenarios_dir = str(tmp_path / "runs")
+    assert cli.main(["run-scenarios", "--scenarios-dir", scenarios_dir, "--max-workers", "2"]) == 0
+
+    scenarios, kwargs = calls[0]
+    assert len(scenarios) == len(pf_scenarios.START_PRESSURE_OPTIONS) * len(pf_scenarios.FORCING_INPUT_OPTIONS)
+    assert kwargs["scenarios_dir"] == scenarios_dir
+    assert kwargs["max_workers"] == 2
+    assert "small_zero" in capsys.readouterr().out
@@ -0,0 +1,229 @@
+"""
+Unit tests for data_cache module.
+"""
+
+# pylint: disable=C0301,R0914,C0413,E0401
+import sys
+import os
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+import data_cache
+
+
+def _write_files(write_dir, names, content):
+    """Simulate a subsettools function that writes files into write_dir."""
+
+    paths = {}
+    for name in names:
+        path = os.path.join(write_dir, f"{name}.pfb")
+        with open(path, "wb") as stream:
+            stream.write(content)
+        paths[name] = path
+    return paths
+
+
+def test_fetch_files_hit(tmp_path):
+    """Test that a second fetch of the same request restores the files without calling fetch."""
+
+    cache = data_cache.DataCache(str(tmp_path / "cache"))
+    request = {"function": "subset_static", "grid_bounds": [3749, 1583, 3759, 1593]}
+    calls = []
+
+    def fetch(write_dir):
+        calls.append(write_dir)
+        return _write_files(write_dir, ["slope_x", "slope_y"], b"0123456789")
+
+    first_dir = str(tmp_path / "first")
+    os.makedirs(first_dir)
+    result = cache.fetch_files(request, first_dir, lambda: fetch(first_dir))
+    assert len(calls) == 1
+    assert result["slope_x"] == os.path.join(first_dir, "slope_x.pfb")
+
+    second_dir = str(tmp_path / "second")
+    result = cache.fetch_files(request, second_dir, lambda: fetch(second_dir))
+    assert len(calls) == 1
+    assert result["slope_y"] == os.path.join(second_dir, "slope_y.pfb")
+    with open(result["slope_y"], "rb") as stream:
+        assert stream.read() == b"0123456789"
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+
+    # The two files have the same content so they are stored once
+    assert stats["bytes"] == 10
+
+
+def test_fetch_files_key(tmp_path):
+    """Test that requests with different grid bounds or dates are different cache entries."""
+
+    cache = data_cache.DataCache(str(tmp_path / "cache"))
+    write_dir = str(tmp_path / "project")
+    os.makedirs(write_dir)
+    request = {"function": "config_clm", "grid_bounds": (1, 2, 3, 4), "start_date": "2005-10-01"}
+    same_request = {"start_date": "2005-10-01", "function": "config_clm", "grid_bounds": [1, 2, 3, 4]}
+    other_request = {"function": "config_clm", "grid_bounds": [1, 2, 3, 4], "start_date": "2005-10-02"}
+    assert cache.make_key(request) == cache.make_key(same_request)
+    assert cache.make_key(request) != cache.make_key(other_request)
+
+    cache.fetch_files(request, write_dir, lambda: _write_files(write_dir, ["a"], b"a"))
+    cache.fetch_files(same_request, write_dir, lambda: _write_files(write_dir, ["a"], b"a"))
+    cache.fetch_files(other_request, write_dir, lambda: _write_files(write_dir, ["b"], b"b"))
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+
+def test_lru_eviction(tmp_path):
+    """Test that the least recently used entries are evicted when the cache is too large."""
+
+    cache = data_cache.DataCache(str(tmp_path / "cache"), max_bytes=250)
+    write_dir = str(tmp_path / "project")
+    os.makedirs(write_dir)
+    for index in range(0, 3):
+        request = {"function": "subset_forcing", "day": index}
+        content = bytes([index]) * 100
+        cache.fetch_files(request, write_dir, lambda c=content, i=index: _write_files(write_dir, [f"f{i}"], c))
+
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["entries"] == 2
+    assert stats["bytes"] == 200
+
+    # The first request was evicted and must be fetched again
+    calls = []
+    cache.fetch_files({"function": "subset_forcing", "day": 0}, write_dir, lambda: calls.append(1))
+    assert len(calls) == 1
+
+
+def test_hardlink_mode(tmp_path):
+    """Test that cached files may be hardlinked into the project directory."""
+
+    cache = data_cache.get_cache({"cache_dir": str(tmp_path / "cache"), "cache_link_mode": "hardlink"})
+    assert cache is data_cache.get_cache({"cache_dir": str(tmp_path / "cache"), "cache_link_mode": "hardlink"})
+    assert data_cache.get_cache({}) is None
+
+    request = {"function": "subset_static", "grid_bounds": [0, 0, 10, 10]}
+    first_dir = str(tmp_path / "first")
+    os.makedirs(first_dir)
+    cache.fetch_files(request, first_dir, lambda: _write_files(first_dir, ["mask"], b"mask"))
+    second_dir = str(tmp_path / "second")
+    cache.fetch_files(request, second_dir, lambda: None)
+    assert os.stat(os.path.join(second_dir, "mask.pfb")).st_nlink == 2
+
+
+def test_damaged_object(tmp_path):
+    """Test that a cached file changed without changing its size is detected by another process and fetched again."""
+
+    request = {"function": "subset_static", "grid_bounds": [0, 0, 10, 10]}
+    first_dir = str(tmp_path / "first")
+    os.makedirs(first_dir)
+    data_cache.DataCache(str(tmp_path / "cache")).fetch_files(request, first_dir, lambda: _write_files(first_dir, ["mask"], b"mask"))
+    object_path = os.path.join(str(tmp_path / "cache"), "objects", data_cache.file_sha256(os.path.join(first_dir, "mask.pfb"))[0:2])
+    object_path = os.path.join(object_path, os.listdir(object_path)[0])
+    with open(object_path, "wb") as stream:
+        stream.write(b"MASK")
+
+    # A new DataCache (as in a new process) checks the sha256 of the object on its first use
+    cache = data_cache.DataCache(str(tmp_path / "cache"))
+    second_dir = str(tmp_path / "second")
+    os.makedirs(second_dir)
+    cache.fetch_files(request, second_dir, lambda: _write_files(second_dir, ["mask"], b"mask"))
+    assert cache.stats()["misses"] == 1
+    with open(os.path.join(second_dir, "mask.pfb"), "rb") as stream:
+        assert stream.read() == b"mask"
+    third_dir = str(tmp_path / "third")
+    cache.fetch_files(request, third_dir, lambda: None)
+    assert cache.stats()["hits"] == 1
+    with open(os.path.join(third_dir, "mask.pfb"), "rb") as stream:
+        assert stream.read() == b"mask"
+
+
+def test_symlink_eviction(tmp_path):
+    """Test that the eviction keeps the cached files that are still the target of a symlink of a project."""
+
+    cache = data_cache.DataCache(str(tmp_path / "cache"), max_bytes=150, link_mode="symlink")
+    fetch_dir = str(tmp_path / "fetch")
+    os.makedirs(fetch_dir)
+    request = {"function": "subset_forcing", "day": 0}
+    cache.fetch_files(request, fetch_dir, lambda: _write_files(fetch_dir, ["f0"], b"0" * 100))
+    project_dir = str(tmp_path / "project")
+    cache.fetch_files(request, project_dir, lambda: None)
+    link_path = os.path.join(project_dir, "f0.pfb")
+    assert os.path.islink(link_path)
+
+    # The file of the symlink does not count towards the maximum size and is never removed
+    for day in range(1, 4):
+        cache.fetch_files({"function": "subset_forcing", "day": day}, fetch_dir, lambda d=day: _write_files(fetch_dir, [f"f{d}"], bytes([48 + d]) * 100))
+    assert cache.stats()["evictions"] == 3
+    assert cache.stats()["bytes"] == 200
+    with open(link_path, "rb") as stream:
+        assert stream.read() == b"0" * 100
+
+    # Once the symlink is removed the file is removed by the next eviction
+    os.remove(link_path)
+    cache.fetch_files({"function": "subset_forcing", "day": 4}, fetch_dir, lambda: _write_files(fetch_dir, ["f4"], b"4" * 100))
+    assert cache.stats()["bytes"] == 100
+
+
+def test_shared_cache_dir(tmp_path):
+    """Test that another cache of the same cache_dir does not evict an object before its entry is written."""
+
+    cache_dir = str(tmp_path / "cache")
+    cache = data_cache.DataCache(cache_dir, max_bytes=1000)
+    other = data_cache.DataCache(cache_dir, max_bytes=150)
+    write_dir = str(tmp_path / "project")
+    os.makedirs(write_dir)
+    cache.fetch_files({"day": 0}, write_dir, lambda: _write_files(write_dir, ["f0"], b"0" * 100))
+
+    # The other cache stores a request and evicts while the new object is stored and its entry is not written yet
+    other_dir = str(tmp_path / "other")
+    os.makedirs(other_dir)
+    store_object = cache._store_object
+    evictions = []
+
+    def store_and_evict(path):
+        file_entry = store_object(path)
+        evictions.append(
+            threading.Thread(
+                target=other.fetch_files,
+                args=({"day": 2}, other_dir, lambda: _write_files(other_dir, ["f2"], b"2" * 10)),
+            )
+        )
+        evictions[0].start()
+        evictions[0].join(timeout=0.5)
+        return file_entry
+
+    cache._store_object = store_and_evict
+    cache.fetch_files({"day": 1}, write_dir, lambda: _write_files(write_dir, ["f1"], b"1" * 100))
+    cache._store_object = store_object
+    evictions[0].join()
+    assert other.evictions == 1
+
+    # The oldest entry was evicted and the new entry is intact
+    calls = []
+    cache.fetch_files({"day": 1}, write_dir, lambda: calls.append(1))
+    assert not calls
+    cache.fetch_files({"day": 0}, write_dir, lambda: calls.append(1))
+    assert len(calls) == 1
+
+
+def test_evicted_by_another_process(tmp_path):
+    """Test that objects removed by another process during the eviction are treated as evicted."""
+
+    cache = data_cache.DataCache(str(tmp_path / "cache"), max_bytes=250)
+    write_dir = str(tmp_path / "project")
+    os.makedirs(write_dir)
+    object_paths = cache._object_paths
+
+    def with_removed_object():
+        yield from object_paths()
+        yield "ff" * 32, os.path.join(cache._objects_dir(), "ff", "ff" * 32)
+
+    cache._object_paths = with_removed_object
+    for index in range(0, 3):
+        content = bytes([index]) * 100
+        cache.fetch_files({"day": index}, write_dir, lambda c=content, i=index: _write_files(write_dir, [f"f{i}"], c))
+    assert cache.stats()["entries"] == 2
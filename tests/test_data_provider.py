@@ -0,0 +1,142 @@
+"""
+Unit tests for data_provider module.
+Uses a small synthetic grid as the full CONUS files of a local mirror.
+"""
+
+# pylint: disable=C0301,R0914,C0413,E0401
+import sys
+import os
+import numpy as np
+import parflow
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../benchmarks")))
+import data_provider
+import project
+import fake_providers
+
+GRID_SHAPE = (40, 30)
+
+
+def _write_mirror(mirror_dir):
+    """Write a local mirror of a synthetic 40x30 grid with several subgrids per file."""
+
+    ny, nx = GRID_SHAPE
+    domain_dir = mirror_dir / "conus2_domain"
+    domain_dir.mkdir(parents=True)
+    arrays = {}
+    for var in data_provider.STATIC_VARIABLES:
+        nz = 10 if var in ("pf_indicator", "ss_pressure_head") else 1
+        arrays[var] = np.random.default_rng(len(var)).random((nz, ny, nx))
+        parflow.write_pfb(str(domain_dir / f"{var}.pfb"), arrays[var], p=3, q=2, dist=False)
+    land_cover = np.zeros((23, ny, nx))
+    land_cover[0:2] = 40.0
+    land_cover[-1] = 1.0
+    parflow.write_pfb(str(domain_dir / "clm_run.pfb"), land_cover, p=2, q=2, dist=False)
+    (domain_dir / "drv_vegp.dat").write_text("vegp parameters\n")
+    (domain_dir / "drv_clmin.dat").write_text("startcode      1\nsyr            2000\neyr            2000\n")
+    forcing_dir = mirror_dir / "CW3E" / "WY2006"
+    forcing_dir.mkdir(parents=True)
+    for dataset_var in data_provider.FORCING_DATASET_VARS.values():
+        for day in [1, 2, 3]:
+            data = np.random.default_rng(day).random((24, ny, nx)) + day
+            parflow.write_pfb(
+                str(forcing_dir / f"CW3E.{dataset_var}.{day * 24 - 23:06d}_to_{day * 24:06d}.pfb"), data, p=2, q=3, dist=False
+            )
+            arrays[f"{dataset_var}.{day}"] = data
+    return arrays
+
+
+def test_read_window(tmp_path):
+    """Test that the window of the ij_bounds is read from the full grid files."""
+
+    arrays = _write_mirror(tmp_path)
+    provider = data_provider.get_provider({"data_provider": "local", "data_mirror_dir": str(tmp_path)}, None, None)
+    ij_bounds = (7, 11, 19, 33)
+    window = provider.read_window(str(tmp_path / "conus2_domain" / "pf_indicator.pfb"), ij_bounds)
+    np.testing.assert_array_equal(window, arrays["pf_indicator"][:, 11:33, 7:19])
+
+    options = {
+        "dataset": "CW3E",
+        "variable": "precipitation",
+        "grid_bounds": list(ij_bounds),
+        "temporal_resolution": "daily",
+        "start_time": "2005-10-02",
+        "aggregation": "sum",
+    }
+    np.testing.assert_allclose(provider.get_gridded_data(options), arrays["APCP.2"][:, 11:33, 7:19].sum(axis=0, keepdims=True))
+    assert provider.get_catalog_entry(options)["dataset_var"] == "APCP"
+
+    with pytest.raises(ValueError):
+        provider.read_window(str(tmp_path / "conus2_domain" / "pme.pfb"), (0, 0, 31, 10))
+    with pytest.raises(ValueError):
+        data_provider.get_provider({"data_provider": "local"}, None, None)
+    with pytest.raises(ValueError):
+        data_provider.get_provider({"data_provider": "ftp"}, None, None)
+
+
+def test_create_project_local_mirror(tmp_path, monkeypatch):
+    """Test that create_project with the local data_provider writes the windows of the mirror files."""
+
+    # parflow.Run parses the command line arguments of pytest
+    monkeypatch.setattr(sys, "argv", ["pytest"])
+    monkeypatch.setattr(project, "hf", project.hf)
+    monkeypatch.setattr(project, "st", project.st)
+    hydrodata = fake_providers.install(project)
+    monkeypatch.chdir(tmp_path)
+    mirror_dir = tmp_path / "mirror"
+    arrays = _write_mirror(mirror_dir)
+
+    # The fake latlon projection maps these bounds to the ij_bounds (3, 5, 15, 25)
+    options = {
+        "run_type": "transient",
+        "grid_bounds": [3, 5, 15, 25],
+        "start_date": "2005-10-02",
+        "end_date": "2005-10-04",
+        "data_provider": "local",
+        "data_mirror_dir": str(mirror_dir),
+    }
+    directory_path = tmp_path / "local"
+    project.create_project(options, str(directory_path))
+    project._resolve_spatial_domain.cache_clear()
+    requests = hydrodata.requests
+
+    np.testing.assert_array_equal(parflow.read_pfb(str(directory_path / "slope_x.pfb")), arrays["slope_x"][:, 5:25, 3:15])
+    np.testing.assert_array_equal(
+        parflow.read_pfb(str(directory_path / "CW3E.DSWR.000025_to_000048.pfb")), arrays["DSWR.3"][:, 5:25, 3:15]
+    )
+    assert (directory_path / "drv_vegm.dat").read_text().count("\n") == 2 + 12 * 20
+    assert "syr            2005" in (directory_path / "drv_clmin.dat").read_text()
+    assert requests == 0
+
+
+def test_cache_key_provider(tmp_path, monkeypatch):
+    """Test that the same requests to the local mirror and to hf_hydrodata are different cache entries."""
+
+    # parflow.Run parses the command line arguments of pytest
+    monkeypatch.setattr(sys, "argv", ["pytest"])
+    monkeypatch.setattr(project, "hf", project.hf)
+    monkeypatch.setattr(project, "st", project.st)
+    hydrodata = fake_providers.install(project)
+    monkeypatch.chdir(tmp_path)
+    mirror_dir = tmp_path / "mirror"
+    arrays = _write_mirror(mirror_dir)
+    options = {
+        "run_type": "transient",
+        "grid_bounds": [3, 5, 15, 25],
+        "start_date": "2005-10-02",
+        "end_date": "2005-10-03",
+        "cache_dir": str(tmp_path / "cache"),
+    }
+    project.create_project({**options, "data_provider": "local", "data_mirror_dir": str(mirror_dir)}, str(tmp_path / "local"))
+    project._resolve_spatial_domain.cache_clear()
+    assert hydrodata.requests == 0
+
+    # The hydrodata project does not get the files of the mirror from the cache
+    directory_path = tmp_path / "hydrodata"
+    project.create_project(options, str(directory_path))
+    project._resolve_spatial_domain.cache_clear()
+    assert hydrodata.requests > 0
+    assert not np.array_equal(parflow.read_pfb(str(directory_path / "slope_x.pfb")), arrays["slope_x"][:, 5:25, 3:15])
+    assert data_provider.get_provider({"data_provider": "local", "data_mirror_dir": str(mirror_dir)}, None, None).identity == f"local:{mirror_dir}"
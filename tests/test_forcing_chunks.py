@@ -0,0 +1,129 @@
+"""
+Unit tests for the forcing subset in chunks of days in the project module.
+The create_project tests use the local hf_hydrodata and subsettools stand-ins of the benchmarks.
+"""
+
+# pylint: disable=C0301,R0914,C0413,E0401
+import sys
+import os
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../benchmarks")))
+import project
+import data_cache
+import fake_providers
+
+
+def test_forcing_chunk_days():
+    """Test that the days of a chunk are reduced to fit the read buffers in the memory budget."""
+
+    ij_bounds = [0, 0, 100, 50]
+    day_bytes = len(project.FORCING_VARIABLES) * 24 * 100 * 50 * 8
+    assert project.forcing_chunk_days(ij_bounds) == project.FORCING_CHUNK_DAYS
+    assert project.forcing_chunk_days(ij_bounds, 10, 100 * day_bytes) == 10
+    assert project.forcing_chunk_days(ij_bounds, 10, 5 * day_bytes) == 4
+    assert project.forcing_chunk_days(ij_bounds, 10, 2 * day_bytes) == 1
+    with pytest.raises(ValueError):
+        project.forcing_chunk_days(ij_bounds, 10, day_bytes)
+
+    # A large domain is read in blocks of less than a day so a chunk does not need more memory
+    ij_bounds = [0, 0, 4000, 3000]
+    hour_bytes = 4000 * 3000 * 8
+    read_hours = project.FORCING_READ_BLOCK_BYTES // hour_bytes
+    assert read_hours < 24
+    budget = len(project.FORCING_VARIABLES) * (read_hours + 24) * hour_bytes
+    assert project.forcing_chunk_days(ij_bounds, 10, budget) == 10
+    with pytest.raises(ValueError):
+        project.forcing_chunk_days(ij_bounds, 10, budget - 1)
+
+
+def test_forcing_chunks():
+    """Test that the days from the first day to the end date are split into chunks."""
+
+    assert project._forcing_chunks("2005-10-01", "2005-10-06", 1, 2) == [
+        (1, 2, "2005-10-01", "2005-10-03"),
+        (3, 4, "2005-10-03", "2005-10-05"),
+        (5, 5, "2005-10-05", "2005-10-06"),
+    ]
+    assert project._forcing_chunks("2005-10-01", "2005-10-06", 4, 30) == [
+        (4, 5, "2005-10-04", "2005-10-06"),
+    ]
+    assert project._forcing_chunks("2005-10-01", "2005-10-06", 6, 2) == []
+
+
+def test_create_forcing_in_chunks(tmp_path, monkeypatch):
+    """Test that the forcing is subset in chunks that report progress and resume after a failed chunk."""
+
+    # parflow.Run parses the command line arguments of pytest
+    monkeypatch.setattr(sys, "argv", ["pytest"])
+    monkeypatch.setattr(project, "hf", project.hf)
+    monkeypatch.setattr(project, "st", project.st)
+    fake_providers.install(project)
+    monkeypatch.chdir(tmp_path)
+    subset_forcing = project.st.subset_forcing
+    requested = []
+
+    def failing_subset_forcing(ij_bounds, grid, start, end, dataset, write_dir):
+        requested.append((start, end))
+        if start == "2005-10-05" and len(requested) == 3:
+            raise ValueError("Unable to subset forcing")
+        return subset_forcing(ij_bounds, grid=grid, start=start, end=end, dataset=dataset, write_dir=write_dir)
+
+    monkeypatch.setattr(project.st, "subset_forcing", failing_subset_forcing)
+    received = []
+    options = {
+        "run_type": "transient",
+        "grid_bounds": [3749, 1583, 3759, 1593],
+        "start_date": "2005-10-01",
+        "end_date": "2005-10-06",
+        "forcing_chunk_days": 2,
+        "instrument_listeners": [received.append],
+    }
+    directory_path = str(tmp_path / "chunks")
+    with pytest.raises(ValueError, match="subset forcing"):
+        project.create_project(options, directory_path)
+    project._resolve_spatial_domain.cache_clear()
+    progress = [(e["first_day"], e["last_day"], e["days"], e["status"]) for e in received if e["event"] == "end" and e["name"] == "forcing_chunk"]
+    assert progress == [(1, 2, 5, "ok"), (3, 4, 5, "ok"), (5, 5, 5, "error")]
+    assert os.path.exists(os.path.join(directory_path, "CW3E.APCP.000073_to_000096.pfb"))
+    assert not os.path.exists(os.path.join(directory_path, "CW3E.APCP.000097_to_000120.pfb"))
+
+    project.create_project(options, directory_path)
+    project._resolve_spatial_domain.cache_clear()
+    assert requested[3:] == [("2005-10-05", "2005-10-06")]
+    forcing_files = [name for name in os.listdir(directory_path) if name.startswith("CW3E.") and name.endswith(".pfb")]
+    assert len(forcing_files) == 5 * len(project.FORCING_VARIABLES)
+    assert os.path.exists(os.path.join(directory_path, "CW3E.APCP.000097_to_000120.pfb"))
+
+
+def test_chunks_match_one_chunk(tmp_path, monkeypatch):
+    """Test that the forcing subset in chunks is the same as the forcing subset in one chunk and differs by day."""
+
+    # parflow.Run parses the command line arguments of pytest
+    monkeypatch.setattr(sys, "argv", ["pytest"])
+    monkeypatch.setattr(project, "hf", project.hf)
+    monkeypatch.setattr(project, "st", project.st)
+    monkeypatch.chdir(tmp_path)
+    options = {
+        "run_type": "transient",
+        "grid_bounds": [3749, 1583, 3759, 1593],
+        "start_date": "2005-10-01",
+        "end_date": "2005-10-04",
+    }
+    contents = []
+    for chunk_days in [1, 30]:
+        fake_providers.install(project)
+        directory_path = str(tmp_path / f"chunks_{chunk_days}" / "box")
+        project.create_project({**options, "forcing_chunk_days": chunk_days}, directory_path)
+        project._resolve_spatial_domain.cache_clear()
+        contents.append(
+            {
+                name: data_cache.file_sha256(os.path.join(directory_path, name))
+                for name in os.listdir(directory_path)
+                if name.startswith("CW3E.") and name.endswith(".pfb")
+            }
+        )
+    assert len(contents[0]) == 3 * len(project.FORCING_VARIABLES)
+    assert contents[0] == contents[1]
+    assert contents[0]["CW3E.APCP.000001_to_000024.pfb"] != contents[0]["CW3E.APCP.000025_to_000048.pfb"]
@@ -0,0 +1,96 @@
+"""
+Unit tests for the concurrent fetch of the forcing variables in the project module.
+Uses a local stand-in for hf_hydrodata that injects artificial latency or waits for the other fetches.
+"""
+
+# pylint: disable=C0301,R0914,C0413,E0401
+import sys
+import os
+import time
+import threading
+import numpy as np
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+import project
+
+
+class SlowHydrodata:
+    """
+    A stand-in for hf_hydrodata that sleeps before returning each gridded data array.
+    With a barrier each fetch waits until the barrier parties are fetching at the same time
+    (the wait fails with a BrokenBarrierError if the fetches do not overlap).
+    """
+
+    def __init__(self, latency=0.0, fail_variable=None, barrier=None):
+        self.latency = latency
+        self.fail_variable = fail_variable
+        self.barrier = barrier
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def get_catalog_entry(self, options):
+        return {"dataset_var": options["variable"].upper()}
+
+    def get_gridded_data(self, options):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        if self.barrier is not None:
+            self.barrier.wait(timeout=10)
+        time.sleep(self.latency)
+        with self._lock:
+            self.active -= 1
+        if options["variable"] == self.fail_variable:
+            raise ValueError(f"Unable to get {options['variable']}")
+        value = project.FORCING_VARIABLES.index(options["variable"])
+        bounds = options["grid_bounds"]
+        return np.full((1, bounds[3] - bounds[1], bounds[2] - bounds[0]), float(value))
+
+
+def test_fetch_fixed_forcing_concurrent(monkeypatch):
+    """Test that the forcing variables are fetched concurrently and returned in a deterministic order."""
+
+    # Every fetch waits until all the variables are being fetched at the same time
+    fake = SlowHydrodata(barrier=threading.Barrier(len(project.FORCING_VARIABLES)))
+    monkeypatch.setattr(project, "hf", fake)
+    ij_bounds = [3749, 1583, 3759, 1593]
+
+    result = project._fetch_fixed_forcing({}, ij_bounds, "2005-10-01")
+
+    assert [variable for variable, _, _ in result] == project.FORCING_VARIABLES
+    for index, (variable, dataset_var, data) in enumerate(result):
+        assert data.shape == (1, 10, 10)
+        assert data[0, 0, 0] == index
+        if variable == "air_temp":
+            assert dataset_var == "Temp"
+        elif variable == "atmospheric_pressure":
+            assert dataset_var == "Press"
+        else:
+            assert dataset_var == variable.upper()
+    assert fake.max_active == len(project.FORCING_VARIABLES)
+
+
+def test_fetch_fixed_forcing_workers(monkeypatch):
+    """Test that the forcing_workers option limits the number of concurrent fetches."""
+
+    # The fetches overlap in pairs and a third fetch is never started while a pair is fetching
+    fake = SlowHydrodata(barrier=threading.Barrier(2))
+    monkeypatch.setattr(project, "hf", fake)
+    result = project._fetch_fixed_forcing({"forcing_workers": 2}, [0, 0, 4, 3], "2005-10-01")
+    assert len(result) == len(project.FORCING_VARIABLES)
+    assert fake.max_active == 2
+
+    fake = SlowHydrodata(latency=0.01)
+    monkeypatch.setattr(project, "hf", fake)
+    project._fetch_fixed_forcing({"forcing_workers": 1}, [0, 0, 4, 3], "2005-10-01")
+    assert fake.max_active == 1
+
+
+def test_fetch_fixed_forcing_error(monkeypatch):
+    """Test that an error fetching one variable is raised to the caller."""
+
+    monkeypatch.setattr(project, "hf", SlowHydrodata(latency=0.01, fail_variable="air_temp"))
+    with pytest.raises(ValueError, match="air_temp"):
+        project._fetch_fixed_forcing({}, [0, 0, 4, 3], "2005-10-01")
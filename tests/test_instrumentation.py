@@ -0,0 +1,100 @@
+"""
+Unit tests for instrumentation module and the instrumentation of the stages of create_project.
+The create_project test uses the local hf_hydrodata and subsettools stand-ins of the benchmarks.
+"""
+
+# pylint: disable=C0301,R0914,C0413,E0401
+import sys
+import os
+import json
+import pstats
+import numpy as np
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../benchmarks")))
+import instrumentation
+import project
+import fake_providers
+
+
+def test_span_events(tmp_path):
+    """Test the start and end events of nested spans with the bytes and files written."""
+
+    collector = instrumentation.TimelineCollector()
+    events = instrumentation.Instrumentation([collector])
+    with events.span("static", "stage", str(tmp_path)) as span:
+        span.set(skipped=False)
+        data = events.call("hf.get_gridded_data", lambda: np.zeros((2, 3, 4)))
+        events.call("write", lambda: (tmp_path / "a.bin").write_bytes(data.tobytes()), str(tmp_path))
+    with pytest.raises(ValueError):
+        events.call("fail", lambda: int("x"))
+
+    assert [(e["event"], e["name"]) for e in collector.events][0:2] == [("start", "static"), ("start", "hf.get_gridded_data")]
+    report = collector.report()
+    spans = {span["name"]: span for span in report["spans"]}
+    assert spans["hf.get_gridded_data"]["bytes_in"] == 2 * 3 * 4 * 8
+    assert spans["hf.get_gridded_data"]["parent"] == spans["static"]["id"]
+    assert spans["write"]["bytes_out"] == 2 * 3 * 4 * 8
+    assert spans["static"]["files_out"] == 1
+    assert spans["static"]["skipped"] is False
+    assert spans["fail"]["status"] == "error"
+    assert "ValueError" in spans["fail"]["error"]
+    assert report["stages"]["static"]["count"] == 1
+    assert report["calls"]["write"]["bytes_out"] == 2 * 3 * 4 * 8
+    assert "  hf.get_gridded_data" in collector.format()
+
+
+@pytest.mark.parametrize("profile", ["cprofile", "tracemalloc"])
+def test_profile_stages(tmp_path, profile):
+    """Test that each stage is profiled into the profile directory."""
+
+    collector = instrumentation.TimelineCollector()
+    events = instrumentation.Instrumentation([collector], profile=profile, profile_dir=str(tmp_path))
+    with events.span("build", "stage"):
+        events.call("allocate", lambda: np.ones((100, 100)))
+    end = collector.spans()[0]
+    assert os.path.exists(end["profile_path"])
+    if profile == "cprofile":
+        assert pstats.Stats(end["profile_path"]).total_calls > 0
+    else:
+        assert end["tracemalloc_peak_bytes"] >= 100 * 100 * 8
+
+    with pytest.raises(ValueError):
+        instrumentation.Instrumentation(profile="unknown", profile_dir=str(tmp_path))
+
+
+def test_create_project_timeline(tmp_path, monkeypatch):
+    """Test that create_project writes a timeline of the stages and external calls."""
+
+    # parflow.Run parses the command line arguments of pytest
+    monkeypatch.setattr(sys, "argv", ["pytest"])
+    monkeypatch.setattr(project, "hf", project.hf)
+    monkeypatch.setattr(project, "st", project.st)
+    fake_providers.install(project)
+    monkeypatch.chdir(tmp_path)
+    received = []
+    options = {
+        "run_type": "transient",
+        "grid_bounds": [3749, 1583, 3759, 1593],
+        "start_date": "2005-10-01",
+        "end_date": "2005-10-03",
+        "forcing_day": "2005-10-01",
+        "topology": [2, 1, 1],
+        "instrument": True,
+        "instrument_listeners": [received.append],
+    }
+    directory_path = str(tmp_path / "timeline")
+    project.create_project(options, directory_path)
+    project._resolve_spatial_domain.cache_clear()
+
+    with open(os.path.join(directory_path, instrumentation.TIMELINE_FILE_NAME), "r", encoding="utf-8") as stream:
+        report = json.load(stream)
+    assert list(report["stages"].keys()) == ["runscript", "domain", "topology", "mask", "static", "clm", "forcing", "dist", "write"]
+    assert report["calls"]["hf.get_gridded_data"]["count"] == len(project.FORCING_VARIABLES)
+    assert report["calls"]["hf.get_gridded_data"]["bytes_in"] == len(project.FORCING_VARIABLES) * 10 * 10 * 8
+    assert report["calls"]["parflow.write_pfb"]["count"] == len(project.FORCING_VARIABLES)
+    assert report["calls"]["st.subset_static"]["files_out"] == len(fake_providers.STATIC_LAYERS)
+    assert report["calls"]["pfb_dist.distribute_files"]["count"] == 1
+    assert report["stages"]["forcing"]["files_out"] >= 2 * len(project.FORCING_VARIABLES)
+    assert len(received) == 2 * len(report["spans"])
@@ -0,0 +1,152 @@
+"""
+Unit tests for output_policy module.
+The create_project test uses the local hf_hydrodata and subsettools stand-ins of the benchmarks.
+"""
+
+# pylint: disable=C0301,R0914,C0413,E0401
+import sys
+import os
+import json
+import numpy as np
+import netCDF4
+import parflow
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../benchmarks")))
+import output_policy
+import pf_segments
+import project
+import fake_providers
+
+
+def _write_outputs(directory_path, name, timesteps, shape, suffix=""):
+    """Write output files with values t * 1000 + z."""
+
+    arrays = {}
+    for t in timesteps:
+        arrays[t] = t * 1000.0 + np.broadcast_to(np.arange(shape[0])[:, np.newaxis, np.newaxis], shape)
+        path = os.path.join(directory_path, f"box.out.{name}.{t:05d}{suffix}.pfb")
+        parflow.write_pfb(path, arrays[t], p=2, q=2, dist=False)
+    return arrays
+
+
+def test_create_project_policy(tmp_path, monkeypatch):
+    """Test that the print flags and the DumpInterval of the runscript are set from the output_policy."""
+
+    # parflow.Run parses the command line arguments of pytest
+    monkeypatch.setattr(sys, "argv", ["pytest"])
+    monkeypatch.setattr(project, "hf", project.hf)
+    monkeypatch.setattr(project, "st", project.st)
+    fake_providers.install(project)
+    monkeypatch.chdir(tmp_path)
+    options = {
+        "run_type": "transient",
+        "grid_bounds": [3749, 1583, 3759, 1593],
+        "start_date": "2005-10-01",
+        "end_date": "2005-10-03",
+        "forcing_day": "2005-10-01",
+        "output_policy": {
+            "variables": {"press": {"interval": 24, "top_layers": 1}, "clm_output": {"interval": 6}, "mask": {}},
+            "complevel": 4,
+        },
+    }
+    directory_path = str(tmp_path / "box")
+    runscript_path = project.create_project(options, directory_path)
+    project._resolve_spatial_domain.cache_clear()
+
+    model = parflow.Run.from_definition(runscript_path)
+    assert model.TimingInfo.DumpInterval == 6.0
+    assert model.Solver.PrintPressure and model.Solver.PrintCLM and model.Solver.PrintMask
+    assert not model.Solver.PrintSaturation and not model.Solver.PrintSubsurfData
+    assert os.path.exists(os.path.join(directory_path, output_policy.POLICY_FILE_NAME))
+
+    with pytest.raises(ValueError):
+        output_policy.apply_policy(model, {"variables": {"clm_output": {"top_layers": 1}}}, directory_path)
+    with pytest.raises(ValueError):
+        output_policy.apply_policy(model, {"variables": {"mask": {"interval": 24}}}, directory_path)
+
+    # A spinup needs the outputs of the storage and a segmented run the press outputs of all layers
+    spinup_variables = {"press": {}, "satur": {"interval": 24}, "subsurf_data": {}, "mask": {}}
+    output_policy.apply_policy(model, {"variables": spinup_variables}, directory_path, run_type="spinup")
+    assert model.Solver.PrintSubsurfData and model.Solver.PrintMask
+    with pytest.raises(ValueError, match="subsurf_data"):
+        output_policy.apply_policy(model, {"variables": {"press": {}, "satur": {}, "mask": {}}}, directory_path, run_type="spinup")
+    with pytest.raises(ValueError, match="complevel"):
+        output_policy.apply_policy(model, {"variables": spinup_variables, "complevel": 4}, directory_path, run_type="spinup")
+    with pytest.raises(ValueError, match="top_layers"):
+        output_policy.apply_policy(model, {"variables": {"press": {"top_layers": 1}}}, directory_path, segment_hours=24)
+    with pytest.raises(ValueError, match="press"):
+        output_policy.apply_policy(model, {"variables": {"satur": {}}}, directory_path, segment_hours=24)
+
+
+def test_thin_outputs(tmp_path):
+    """Test that the outputs between the intervals are removed, the top layers kept and the outputs compressed."""
+
+    directory_path = str(tmp_path / "box")
+    os.makedirs(directory_path)
+    press = _write_outputs(directory_path, "press", range(0, 9), (10, 4, 5))
+    _write_outputs(directory_path, "clm_output", range(1, 9), (20, 4, 5), ".C")
+    path_8 = os.path.join(directory_path, "box.out.press.00008.pfb")
+    with open(path_8, "r+b") as stream:
+        stream.truncate(os.path.getsize(path_8) - 8)
+    policy = {
+        "variables": {"press": {"interval": 24, "top_layers": 2}, "clm_output": {"interval": 12, "top_layers": None}},
+        "complevel": None,
+        "dump_interval": 6.0,
+    }
+
+    result = output_policy.thin_outputs(directory_path, policy=policy)
+    # press 1, 2, 3, 5, 6, 7 and clm_output 1, 3, 5, 7 are removed and the file still being written is skipped
+    assert result == {"removed": 10, "truncated": 2, "stored": {}}
+    assert sorted(os.listdir(directory_path)) == [
+        "box.out.clm_output.00002.C.pfb",
+        "box.out.clm_output.00004.C.pfb",
+        "box.out.clm_output.00006.C.pfb",
+        "box.out.clm_output.00008.C.pfb",
+        "box.out.press.00000.pfb",
+        "box.out.press.00004.pfb",
+        "box.out.press.00008.pfb",
+    ]
+    assert np.array_equal(parflow.read_pfb(os.path.join(directory_path, "box.out.press.00004.pfb")), press[4][-2:])
+    assert parflow.read_pfb(os.path.join(directory_path, "box.out.clm_output.00002.C.pfb")).shape == (20, 4, 5)
+
+    _write_outputs(directory_path, "press", [8], (10, 4, 5))
+    result = output_policy.thin_outputs(directory_path, policy={**policy, "complevel": 4})
+    assert result == {"removed": 0, "truncated": 1, "stored": {"press": 3, "clm_output": 4}}
+    assert sorted(os.listdir(directory_path)) == ["box.out.nc"]
+    with netCDF4.Dataset(os.path.join(directory_path, "box.out.nc"), "r") as store:
+        assert store.variables["press"].shape == (3, 2, 4, 5)
+        assert list(store.variables["time_press"][:]) == [0.0, 24.0, 48.0]
+        assert np.array_equal(store.variables["press"][1], press[4][-2:])
+
+
+def test_thin_outputs_segments(tmp_path):
+    """Test that the press outputs at the stop of the segments are kept for the restart of the next segment."""
+
+    directory_path = str(tmp_path / "box")
+    os.makedirs(directory_path)
+    _write_outputs(directory_path, "press", range(0, 7), (10, 4, 5))
+    segments = [{"start": 0.0, "stop": 18.0, "complete": True}, {"start": 18.0, "stop": 36.0, "complete": False}]
+    with open(os.path.join(directory_path, pf_segments.SEGMENTS_FILE_NAME), "w", encoding="utf-8") as stream:
+        json.dump({"segments": segments}, stream)
+    policy = {"variables": {"press": {"interval": 24, "top_layers": None}}, "complevel": None, "dump_interval": 6.0}
+
+    result = output_policy.thin_outputs(directory_path, policy=policy)
+    assert result["removed"] == 3
+    assert sorted(name for name in os.listdir(directory_path) if name.endswith(".pfb")) == [
+        "box.out.press.00000.pfb",
+        "box.out.press.00003.pfb",
+        "box.out.press.00004.pfb",
+        "box.out.press.00006.pfb",
+    ]
+
+    # The restart files are stored and not deleted when the outputs are compressed
+    result = output_policy.thin_outputs(directory_path, policy={**policy, "complevel": 4})
+    assert result["stored"] == {"press": 4}
+    assert sorted(name for name in os.listdir(directory_path) if name.endswith(".pfb")) == [
+        "box.out.press.00003.pfb",
+        "box.out.press.00006.pfb",
+    ]
+    with pytest.raises(ValueError):
+        output_policy.thin_outputs(directory_path, policy={"variables": {"press": {"interval": 24, "top_layers": 1}}, "dump_interval": 6.0})
@@ -0,0 +1,72 @@
+"""
+Unit tests for output_store module.
+"""
+
+# pylint: disable=C0301,R0914,C0413,E0401
+import sys
+import os
+import numpy as np
+import netCDF4
+import parflow
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+import output_store
+
+
+def _write_press(directory_path, timesteps, shape=(3, 4, 5)):
+    """Write press output files with values t * 1000 + z * 100 + y * 10 + x / 10."""
+
+    nz, ny, nx = shape
+    z, y, x = np.meshgrid(np.arange(nz), np.arange(ny), np.arange(nx), indexing="ij")
+    arrays = {}
+    for t in timesteps:
+        arrays[t] = t * 1000.0 + z * 100.0 + y * 10.0 + x / 10.0
+        path = os.path.join(directory_path, f"box.out.press.{t:05d}.pfb")
+        parflow.write_pfb(path, arrays[t], p=2, q=2, dist=False)
+    return arrays
+
+
+def test_consolidate_incrementally(tmp_path):
+    """Test that new output files are appended to the store and files still being written are skipped."""
+
+    directory_path = str(tmp_path)
+    arrays = _write_press(directory_path, [0, 1, 2])
+    timing = {"start_time": 0.0, "start_count": 0, "dump_interval": 1.0}
+    appended = output_store.consolidate_outputs(
+        directory_path, runname="box", timing=timing, chunks={"time": 2}
+    )
+    assert appended == {"press": 3}
+
+    # Timestep 4 is still being written so only timestep 3 is appended
+    arrays.update(_write_press(directory_path, [3, 4]))
+    path_4 = os.path.join(directory_path, "box.out.press.00004.pfb")
+    with open(path_4, "r+b") as stream:
+        stream.truncate(os.path.getsize(path_4) - 8)
+    appended = output_store.consolidate_outputs(directory_path, runname="box", timing=timing)
+    assert appended == {"press": 1}
+
+    with netCDF4.Dataset(os.path.join(directory_path, "box.out.nc"), "r") as store:
+        assert store.variables["press"].shape == (4, 3, 4, 5)
+        assert store.variables["press"].chunking() == [2, 3, 4, 5]
+        assert list(store.variables["timestep_press"][:]) == [0, 1, 2, 3]
+        assert list(store.variables["time_press"][:]) == [0.0, 1.0, 2.0, 3.0]
+        np.testing.assert_array_equal(
+            store.variables["press"][:], np.stack([arrays[t] for t in range(0, 4)])
+        )
+
+
+def test_consolidate_delete_source(tmp_path):
+    """Test that the source files are removed once stored and the time is computed from the timing."""
+
+    directory_path = str(tmp_path)
+    _write_press(directory_path, [10, 20])
+    timing = {"start_time": 5.0, "start_count": 10, "dump_interval": -2, "time_step": 0.5}
+    store_path = str(tmp_path / "store.nc")
+    appended = output_store.consolidate_outputs(
+        directory_path, store_path=store_path, runname="box", timing=timing, delete_source=True
+    )
+    assert appended == {"press": 2}
+    assert not [f for f in os.listdir(directory_path) if f.endswith(".pfb")]
+    with netCDF4.Dataset(store_path, "r") as store:
+        assert list(store.variables["time_press"][:]) == [5.0, 15.0]
+        assert store.getncattr("start_count") == 10
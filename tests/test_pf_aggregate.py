@@ -0,0 +1,108 @@
+"""
+Unit tests for pf_aggregate module.
+"""
+
+# pylint: disable=C0301,R0914,C0413,E0401
+import sys
+import os
+import shutil
+import numpy as np
+import parflow
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+import pf_aggregate
+import output_store
+
+TEMPLATE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "../src/template_runscripts/conus2_transient_solid.yaml"))
+
+
+def _cell_values(t, shape, offset=0.0):
+    """Values t * 1000 + z * 100 + y * 10 + x + offset of the cells of the shape."""
+
+    z, y, x = np.indices(shape)
+    return t * 1000.0 + z * 100.0 + y * 10.0 + x + offset
+
+
+def _write_scenario(scenarios_dir, name, timesteps, offset, mask=None):
+    """Write the runscript and the press output files of a scenario directory."""
+
+    directory_path = os.path.join(scenarios_dir, name)
+    os.makedirs(directory_path)
+    shutil.copy(TEMPLATE_PATH, os.path.join(directory_path, f"{name}.yaml"))
+    for t in timesteps:
+        path = os.path.join(directory_path, f"{name}.out.press.{t:05d}.pfb")
+        parflow.write_pfb(path, _cell_values(t, (3, 4, 5), offset), p=2, q=2, dist=False)
+    if mask is not None:
+        parflow.write_pfb(os.path.join(directory_path, "mask.pfb"), mask[np.newaxis].astype(float), dist=False)
+    return directory_path
+
+
+def test_aggregate_scenarios(tmp_path, monkeypatch):
+    """Test that the point, column and mean series of all the scenarios are saved in one columnar file."""
+
+    # parflow.Run parses the command line arguments of pytest
+    monkeypatch.setattr(sys, "argv", ["pytest"])
+    scenarios_dir = str(tmp_path / "scenarios")
+    mask = np.zeros((4, 5))
+    mask[2:4, 3:5] = 1
+    _write_scenario(scenarios_dir, "a", range(0, 3), 0.0, mask)
+    b_path = _write_scenario(scenarios_dir, "b", range(0, 3), 0.5)
+    # The outputs of b are consolidated into the store and the pfb files deleted except the last one
+    output_store.consolidate_outputs(b_path, runname="b", timing={"dump_interval": 1.0}, delete_source=True)
+    parflow.write_pfb(os.path.join(b_path, "b.out.press.00003.pfb"), _cell_values(3, (3, 4, 5), 0.5), dist=False)
+    os.makedirs(os.path.join(scenarios_dir, "not_a_scenario"))
+
+    locations = [
+        {"name": "well", "x": 4, "y": 1},
+        {"name": "well_column", "type": "column", "x": 1, "y": 2},
+        {"name": "basin", "type": "mean", "z": 1},
+    ]
+    rows = pf_aggregate.aggregate_scenarios(scenarios_dir, locations, variables=["press", "satur"], max_workers=2)
+    assert rows == {"a": 3 * 5, "b": 4 * 5}
+
+    columns = pf_aggregate.read_aggregate(os.path.join(scenarios_dir, pf_aggregate.AGGREGATE_FILE_NAME))
+    assert len(columns["value"]) == 35
+    assert set(columns["variable"]) == {"press"}
+
+    def select(scenario, location, layer):
+        rows = (columns["scenario"] == scenario) & (columns["location"] == location) & (columns["layer"] == layer)
+        order = np.argsort(columns["timestep"][rows])
+        return columns["time"][rows][order], columns["value"][rows][order]
+
+    time, value = select("a", "well", 2)
+    assert list(time) == [0.0, 1.0, 2.0]
+    assert list(value) == [214.0, 1214.0, 2214.0]
+    time, value = select("b", "well", 2)
+    assert list(time) == [0.0, 1.0, 2.0, 3.0]
+    assert list(value) == [214.5, 1214.5, 2214.5, 3214.5]
+    assert list(select("a", "well_column", 0)[1]) == [21.0, 1021.0, 2021.0]
+    assert list(select("a", "well_column", 1)[1]) == [121.0, 1121.0, 2121.0]
+    # The mean of a uses the active cells of its mask.pfb and b has no mask
+    assert list(select("a", "basin", 1)[1]) == [128.5, 1128.5, 2128.5]
+    assert list(select("b", "basin", 1)[1]) == [117.5, 1117.5, 2117.5, 3117.5]
+
+    with pytest.raises(ValueError):
+        pf_aggregate.aggregate_scenarios(scenarios_dir, [{"name": "ring", "type": "ring"}])
+    with pytest.raises(ValueError):
+        pf_aggregate.aggregate_scenarios(scenarios_dir, [{"name": "well"}])
+
+
+def test_broken_scenario(tmp_path, monkeypatch):
+    """Test that a scenario with a partial output store is skipped and the other scenarios are saved."""
+
+    monkeypatch.setattr(sys, "argv", ["pytest"])
+    scenarios_dir = str(tmp_path / "scenarios")
+    _write_scenario(scenarios_dir, "good", range(0, 3), 0.0)
+    broken_path = _write_scenario(scenarios_dir, "broken", range(0, 3), 0.0)
+    output_store.consolidate_outputs(broken_path, runname="broken", timing={"dump_interval": 1.0}, delete_source=True)
+    store_path = os.path.join(broken_path, "broken.out.nc")
+    with open(store_path, "r+b") as stream:
+        stream.truncate(os.path.getsize(store_path) // 2)
+
+    with pytest.warns(UserWarning, match="broken"):
+        rows = pf_aggregate.aggregate_scenarios(scenarios_dir, [{"name": "well", "x": 4, "y": 1}], variables=["press"], max_workers=2)
+    assert rows == {"broken": None, "good": 3}
+    columns = pf_aggregate.read_aggregate(os.path.join(scenarios_dir, pf_aggregate.AGGREGATE_FILE_NAME))
+    assert set(columns["scenario"]) == {"good"}
+    assert len(columns["value"]) == 3
@@ -0,0 +1,114 @@
+"""
+Unit tests for pf_ensemble module.
+The create_project tests use the local hf_hydrodata and subsettools stand-ins of the benchmarks.
+"""
+
+# pylint: disable=C0301,R0914,C0413,E0401
+import sys
+import os
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../benchmarks")))
+import pf_ensemble
+import project
+import project_manifest
+import data_cache
+import fake_providers
+
+
+def _contents(directory_path):
+    """Get the sha256 of the files of the project directory except the manifest and runscript."""
+
+    return {
+        name: data_cache.file_sha256(os.path.join(directory_path, name))
+        for name in data_cache.snapshot_files(directory_path)
+        if name != project_manifest.MANIFEST_FILE_NAME and not name.endswith((".yaml", ".pfidb"))
+    }
+
+
+def test_create_ensemble(tmp_path, monkeypatch):
+    """Test that the members have the files of independent projects with the shared files linked."""
+
+    # parflow.Run parses the command line arguments of pytest
+    monkeypatch.setattr(sys, "argv", ["pytest"])
+    monkeypatch.setattr(project, "hf", project.hf)
+    monkeypatch.setattr(project, "st", project.st)
+    monkeypatch.chdir(tmp_path)
+    hydrodata = fake_providers.install(project)
+    options = {
+        "run_type": "transient",
+        "grid_bounds": [3749, 1583, 3759, 1593],
+        "start_date": "2005-10-01",
+        "end_date": "2005-10-03",
+        "forcing_day": "2005-10-01",
+        "topology": [2, 2, 1],
+    }
+    members = {"dry": {"precip": 0.0}, "wet": {"precip": 0.5}, "day_2": {"forcing_day": "2005-10-02"}}
+    ensemble_dir = tmp_path / "ensemble"
+    runscript_paths = pf_ensemble.create_ensemble(options, members, str(ensemble_dir))
+    project._resolve_spatial_domain.cache_clear()
+
+    shared_dir = str(ensemble_dir / pf_ensemble.SHARED_DIR_NAME)
+    assert runscript_paths["wet"] == str(ensemble_dir / "wet" / "wet.yaml")
+    for name in fake_providers.STATIC_LAYERS:
+        for member in members:
+            assert os.path.samefile(os.path.join(shared_dir, f"{name}.pfb"), ensemble_dir / member / f"{name}.pfb")
+    assert os.path.samefile(os.path.join(shared_dir, "drv_clmin.dat"), ensemble_dir / "dry" / "drv_clmin.dat")
+    assert os.path.samefile(os.path.join(shared_dir, "CW3E.Temp.000001_to_000024.pfb"), ensemble_dir / "wet" / "CW3E.Temp.000001_to_000024.pfb")
+    assert not os.path.samefile(os.path.join(shared_dir, "CW3E.APCP.000001_to_000024.pfb"), ensemble_dir / "wet" / "CW3E.APCP.000001_to_000024.pfb")
+
+    # Each member has the same files as a project created with the options of the member
+    for member, member_options in members.items():
+        expected_dir = str(tmp_path / "expected" / member)
+        project.create_project({**options, **member_options}, expected_dir)
+        project._resolve_spatial_domain.cache_clear()
+        assert _contents(str(ensemble_dir / member)) == _contents(expected_dir)
+
+    # Creating the ensemble again skips the stages of the members
+    requests = hydrodata.requests
+    pf_ensemble.create_ensemble(options, members, str(ensemble_dir))
+    project._resolve_spatial_domain.cache_clear()
+    assert hydrodata.requests == requests
+    manifest = project_manifest.ProjectManifest(str(ensemble_dir / "wet"))
+    assert manifest.stages["static"]["complete"]
+
+    with pytest.raises(ValueError):
+        pf_ensemble.create_ensemble(options, {"moved": {"grid_bounds": [0, 0, 10, 10]}}, str(ensemble_dir))
+
+
+def test_members_do_not_write_shared_files(tmp_path, monkeypatch):
+    """Test that members with other forcing dates replace their linked files and never write the shared files."""
+
+    # parflow.Run parses the command line arguments of pytest
+    monkeypatch.setattr(sys, "argv", ["pytest"])
+    monkeypatch.setattr(project, "hf", project.hf)
+    monkeypatch.setattr(project, "st", project.st)
+    monkeypatch.chdir(tmp_path)
+    fake_providers.install(project)
+    options = {
+        "run_type": "transient",
+        "grid_bounds": [3749, 1583, 3759, 1593],
+        "start_date": "2005-10-01",
+        "end_date": "2005-10-03",
+        "forcing_day": "2005-10-01",
+        "topology": [2, 2, 1],
+    }
+    ensemble_dir = tmp_path / "ensemble"
+    shared_dir = str(ensemble_dir / pf_ensemble.SHARED_DIR_NAME)
+    pf_ensemble.create_ensemble(options, {"same": {"precip": 0.0}}, str(ensemble_dir))
+    project._resolve_spatial_domain.cache_clear()
+    shared = _contents(shared_dir)
+    assert os.path.samefile(os.path.join(shared_dir, "CW3E.Temp.000001_to_000024.pfb"), ensemble_dir / "same" / "CW3E.Temp.000001_to_000024.pfb")
+
+    # The forcing files of the member are links to the shared files when the member is created again with other dates
+    members = {"same": {"forcing_day": "2005-10-02"}, "day_3": {"forcing_day": "2005-10-03"}}
+    pf_ensemble.create_ensemble(options, members, str(ensemble_dir))
+    project._resolve_spatial_domain.cache_clear()
+    assert _contents(shared_dir) == shared
+    assert not os.path.samefile(os.path.join(shared_dir, "CW3E.Temp.000001_to_000024.pfb"), ensemble_dir / "same" / "CW3E.Temp.000001_to_000024.pfb")
+    for member, member_options in members.items():
+        expected_dir = str(tmp_path / "expected" / member)
+        project.create_project({**options, **member_options}, expected_dir)
+        project._resolve_spatial_domain.cache_clear()
+        assert _contents(str(ensemble_dir / member)) == _contents(expected_dir)
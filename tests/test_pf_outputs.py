@@ -0,0 +1,72 @@
+"""
+Unit tests for pf_outputs module.
+"""
+
+# pylint: disable=C0301,R0914,C0413,E0401
+import sys
+import os
+import numpy as np
+import parflow
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+import pf_outputs
+
+
+def _write_outputs(directory_path, runname, variable, timesteps, shape, p=1, q=1, suffix=""):
+    """Write output pfb files with values t * 1000 + z * 100 + y * 10 + x / 10."""
+
+    nz, ny, nx = shape
+    z, y, x = np.meshgrid(np.arange(nz), np.arange(ny), np.arange(nx), indexing="ij")
+    arrays = []
+    for t in timesteps:
+        array = t * 1000.0 + z * 100.0 + y * 10.0 + x / 10.0
+        path = os.path.join(directory_path, f"{runname}.out.{variable}.{t:05d}{suffix}.pfb")
+        parflow.write_pfb(path, array, p=p, q=q, dist=False)
+        arrays.append(array)
+    return np.stack(arrays)
+
+
+def test_index_run_directory(tmp_path):
+    """Test that the output files are indexed by variable and timestep."""
+
+    directory_path = tmp_path / "box"
+    directory_path.mkdir()
+    _write_outputs(str(directory_path), "box", "press", [0, 5, 10], (3, 4, 5))
+    _write_outputs(str(directory_path), "box", "clm_output", [1, 2], (2, 4, 5), suffix=".C")
+    (directory_path / "box.out.mask.pfb").write_bytes(b"")
+    (directory_path / "other.out.press.00000.pfb").write_bytes(b"")
+
+    outputs = pf_outputs.OutputDataset(str(directory_path))
+    assert outputs.variables == ["clm_output", "press"]
+    assert "press" in outputs
+    assert outputs["press"].timesteps == [0, 5, 10]
+    assert outputs["press"].shape == (3, 3, 4, 5)
+    assert outputs["clm_output"].shape == (2, 2, 4, 5)
+    with pytest.raises(KeyError):
+        outputs["satur"]
+
+    _write_outputs(str(directory_path), "box", "satur", [0], (3, 4, 5))
+    outputs.refresh()
+    assert "satur" in outputs
+
+
+@pytest.mark.parametrize("p, q", [(1, 1), (2, 3)])
+def test_slice_matches_read_pfb(tmp_path, p, q):
+    """Test that slicing the variable gets the same values as reading the whole files."""
+
+    expected = _write_outputs(str(tmp_path), "run", "press", [0, 1, 2, 3], (4, 7, 9), p=p, q=q)
+    press = pf_outputs.OutputDataset(str(tmp_path), runname="run")["press"]
+    assert press.layout.shape == (4, 7, 9)
+    assert len(press.layout.subgrids) == p * q
+
+    np.testing.assert_array_equal(press[:, :, :, :], expected)
+    np.testing.assert_array_equal(press[:, 3, 5, 8], expected[:, 3, 5, 8])
+    np.testing.assert_array_equal(press[2, :, 1, 2], expected[2, :, 1, 2])
+    np.testing.assert_array_equal(press[1:3, -1, 2:6, ::2], expected[1:3, -1, 2:6, ::2])
+    np.testing.assert_array_equal(press[:, 0, [0, 6], [1, 8]], expected[:, 0][:, [0, 6]][:, :, [1, 8]])
+    assert press[3, 3, 6, 8] == expected[3, 3, 6, 8]
+    assert press[-1, 0, 0, 0] == parflow.read_pfb(press.paths[-1])[0, 0, 0]
+
+    with pytest.raises(IndexError):
+        press[4, 0, 0, 0]
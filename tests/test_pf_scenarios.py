@@ -0,0 +1,76 @@
+"""
+Unit tests for pf_scenarios module.
+"""
+
+# pylint: disable=C0301,R0914,C0413,E0401
+import sys
+import os
+import json
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+import pf_scenarios
+
+
+def test_scenario_options():
+    """Test the options of the scenarios of the matrix."""
+
+    runname, options = pf_scenarios.scenario_options("large", "zero")
+    assert runname == "large_zero"
+    assert options["forcing_day"] == "2005-10-01"
+    assert options["precip"] == 0.0
+    assert options["time_steps"] == 10
+
+    with pytest.raises(ValueError):
+        pf_scenarios.scenario_options("large", "unknown")
+
+
+def test_core_budget(tmp_path):
+    """Test that a scenario with a topology larger than the core budget fails without stopping the others."""
+
+    scenarios = [("too_large", {"topology": [4, 4, 1]})]
+    summary = pf_scenarios.run_scenarios(
+        scenarios, run_parflow=True, total_cores=8, scenarios_dir=str(tmp_path)
+    )
+    assert summary["failed"] == 1
+    assert summary["scenarios"][0]["runname"] == "too_large"
+    assert summary["scenarios"][0]["cores"] == 16
+    assert "16 cores" in summary["scenarios"][0]["error"]
+    with open(tmp_path / "summary.json", "r", encoding="utf-8") as stream:
+        assert json.load(stream)["failed"] == 1
+
+
+def test_scenario_failure(tmp_path, monkeypatch):
+    """Test that the error of a failed scenario is collected into the summary."""
+
+    monkeypatch.chdir(tmp_path)
+    scenarios = [("missing_target", {"start_date": "2005-10-01", "end_date": "2005-10-02"})]
+    scenarios_dir = tmp_path / "runs"
+    summary = pf_scenarios.run_scenarios(scenarios, max_workers=1, scenarios_dir=str(scenarios_dir))
+    assert summary["failed"] == 1
+    assert summary["scenarios"][0]["status"] == "failed"
+    assert "TypeError" in summary["scenarios"][0]["error"]
+    # The scenario directory is created in the scenarios_dir and not in the working directory
+    assert os.path.isdir(scenarios_dir / "missing_target")
+    assert not os.path.exists(tmp_path / "scenarios")
+
+
+def _exit_execute(runname, scenario_options):
+    """Build a scenario like a parflow run that fails with sys.exit(1)."""
+    if scenario_options.get("exit"):
+        sys.exit(1)
+    return f"{runname}.yaml"
+
+
+def test_scenario_exit(tmp_path):
+    """Test that a scenario exiting with SystemExit fails without stopping the other scenarios."""
+
+    scenarios = [("first", {}), ("exits", {"exit": True}), ("last", {})]
+    summary = pf_scenarios.run_scenarios(
+        scenarios, max_workers=2, scenarios_dir=str(tmp_path), execute=_exit_execute
+    )
+    assert summary["failed"] == 1
+    assert [r["status"] for r in summary["scenarios"]] == ["ok", "failed", "ok"]
+    assert "SystemExit" in summary["scenarios"][1]["error"]
+    with open(tmp_path / "summary.json", "r", encoding="utf-8") as stream:
+        assert json.load(stream)["scenarios"][1]["status"] == "failed"
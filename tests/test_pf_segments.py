@@ -0,0 +1,106 @@
+"""
+Unit tests for pf_segments module.
+The project is created with the local hf_hydrodata and subsettools stand-ins of the benchmarks
+and parflow is replaced by a function that writes the outputs of each segment.
+"""
+
+# pylint: disable=C0301,R0914,C0413,E0401
+import sys
+import os
+import numpy as np
+import parflow
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../benchmarks")))
+import project
+import pf_segments
+import pfb_dist
+import fake_providers
+
+
+class FakeParflow:
+    """Writes the final pressure output and CLM restart file of a segment instead of running parflow."""
+
+    def __init__(self, directory_path, fail_at=None):
+        self.directory_path = directory_path
+        self.fail_at = fail_at
+        self.runs = []
+
+    def __call__(self, model):
+        start = float(model.TimingInfo.StartTime)
+        stop = float(model.TimingInfo.StopTime)
+        initial = model.Geom.domain.ICPressure.FileName
+        with open(os.path.join(self.directory_path, "clm.rst.00000.0"), "r", encoding="utf-8") as stream:
+            restart = stream.read() if start > 0 else None
+        self.runs.append(
+            {
+                "start": start,
+                "start_count": model.TimingInfo.StartCount,
+                "istep_start": model.Solver.CLM.IstepStart,
+                "initial": initial,
+                "initial_value": parflow.read_pfb(os.path.join(self.directory_path, initial))[0, 0, 0],
+                "restart": restart,
+                "print_initial": model.Solver.PrintInitialConditions,
+            }
+        )
+        with open(os.path.join(self.directory_path, "clm.rst.00000.0"), "w", encoding="utf-8") as stream:
+            stream.write(f"restart at {stop:g}")
+        if stop == self.fail_at:
+            raise SystemExit(1)
+        array = np.full((10, 10, 10), stop)
+        parflow.write_pfb(os.path.join(self.directory_path, f"box.out.press.{int(stop):05d}.pfb"), array, p=2, q=1, dist=False)
+
+
+def test_segments(tmp_path, monkeypatch):
+    """Test that the segments restart from the previous segment and resume after a failed segment."""
+
+    # parflow.Run parses the command line arguments of pytest
+    monkeypatch.setattr(sys, "argv", ["pytest"])
+    monkeypatch.setattr(project, "hf", project.hf)
+    monkeypatch.setattr(project, "st", project.st)
+    fake_providers.install(project)
+    monkeypatch.chdir(tmp_path)
+    options = {
+        "run_type": "transient",
+        "grid_bounds": [3749, 1583, 3759, 1593],
+        "start_date": "2005-10-01",
+        "end_date": "2005-10-04",
+        "forcing_day": "2005-10-01",
+        "topology": [2, 1, 1],
+        "segment_hours": 24,
+    }
+    directory_path = str(tmp_path / "box")
+    runscript_path = project.create_project(options, directory_path)
+    project._resolve_spatial_domain.cache_clear()
+    with open(os.path.join(directory_path, "drv_clmin.dat"), "a", encoding="utf-8") as stream:
+        stream.write(f"{'startcode':<15}{2:<37} 1=restart file, 2=defined\n")
+    with open(os.path.join(directory_path, "clm.rst.00000.0"), "w", encoding="utf-8") as stream:
+        stream.write("none")
+    assert [(s["start"], s["stop"]) for s in pf_segments.read_segments(directory_path)] == [(0, 24), (24, 48), (48, 72)]
+
+    fake = FakeParflow(directory_path, fail_at=48)
+    with pytest.raises(SystemExit):
+        pf_segments.run_segments(runscript_path, run=fake)
+    assert [s["complete"] for s in pf_segments.read_segments(directory_path)] == [True, False, False]
+
+    fake = FakeParflow(directory_path)
+    assert pf_segments.run_segments(runscript_path, run=fake, max_segments=1) == [1]
+    assert fake.runs[0]["start"] == 24
+    assert fake.runs[0]["start_count"] == 24
+    assert fake.runs[0]["istep_start"] == 25
+    assert fake.runs[0]["initial"] == os.path.join("segments", "000", "press.pfb")
+    assert fake.runs[0]["initial_value"] == 24
+    assert fake.runs[0]["restart"] == "restart at 24"
+    assert fake.runs[0]["print_initial"] is False
+    assert pfb_dist.is_dist_current(os.path.join(directory_path, "segments", "000", "press.pfb"), 2, 1)
+    with open(os.path.join(directory_path, "drv_clmin.dat"), "r", encoding="utf-8") as stream:
+        assert "startcode      1 " in stream.read()
+
+    assert pf_segments.run_segments(runscript_path, run=fake) == [2]
+    assert fake.runs[1]["initial_value"] == 48
+    assert fake.runs[1]["restart"] == "restart at 48"
+    assert pf_segments.run_segments(runscript_path, run=fake) == []
+
+    with pytest.raises(ValueError, match="multiple of 24"):
+        pf_segments.plan_segments(runscript_path, 36)
@@ -0,0 +1,95 @@
+"""
+Unit tests for pf_spinup module.
+The project is created with the local hf_hydrodata and subsettools stand-ins of the benchmarks
+and parflow is replaced by a function that writes the outputs of a water table converging to equilibrium.
+"""
+
+# pylint: disable=C0301,R0914,C0413,E0401
+import sys
+import os
+import json
+import math
+import numpy as np
+import parflow
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../benchmarks")))
+import project
+import pf_spinup
+import pf_segments
+import fake_providers
+
+
+class FakeSpinup:
+    """Writes the pressure and saturation dumps of a water table rising from 40 m to 5 m below the surface."""
+
+    def __init__(self, directory_path):
+        self.directory_path = directory_path
+        self.runs = []
+
+    def __call__(self, model):
+        self.runs.append(float(model.TimingInfo.StartTime))
+        dump_interval = float(model.TimingInfo.DumpInterval)
+        dz = pf_spinup._layer_thicknesses(model, 10)
+        elevation = (np.cumsum(dz) - dz / 2)[:, np.newaxis, np.newaxis]
+        shape = (10, 10, 10)
+        for name, value in [("porosity", 0.3), ("specific_storage", 1e-4), ("mask", 1.0)]:
+            parflow.write_pfb(self._path(model, name), np.full(shape, value), dist=False)
+        first = int(model.TimingInfo.StartCount) + (0 if model.Solver.PrintInitialConditions else 1)
+        for count in range(first, int(float(model.TimingInfo.StopTime) / dump_interval) + 1):
+            height = np.sum(dz) - 5 - 35 * math.exp(-count * dump_interval / 10)
+            pressure = np.broadcast_to(height - elevation, shape)
+            saturation = np.where(pressure >= 0, 1.0, 0.5)
+            parflow.write_pfb(self._path(model, f"press.{count:05d}"), pressure, dist=False)
+            parflow.write_pfb(self._path(model, f"satur.{count:05d}"), saturation, dist=False)
+
+    def _path(self, model, name):
+        return os.path.join(self.directory_path, f"{model.get_name()}.out.{name}.pfb")
+
+
+def test_run_spinup(tmp_path, monkeypatch):
+    """Test that the spinup stops after the first segment that converged and resumes after an interruption."""
+
+    # parflow.Run parses the command line arguments of pytest
+    monkeypatch.setattr(sys, "argv", ["pytest"])
+    monkeypatch.setattr(project, "hf", project.hf)
+    monkeypatch.setattr(project, "st", project.st)
+    fake_providers.install(project)
+    monkeypatch.chdir(tmp_path)
+    options = {
+        "run_type": "spinup",
+        "grid_bounds": [3749, 1583, 3759, 1593],
+        "start_date": "2005-10-01",
+        "end_date": "2005-10-02",
+        "time_steps": 100,
+        "dump_interval": 10,
+    }
+    directory_path = str(tmp_path / "spinup")
+    runscript_path = project.create_project(options, directory_path)
+    project._resolve_spatial_domain.cache_clear()
+    run = FakeSpinup(directory_path)
+
+    report = pf_spinup.run_spinup(runscript_path, 20, storage_tolerance=1e-3, wtd_tolerance=0.05, run=run, max_segments=2)
+    assert not report["converged"]
+    assert report["segments_complete"] == 2
+    assert [dump["timestep"] for dump in report["dumps"]] == [0, 1, 2, 3, 4]
+    assert abs(report["dumps"][1]["wtd_change"] - 35 * (1 - math.exp(-1))) < 1e-6
+
+    # The spinup resumes from the third segment and stops at 80 hours before the stop time of 100 hours
+    report = pf_spinup.run_spinup(runscript_path, 20, storage_tolerance=1e-3, wtd_tolerance=0.05, run=run)
+    assert run.runs == [0.0, 20.0, 40.0, 60.0]
+    assert report["converged"]
+    assert report["converged_time"] == 80.0
+    assert report["stop_time"] == 100.0
+    assert report["segments"] == 5
+    assert report["segments_complete"] == 4
+    assert report["dumps"][-1]["wtd_change"] < 0.05 < report["dumps"][6]["wtd_change"]
+    assert report["initial_pressure"] == os.path.relpath(pf_segments.checkpoint_pressure_path(directory_path, 3), directory_path)
+    assert os.path.exists(os.path.join(directory_path, report["initial_pressure"]))
+    with open(os.path.join(directory_path, pf_spinup.REPORT_FILE_NAME), "r", encoding="utf-8") as stream:
+        assert json.load(stream)["converged_time"] == 80.0
+
+    # A converged spinup is not run again
+    report = pf_spinup.run_spinup(runscript_path, 20, storage_tolerance=1e-3, wtd_tolerance=0.05, run=run)
+    assert report["converged"]
+    assert len(run.runs) == 4
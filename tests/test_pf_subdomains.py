@@ -0,0 +1,115 @@
+"""
+Unit tests for pf_subdomains module.
+The create_project tests use the local hf_hydrodata and subsettools stand-ins of the benchmarks.
+"""
+
+# pylint: disable=C0301,R0914,C0413,E0401
+import sys
+import os
+import numpy as np
+import parflow
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../benchmarks")))
+import pf_subdomains
+import project
+import fake_providers
+
+
+def test_split_huc(monkeypatch):
+    """Test that a huc_id list is split into one sub-domain per HUC."""
+
+    fake_providers.install(project)
+    monkeypatch.setattr(project, "hf", project.hf)
+    monkeypatch.setattr(project, "st", project.st)
+    sub_domains = pf_subdomains.split_domain({"huc_id": "020802030101, 020802030102"}, split="huc")
+    project._resolve_spatial_domain.cache_clear()
+    assert [name for name, _, _, _ in sub_domains] == ["huc_020802030101", "huc_020802030102"]
+    assert sub_domains[0][3]["huc_id"] == ["020802030101"]
+    assert sub_domains[0][2].shape == (sub_domains[0][1][3] - sub_domains[0][1][1], sub_domains[0][1][2] - sub_domains[0][1][0])
+
+
+def test_split_min_cells(monkeypatch):
+    """Test that the regions smaller than min_cells are merged into the nearest larger region."""
+
+    monkeypatch.setattr(project, "hf", project.hf)
+    monkeypatch.setattr(project, "st", project.st)
+    fake_providers.install(project)
+    mask = np.zeros((16, 16), dtype=int)
+    mask[1:5, 1:5] = 1
+    mask[10:14, 10:14] = 1
+    # Islands of one and two cells next to each region
+    mask[6, 3] = 1
+    mask[8, 11:13] = 1
+    options = {"grid_bounds": [3749, 1583, 3765, 1599], "mask": mask}
+
+    sub_domains = pf_subdomains.split_domain(options, min_cells=1)
+    project._resolve_spatial_domain.cache_clear()
+    assert len(sub_domains) == 4
+
+    sub_domains = pf_subdomains.split_domain(options, min_cells=10)
+    project._resolve_spatial_domain.cache_clear()
+    assert [name for name, _, _, _ in sub_domains] == ["region_001", "region_002"]
+    assert sub_domains[0][1] == [3750, 1584, 3754, 1590]
+    assert int(sub_domains[0][2].sum()) == 17
+    assert sub_domains[1][1] == [3759, 1591, 3763, 1597]
+    assert int(sub_domains[1][2].sum()) == 18
+
+    # Without a region of min_cells all the cells are merged into the largest region
+    sub_domains = pf_subdomains.split_domain(options, min_cells=100)
+    project._resolve_spatial_domain.cache_clear()
+    assert len(sub_domains) == 1
+    assert int(sub_domains[0][2].sum()) == int(mask.sum())
+
+
+def test_subprojects(tmp_path, monkeypatch):
+    """Test that each connected region is a sub-project with tight bounds and that the outputs are merged."""
+
+    # parflow.Run parses the command line arguments of pytest
+    monkeypatch.setattr(sys, "argv", ["pytest"])
+    monkeypatch.setattr(project, "hf", project.hf)
+    monkeypatch.setattr(project, "st", project.st)
+    fake_providers.install(project)
+    monkeypatch.chdir(tmp_path)
+    mask = np.zeros((16, 16), dtype=int)
+    mask[1:5, 2:8] = 1
+    mask[4:6, 7:9] = 1
+    mask[10:15, 9:12] = 1
+    options = {
+        "run_type": "spinup",
+        "grid_bounds": [3749, 1583, 3765, 1599],
+        "mask": mask,
+        "start_date": "2005-10-01",
+        "end_date": "2005-10-02",
+    }
+    directory_path = str(tmp_path / "basins")
+    summary = pf_subdomains.create_subprojects(options, directory_path, max_workers=2, min_cells=10)
+    project._resolve_spatial_domain.cache_clear()
+    assert summary["failed"] == 0
+    assert [s["runname"] for s in summary["scenarios"]] == ["region_001", "region_002"]
+
+    model = parflow.Run.from_definition(os.path.join(directory_path, "region_001", "region_001.yaml"))
+    assert (model.ComputationalGrid.NX, model.ComputationalGrid.NY) == (7, 5)
+    model = parflow.Run.from_definition(os.path.join(directory_path, "region_002", "region_002.yaml"))
+    assert (model.ComputationalGrid.NX, model.ComputationalGrid.NY) == (3, 5)
+
+    # The outputs of each sub-project are the sub-project number at the active cells
+    for number, name in enumerate(["region_001", "region_002"], start=1):
+        sub_mask = np.load(os.path.join(directory_path, pf_subdomains.SUBDOMAIN_MASKS_FILE_NAME))[name]
+        for timestep in [0, 1]:
+            data = np.where(sub_mask > 0, number * 10.0 + timestep, -1.0)
+            path = os.path.join(directory_path, name, f"{name}.out.press.{timestep:05d}.pfb")
+            parflow.write_pfb(path, np.broadcast_to(data, (10,) + sub_mask.shape), dist=False)
+    # Timestep 2 is only written by one sub-project so far
+    path = os.path.join(directory_path, "region_001", "region_001.out.press.00002.pfb")
+    parflow.write_pfb(path, np.zeros((10, 5, 7)), dist=False)
+    assert pf_subdomains.merge_outputs(directory_path) == {"press": 2}
+    assert pf_subdomains.merge_outputs(directory_path) == {"press": 0}
+
+    merged = parflow.read_pfb(os.path.join(directory_path, "basins.out.press.00001.pfb"))
+    assert merged.shape == (10, 16, 16)
+    expected = np.full((16, 16), np.nan)
+    expected[1:5, 2:8] = 11.0
+    expected[4:6, 7:9] = 11.0
+    expected[10:15, 9:12] = 21.0
+    assert np.array_equal(merged[9], expected, equal_nan=True)
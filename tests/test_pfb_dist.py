@@ -0,0 +1,118 @@
+"""
+Unit tests for pfb_dist module.
+"""
+
+# pylint: disable=C0301,R0914,C0413,E0401
+import sys
+import os
+import numpy as np
+import parflow
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../benchmarks")))
+import pfb_dist
+import pf_outputs
+import project
+import fake_providers
+
+
+def _write_input(path, shape, p=1, q=1):
+    """Write an undistributed pfb input file with values z * 100 + y * 10 + x / 10."""
+
+    nz, ny, nx = shape
+    z, y, x = np.meshgrid(np.arange(nz), np.arange(ny), np.arange(nx), indexing="ij")
+    array = z * 100.0 + y * 10.0 + x / 10.0
+    parflow.write_pfb(str(path), array, p=p, q=q, dist=False)
+    return array
+
+
+def test_distribute_files(tmp_path):
+    """Test that the files are distributed like parflow write_pfb and skipped when current."""
+
+    slope = _write_input(tmp_path / "slope_x.pfb", (1, 12, 10))
+    _write_input(tmp_path / "pf_indicator.pfb", (10, 12, 10))
+    (tmp_path / "box.out.press.00000.pfb").write_bytes(b"")
+    parflow.write_pfb(str(tmp_path / "expected.bin"), slope, p=2, q=3, dist=True)
+
+    paths = pfb_dist.input_paths(str(tmp_path))
+    assert [os.path.basename(path) for path in paths] == ["pf_indicator.pfb", "slope_x.pfb"]
+    result = pfb_dist.distribute_files(paths, 2, 3, workers=2)
+    assert sorted(result["distributed"]) == sorted(paths)
+    assert (tmp_path / "slope_x.pfb").read_bytes() == (tmp_path / "expected.bin").read_bytes()
+    assert (tmp_path / "slope_x.pfb.dist").read_text() == (tmp_path / "expected.bin.dist").read_text()
+    assert np.array_equal(parflow.read_pfb(str(tmp_path / "slope_x.pfb")), slope)
+    assert len(pf_outputs.PfbLayout(paths[0]).subgrids) == 6
+
+    result = pfb_dist.distribute_files(paths, 2, 3, workers=2)
+    assert result["distributed"] == []
+    assert sorted(result["skipped"]) == sorted(paths)
+    assert not pfb_dist.is_dist_current(paths[0], 3, 2)
+
+
+def test_redistribute_linked_files(tmp_path):
+    """Test that linked files are distributed once without changing the file they were linked from."""
+
+    cache_path = tmp_path / "cached.pfb"
+    array = _write_input(cache_path, (24, 8, 9), p=2, q=2)
+    cached_bytes = cache_path.read_bytes()
+    project_dir = tmp_path / "project"
+    project_dir.mkdir()
+    paths = []
+    for day in range(0, 3):
+        path = project_dir / f"CW3E.APCP.{day * 24 + 1:06d}_to_{day * 24 + 24:06d}.pfb"
+        os.link(cache_path, path)
+        paths.append(str(path))
+
+    result = pfb_dist.distribute_files(paths, 3, 1)
+    assert result["distributed"] == paths
+    assert cache_path.read_bytes() == cached_bytes
+    assert os.path.samefile(paths[0], paths[2])
+    assert os.path.samefile(f"{paths[0]}.dist", f"{paths[2]}.dist")
+    assert all(pfb_dist.is_dist_current(path, 3, 1) for path in paths)
+
+    result = pfb_dist.distribute_files(paths, 1, 2, workers=1)
+    assert result["distributed"] == paths
+    assert np.array_equal(parflow.read_pfb(paths[1]), array)
+    assert (project_dir / f"{os.path.basename(paths[1])}.dist").read_text().count("\n") == 2
+
+
+def test_redistribute_project(tmp_path, monkeypatch):
+    """Test that a project is redistributed to a new topology without fetching the data again."""
+
+    # parflow.Run parses the command line arguments of pytest
+    monkeypatch.setattr(sys, "argv", ["pytest"])
+    monkeypatch.setattr(project, "hf", project.hf)
+    monkeypatch.setattr(project, "st", project.st)
+    hydrodata = fake_providers.install(project)
+    monkeypatch.chdir(tmp_path)
+    options = {
+        "run_type": "transient",
+        "grid_bounds": [3749, 1583, 3765, 1599],
+        "start_date": "2005-10-01",
+        "end_date": "2005-10-03",
+        "forcing_day": "2005-10-01",
+        "topology": [1, 1, 1],
+        "dist_workers": 2,
+    }
+    directory_path = str(tmp_path / "redistribute")
+    runscript_path = project.create_project(options, directory_path)
+    requests = hydrodata.requests
+    forcing_path = os.path.join(directory_path, "CW3E.APCP.000025_to_000048.pfb")
+    assert pfb_dist.is_dist_current(forcing_path, 1, 1)
+
+    result = project.redistribute_project(runscript_path, [2, 2, 1], workers=2)
+    assert hydrodata.requests == requests
+    assert forcing_path in result["distributed"]
+    assert pfb_dist.is_dist_current(forcing_path, 2, 2)
+    assert pfb_dist.is_dist_current(os.path.join(directory_path, "slope_x.pfb"), 2, 2)
+    model = parflow.Run.from_definition(runscript_path)
+    assert (model.Process.Topology.P, model.Process.Topology.Q) == (2, 2)
+
+    received = []
+    options["topology"] = [2, 2, 1]
+    options["instrument_listeners"] = [received.append]
+    project.create_project(options, directory_path)
+    project._resolve_spatial_domain.cache_clear()
+    assert hydrodata.requests == requests
+    skipped = {event["name"]: event.get("skipped") for event in received if event["event"] == "end" and event["kind"] == "stage"}
+    assert skipped["dist"] is True and skipped["static"] is True
@@ -0,0 +1,96 @@
+"""
+Unit tests for the pipeline mode of create_project that runs the independent stages concurrently.
+The create_project tests use the local hf_hydrodata and subsettools stand-ins of the benchmarks.
+"""
+
+# pylint: disable=C0301,R0914,C0413,E0401
+import sys
+import os
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../benchmarks")))
+import project
+import project_manifest
+import data_cache
+import fake_providers
+
+
+def _create(tmp_path, name, options, latency=0.0):
+    """Create a project with the stand-ins and return the directory path and the stage end events."""
+
+    fake_providers.install(project, latency=latency)
+    received = []
+    directory_path = str(tmp_path / name)
+    project.create_project({**options, "instrument_listeners": [received.append]}, directory_path)
+    project._resolve_spatial_domain.cache_clear()
+    return directory_path, [e for e in received if e["event"] == "end" and e["kind"] == "stage"]
+
+
+def _contents(directory_path):
+    """Get the sha256 of the files of the project directory except the manifest (the runscript as text without the directory)."""
+
+    contents = {}
+    for name in data_cache.snapshot_files(directory_path):
+        path = os.path.join(directory_path, name)
+        if name.endswith(".yaml"):
+            with open(path, "r", encoding="utf-8") as stream:
+                contents[name] = stream.read().replace(directory_path, "<directory_path>")
+        elif name != project_manifest.MANIFEST_FILE_NAME:
+            contents[name] = data_cache.file_sha256(path)
+    return contents
+
+
+@pytest.mark.parametrize("forcing_day", [None, "2005-10-01"])
+def test_pipeline_matches_sequential(tmp_path, monkeypatch, forcing_day):
+    """Test that the pipeline mode creates the same files as the sequential mode."""
+
+    # parflow.Run parses the command line arguments of pytest
+    monkeypatch.setattr(sys, "argv", ["pytest"])
+    monkeypatch.setattr(project, "hf", project.hf)
+    monkeypatch.setattr(project, "st", project.st)
+    monkeypatch.chdir(tmp_path)
+    options = {
+        "run_type": "transient",
+        "grid_bounds": [3749, 1583, 3765, 1599],
+        "start_date": "2005-10-01",
+        "end_date": "2005-10-05",
+        "forcing_day": forcing_day,
+        "forcing_chunk_days": 2,
+        "topology": [2, 2, 1],
+        "dist_workers": 2,
+    }
+    sequential_path, _ = _create(tmp_path, "box", options)
+    pipeline_path, ends = _create(tmp_path / "pipeline", "box", {**options, "pipeline": True})
+
+    assert _contents(pipeline_path) == _contents(sequential_path)
+    assert not os.path.exists(os.path.join(pipeline_path, project_manifest.STAGING_DIR_NAME))
+    manifest = project_manifest.ProjectManifest(pipeline_path)
+    assert "slope_x.pfb" in manifest.stages["static"]["outputs"]
+    assert "CW3E.APCP.000073_to_000096.pfb" in manifest.stages["forcing"]["outputs"]
+    assert "slope_x.pfb" not in manifest.stages["forcing"]["outputs"]
+    assert all(end["skipped"] is False for end in ends if end["name"] in ["mask", "static", "clm", "forcing", "dist"])
+
+    _, ends = _create(tmp_path / "pipeline", "box", {**options, "pipeline": True})
+    assert all(end["skipped"] is True for end in ends if end["name"] in ["mask", "static", "clm", "forcing", "dist"])
+
+
+def test_pipeline_overlaps_stages(tmp_path, monkeypatch):
+    """Test that the static, clm and forcing stages run at the same time in pipeline mode."""
+
+    monkeypatch.setattr(sys, "argv", ["pytest"])
+    monkeypatch.setattr(project, "hf", project.hf)
+    monkeypatch.setattr(project, "st", project.st)
+    monkeypatch.chdir(tmp_path)
+    options = {
+        "run_type": "transient",
+        "grid_bounds": [3749, 1583, 3759, 1593],
+        "start_date": "2005-10-01",
+        "end_date": "2005-10-02",
+        "pipeline": True,
+    }
+    _, ends = _create(tmp_path, "overlap", options, latency=0.05)
+    spans = {end["name"]: (end["time"] - end["duration"], end["time"]) for end in ends}
+    assert spans["static"][0] < spans["forcing"][1] and spans["forcing"][0] < spans["static"][1]
+    assert spans["clm"][0] < spans["forcing"][1]
+    assert spans["dist"][0] >= max(spans[name][1] for name in ["mask", "static", "clm", "forcing"])
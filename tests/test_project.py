@@ -10,6 +10,7 @@ import pytest
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
 import project
+import pf_outputs
 
 
 def test_huc8():
@@ -219,10 +220,9 @@ def verify_pressure(runscript_path, start_pressure, end_pressure):
     print(f"INI PRESS ({z},{y},{x})", initial_press_np[z, y, x])
     print(initial_press_np[z, y, x])
     print()
+    press = pf_outputs.OutputDataset(directory_path, runname)["press"]
+    out_press_series = press[0:stop_time, z, y, x]
     for i in range(0, stop_time):
-        out_path = f"{directory_path}/{runname}.out.press.{i:05d}.pfb"
-        out_press_np = parflow.read_pfb(out_path)
-        print(f"OUT PRESS ({z},{y},{x}) {out_press_np[z, y, x]} [{i}]")
-        top_layer_pressure = out_press_np
+        print(f"OUT PRESS ({z},{y},{x}) {out_press_series[i]} [{press.timesteps[i]}]")
     assert initial_press_np[z, y, x] == pytest.approx(start_pressure, abs=0.00001)
-    assert top_layer_pressure[z, y, x] == pytest.approx(end_pressure, abs=0.00001)
+    assert out_press_series[-1] == pytest.approx(end_pressure, abs=0.00001)
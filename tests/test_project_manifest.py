@@ -0,0 +1,190 @@
+"""
+Unit tests for project_manifest module.
+"""
+
+# pylint: disable=C0301,R0914,C0413,E0401
+import sys
+import os
+import json
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../benchmarks")))
+import project_manifest
+import project
+import pfb_dist
+import fake_providers
+
+
+def _write_file(directory_path, name, content):
+    path = os.path.join(directory_path, name)
+    with open(path, "wb") as stream:
+        stream.write(content)
+    return path
+
+
+def test_skip_complete_stage(tmp_path):
+    """Test that a stage with the same inputs and intact outputs is skipped when run again."""
+
+    directory_path = str(tmp_path)
+    calls = []
+
+    def static():
+        calls.append("static")
+        return {"slope_x": _write_file(directory_path, "slope_x.pfb", b"slope")}
+
+    manifest = project_manifest.ProjectManifest(directory_path)
+    result = manifest.run("static", {"grid_bounds": [1, 2, 3, 4]}, static)
+    assert result["slope_x"] == os.path.join(directory_path, "slope_x.pfb")
+    assert manifest.ran == ["static"]
+
+    manifest = project_manifest.ProjectManifest(directory_path)
+    result = manifest.run("static", {"grid_bounds": (1, 2, 3, 4)}, static)
+    assert result["slope_x"] == os.path.join(directory_path, "slope_x.pfb")
+    assert manifest.skipped == ["static"]
+    assert calls == ["static"]
+
+    # Different inputs run the stage again
+    manifest = project_manifest.ProjectManifest(directory_path)
+    manifest.run("static", {"grid_bounds": [1, 2, 3, 5]}, static)
+    assert calls == ["static", "static"]
+
+    # Disabled manifest always runs the stage
+    manifest = project_manifest.ProjectManifest(directory_path, enabled=False)
+    manifest.run("static", {"grid_bounds": [1, 2, 3, 5]}, static)
+    assert calls == ["static", "static", "static"]
+
+
+def test_damaged_outputs(tmp_path):
+    """Test that a stage is run again if an output file is removed or changed."""
+
+    directory_path = str(tmp_path)
+    calls = []
+
+    def clm():
+        calls.append("clm")
+        _write_file(directory_path, "drv_vegm.dat", b"vegm")
+
+    project_manifest.ProjectManifest(directory_path).run("clm", {}, clm)
+    os.remove(os.path.join(directory_path, "drv_vegm.dat"))
+    project_manifest.ProjectManifest(directory_path).run("clm", {}, clm)
+    assert len(calls) == 2
+
+    # Same size but different content and modification time
+    _write_file(directory_path, "drv_vegm.dat", b"VEGM")
+    os.utime(os.path.join(directory_path, "drv_vegm.dat"), ns=(1, 1))
+    project_manifest.ProjectManifest(directory_path).run("clm", {}, clm)
+    assert len(calls) == 3
+
+    # Same content with a new modification time is still intact
+    os.utime(os.path.join(directory_path, "drv_vegm.dat"), ns=(2, 2))
+    project_manifest.ProjectManifest(directory_path).run("clm", {}, clm)
+    assert len(calls) == 3
+
+
+def test_depends_and_refresh(tmp_path):
+    """Test that a stage runs again if a stage it depends on ran and that refresh records rewritten outputs."""
+
+    directory_path = str(tmp_path)
+
+    def static():
+        _write_file(directory_path, "slope_x.pfb", b"slope")
+
+    def dist():
+        _write_file(directory_path, "slope_x.pfb", b"distributed slope")
+        _write_file(directory_path, "slope_x.pfb.dist", b"0")
+
+    manifest = project_manifest.ProjectManifest(directory_path)
+    manifest.run("static", {}, static)
+    manifest.run("dist", {"topology": [1, 1, 1]}, dist, depends=["static"])
+    manifest.refresh()
+
+    manifest = project_manifest.ProjectManifest(directory_path)
+    manifest.run("static", {}, static)
+    manifest.run("dist", {"topology": [1, 1, 1]}, dist, depends=["static"])
+    assert manifest.skipped == ["static", "dist"]
+
+    manifest = project_manifest.ProjectManifest(directory_path)
+    manifest.run("static", {"grid_bounds": [0, 0, 1, 1]}, static)
+    manifest.run("dist", {"topology": [1, 1, 1]}, dist, depends=["static"])
+    assert manifest.ran == ["static", "dist"]
+
+
+def test_resumable(tmp_path):
+    """Test that a stage that failed is resumable with the same inputs."""
+
+    directory_path = str(tmp_path)
+
+    def fail():
+        _write_file(directory_path, "CW3E.APCP.000001_to_000024.pfb", b"day1")
+        raise ValueError("Network error")
+
+    manifest = project_manifest.ProjectManifest(directory_path)
+    try:
+        manifest.run("forcing", {"end_date": "2005-10-03"}, fail)
+    except ValueError:
+        pass
+
+    manifest = project_manifest.ProjectManifest(directory_path)
+    assert manifest.is_resumable("forcing", {"end_date": "2005-10-03"})
+    assert not manifest.is_resumable("forcing", {"end_date": "2005-10-04"})
+    assert not manifest.is_complete("forcing", {"end_date": "2005-10-03"})
+    with open(manifest.path, "r", encoding="utf-8") as stream:
+        assert json.load(stream)["stages"]["forcing"]["complete"] is False
+
+
+def test_resume_dist(tmp_path, monkeypatch):
+    """Test that a dist stage that failed part way keeps the other stages and only distributes the remaining files."""
+
+    # parflow.Run parses the command line arguments of pytest
+    monkeypatch.setattr(sys, "argv", ["pytest"])
+    monkeypatch.setattr(project, "hf", project.hf)
+    monkeypatch.setattr(project, "st", project.st)
+    hydrodata = fake_providers.install(project)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(project, "DIST_RECORD_FILES", 4)
+    dist_file = pfb_dist.dist_file
+    distributed = []
+
+    def failing_dist_file(path, p, q):
+        if len(distributed) == 10:
+            raise OSError("No space left on device")
+        distributed.append(path)
+        return dist_file(path, p, q)
+
+    monkeypatch.setattr(pfb_dist, "dist_file", failing_dist_file)
+    options = {
+        "run_type": "transient",
+        "grid_bounds": [3749, 1583, 3759, 1593],
+        "start_date": "2005-10-01",
+        "end_date": "2005-10-03",
+        "topology": [2, 2, 1],
+        "dist_workers": 1,
+    }
+    directory_path = str(tmp_path / "box")
+    try:
+        project.create_project(options, directory_path)
+        assert False, "The dist stage did not fail"
+    except OSError:
+        pass
+    project._resolve_spatial_domain.cache_clear()
+    requests = hydrodata.requests
+    first = list(distributed)
+
+    written = []
+
+    def counting_dist_file(path, p, q):
+        if dist_file(path, p, q):
+            written.append(path)
+            return True
+        return False
+
+    monkeypatch.setattr(pfb_dist, "dist_file", counting_dist_file)
+    project.create_project(options, directory_path)
+    project._resolve_spatial_domain.cache_clear()
+    assert hydrodata.requests == requests
+    manifest = project_manifest.ProjectManifest(directory_path)
+    assert all(manifest.stages[stage]["complete"] for stage in ["mask", "static", "clm", "forcing", "dist"])
+    # Only the files that were not distributed before the failure are distributed again
+    assert written
+    assert not set(written) & set(first)
+    assert all(pfb_dist.is_dist_current(path, 2, 2) for path in pfb_dist.input_paths(directory_path))
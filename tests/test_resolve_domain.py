@@ -0,0 +1,87 @@
+"""
+Unit tests for the domain resolution of the project module.
+Uses local stand-ins for subsettools and hf_hydrodata that count the calls.
+"""
+
+# pylint: disable=C0301,R0914,C0413,E0401
+import sys
+import os
+import types
+import numpy as np
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+import project
+
+
+@pytest.fixture(name="calls")
+def fixture_calls(monkeypatch):
+    """Replace subsettools and hf_hydrodata in the project module with stand-ins that count calls."""
+
+    calls = {"define_huc_domain": 0, "define_latlon_domain": 0, "to_latlon": 0}
+
+    def define_huc_domain(hucs, grid):
+        calls["define_huc_domain"] += 1
+        return (100, 200, 110, 205), np.ones((5, 10))
+
+    def define_latlon_domain(latlon_bounds, grid):
+        calls["define_latlon_domain"] += 1
+        (min_lat, min_lon), (max_lat, max_lon) = latlon_bounds
+        ij_bounds = (int(min_lon), int(min_lat), int(max_lon) + 1, int(max_lat) + 1)
+        return ij_bounds, np.ones((ij_bounds[3] - ij_bounds[1], ij_bounds[2] - ij_bounds[0]))
+
+    def to_latlon(grid, x, y):
+        calls["to_latlon"] += 1
+        return (float(y), float(x))
+
+    monkeypatch.setattr(
+        project,
+        "st",
+        types.SimpleNamespace(define_huc_domain=define_huc_domain, define_latlon_domain=define_latlon_domain),
+    )
+    monkeypatch.setattr(project, "hf", types.SimpleNamespace(to_latlon=to_latlon))
+    project._resolve_spatial_domain.cache_clear()
+    yield calls
+    project._resolve_spatial_domain.cache_clear()
+
+
+def test_resolve_grid_bounds(calls):
+    """Test that the same grid_bounds are resolved only once and the dates are per project."""
+
+    options = {"grid_bounds": [3749, 1583, 3759, 1593], "start_date": "2005-10-01", "end_date": "2005-10-02"}
+    domain = project.resolve_domain(options)
+    assert domain.ij_bounds == (3749, 1583, 3759, 1593)
+    assert domain.mask.shape == (10, 10)
+    assert domain.grid == "conus2"
+    assert domain.start_date == "2005-10-01"
+    assert not domain.mask.flags.writeable
+
+    other_dates = project.resolve_domain({"grid_bounds": (3749, 1583, 3759, 1593), "start_date": "2006-10-01"})
+    assert other_dates.start_date == "2006-10-01"
+    assert other_dates.mask is domain.mask
+    assert calls["define_latlon_domain"] == 1
+    assert calls["to_latlon"] == 2
+
+    project.resolve_domain({"grid_bounds": [3749, 1583, 3760, 1593]})
+    assert calls["define_latlon_domain"] == 2
+
+
+def test_resolve_huc_id(calls):
+    """Test that the huc_id option is normalized before it is used as the cache key."""
+
+    domain = project.resolve_domain({"huc_id": "02080203,02080204"})
+    assert domain.ij_bounds == (100, 200, 110, 205)
+    assert domain.latlon_bounds == [[200.0, 100.0], [204.0, 109.0]]
+    project.resolve_domain({"huc_id": ["02080204", "02080203"]})
+    project.resolve_domain({"huc_id": ("02080203", "02080204")})
+    assert calls["define_huc_domain"] == 1
+
+
+def test_resolve_errors(calls):
+    """Test the errors of invalid spatial options."""
+
+    with pytest.raises(ValueError):
+        project.resolve_domain({})
+    with pytest.raises(ValueError):
+        project.resolve_domain({"latlon_bounds": [[1, 2]]})
+    assert calls["define_latlon_domain"] == 0
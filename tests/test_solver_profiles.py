@@ -0,0 +1,145 @@
+"""
+Unit tests for solver_profiles module.
+The project is created with the local hf_hydrodata and subsettools stand-ins of the benchmarks
+and parflow is replaced by a function that writes a kinsol log.
+"""
+
+# pylint: disable=C0301,R0914,C0413,E0401
+import sys
+import os
+import time
+import json
+import parflow
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../benchmarks")))
+import project
+import solver_profiles
+import fake_providers
+
+KINSOL_STEP = """KINSOL starting step for time {time:f}
+scsteptol used:    1e-30
+fnormtol  used:    1e-07
+KINSolInit nni=    0  fnorm=        0.1  nfe=     1
+KINSol nni=    1 fnorm=        0.001 nfe=     2
+KINSol return value 1
+---KINSOL_SUCCESS
+
+--------------------------------------------------
+                    Iteration             Total
+Nonlin. Its.:              {nonlinear}                 {nonlinear}
+Lin. Its.:                 {linear}                {linear}
+Func. Evals.:              3                 3
+--------------------------------------------------
+"""
+
+
+class FakeParflow:
+    """Writes a kinsol log with more linear iterations and a longer run for a smaller Krylov dimension."""
+
+    def __init__(self, directory_path):
+        self.directory_path = directory_path
+        self.runs = []
+
+    def __call__(self, model):
+        krylov = int(model.Solver.Linear.KrylovDimension)
+        self.runs.append(krylov)
+        if krylov == 5:
+            raise SystemExit(1)
+        steps = int(float(model.TimingInfo.StopTime) - float(model.TimingInfo.StartTime))
+        linear = 600 // krylov
+        time.sleep(0.002 * linear)
+        with open(os.path.join(self.directory_path, f"{model.get_name()}.out.kinsol.log"), "w", encoding="utf-8") as stream:
+            for step in range(0, steps):
+                stream.write(KINSOL_STEP.format(time=step, nonlinear=2, linear=linear))
+
+
+def test_select_profile(tmp_path):
+    """Test that the template profile is chosen unless a tuned profile is close to the cells per rank."""
+
+    assert solver_profiles.select_profile(10 * 10 * 10, 1)["name"] == "template"
+    assert solver_profiles.select_profile(1000 * 1000 * 10, 4)["name"] == "template"
+
+    profiles_path = str(tmp_path / "profiles.json")
+    solver_profiles.save_profile(profiles_path, {"name": "box", "settings": {"Solver.Linear.KrylovDimension": 60}, "tuned": {"cells_per_rank": 1000}})
+    assert solver_profiles.select_profile(10 * 10 * 10, 1, profiles_path)["name"] == "box"
+    assert solver_profiles.select_profile(100 * 100 * 10, 1, profiles_path)["name"] == "template"
+
+
+def test_tune_profile(tmp_path, monkeypatch):
+    """Test that the fastest candidate is saved as a tuned profile used by the auto solver_profile."""
+
+    # parflow.Run parses the command line arguments of pytest
+    monkeypatch.setattr(sys, "argv", ["pytest"])
+    monkeypatch.setattr(project, "hf", project.hf)
+    monkeypatch.setattr(project, "st", project.st)
+    fake_providers.install(project)
+    monkeypatch.chdir(tmp_path)
+    options = {
+        "run_type": "transient",
+        "grid_bounds": [3749, 1583, 3759, 1593],
+        "start_date": "2005-10-01",
+        "end_date": "2005-10-02",
+        "forcing_day": "2005-10-01",
+        "solver_profile": "auto",
+    }
+    directory_path = str(tmp_path / "box")
+    runscript_path = project.create_project(options, directory_path)
+    project._resolve_spatial_domain.cache_clear()
+    model = parflow.Run.from_definition(runscript_path)
+    assert model.Solver.Linear.KrylovDimension == 500
+
+    profiles_path = str(tmp_path / "profiles.json")
+    run = FakeParflow(directory_path)
+    tuning = solver_profiles.tune_profile(
+        runscript_path, {"Solver.Linear.KrylovDimension": [5, 20, 100]}, hours=3, profiles_path=profiles_path, name="box", run=run
+    )
+    assert run.runs == [5, 20, 100]
+    assert [result["status"] for result in tuning["results"]] == ["failed", "ok", "ok"]
+    assert tuning["results"][1]["timesteps"] == 3
+    assert tuning["results"][1]["nonlinear_iterations"] == 6
+    assert tuning["results"][1]["linear_iterations"] == 90
+    assert tuning["profile"]["settings"] == {"Solver.Linear.KrylovDimension": 100}
+    assert tuning["profile"]["tuned"]["cells_per_rank"] == 1000
+    with open(os.path.join(directory_path, solver_profiles.TUNING_FILE_NAME), "r", encoding="utf-8") as stream:
+        assert len(json.load(stream)["results"]) == 3
+
+    runscript_path = project.create_project({**options, "solver_profiles_path": profiles_path}, directory_path)
+    project._resolve_spatial_domain.cache_clear()
+    model = parflow.Run.from_definition(runscript_path)
+    assert model.Solver.Linear.KrylovDimension == 100
+
+    with pytest.raises(ValueError):
+        solver_profiles.apply_profile(model, "unknown")
+
+
+def test_auto_keeps_template(tmp_path, monkeypatch):
+    """Test that "auto" without a close tuned profile keeps the solver settings of a user template."""
+
+    monkeypatch.setattr(sys, "argv", ["pytest"])
+    monkeypatch.setattr(project, "hf", project.hf)
+    monkeypatch.setattr(project, "st", project.st)
+    fake_providers.install(project)
+    monkeypatch.chdir(tmp_path)
+    template_dir = os.path.join(os.path.dirname(project.__file__), "template_runscripts")
+    with open(os.path.join(template_dir, "conus2_transient_solid.yaml"), "r", encoding="utf-8") as stream:
+        template = stream.read()
+    template = template.replace("KrylovDimension: 500", "KrylovDimension: 70").replace("MaxRestarts: 8", "MaxRestarts: 3")
+    template_path = str(tmp_path / "mine.yaml")
+    with open(template_path, "w", encoding="utf-8") as stream:
+        stream.write(template)
+    options = {
+        "template": template_path,
+        "grid_bounds": [3749, 1583, 3759, 1593],
+        "start_date": "2005-10-01",
+        "end_date": "2005-10-02",
+        "forcing_day": "2005-10-01",
+        "solver_profile": "auto",
+    }
+    runscript_path = project.create_project(options, str(tmp_path / "box"))
+    project._resolve_spatial_domain.cache_clear()
+    model = parflow.Run.from_definition(runscript_path)
+    assert model.Solver.Linear.KrylovDimension == 70
+    assert model.Solver.Linear.MaxRestarts == 3
+    assert solver_profiles.apply_profile(model, "auto") is None
@@ -0,0 +1,119 @@
+"""
+Unit tests for the template runscripts of project module.
+The create_project test uses the local hf_hydrodata and subsettools stand-ins of the benchmarks.
+"""
+
+# pylint: disable=C0301,R0914,C0413,E0401
+import sys
+import os
+import shutil
+import parflow
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../benchmarks")))
+import project
+import fake_providers
+
+TEMPLATE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../src/template_runscripts"))
+
+
+def test_resolve_template(tmp_path, monkeypatch):
+    """Test that the template option is used and the run_type template is the default."""
+
+    monkeypatch.chdir(tmp_path)
+    transient = os.path.join(TEMPLATE_DIR, "conus2_transient_solid.yaml")
+    spinup = os.path.join(TEMPLATE_DIR, "conus2_spinup_solid.yaml")
+    assert project.resolve_template({}) == transient
+    assert project.resolve_template({"run_type": "transient"}) == transient
+    assert project.resolve_template({"run_type": "spinup"}) == spinup
+    assert project.resolve_template({"run_type": "transient", "template": "conus2_spinup_solid.yaml"}) == spinup
+    shutil.copy(spinup, tmp_path / "mine.yaml")
+    assert project.resolve_template({"template": "mine.yaml"}) == str(tmp_path / "mine.yaml")
+
+    with pytest.raises(ValueError):
+        project.resolve_template({"run_type": "steady"})
+    with pytest.raises(ValueError):
+        project.resolve_template({"template": "missing.yaml"})
+
+
+def test_load_template(tmp_path, monkeypatch):
+    """Test that a template is parsed once until it is changed and is validated."""
+
+    # parflow.Run parses the command line arguments of pytest
+    monkeypatch.setattr(sys, "argv", ["pytest"])
+    template_path = str(tmp_path / "mine.yaml")
+    shutil.copy(os.path.join(TEMPLATE_DIR, "conus2_transient_solid.yaml"), template_path)
+    parsed = []
+    from_definition = parflow.Run.from_definition
+
+    def counting_from_definition(file_path):
+        parsed.append(file_path)
+        return from_definition(file_path)
+
+    monkeypatch.setattr(parflow.Run, "from_definition", counting_from_definition)
+    keys = project.load_template(template_path)
+    keys["ComputationalGrid.NZ"] = 1
+    assert project.load_template(template_path)["ComputationalGrid.NZ"] == 10
+    assert len(parsed) == 1
+
+    with open(template_path, "r", encoding="utf-8") as stream:
+        text = stream.read()
+    with open(template_path, "w", encoding="utf-8") as stream:
+        stream.write(text.replace("  NZ: 10\n", ""))
+    with pytest.raises(ValueError):
+        project.load_template(template_path)
+    assert len(parsed) == 2
+
+    with pytest.raises(ValueError):
+        project.load_template(str(tmp_path / "missing.yaml"))
+
+
+def test_create_runscript(tmp_path, monkeypatch):
+    """Test that the model of a new runscript has the keys of the template parsed by from_definition."""
+
+    # parflow.Run parses the command line arguments of pytest
+    monkeypatch.setattr(sys, "argv", ["pytest"])
+    for template in project.TEMPLATES.values():
+        runscript_path, model = project._create_runscript("box", str(tmp_path / "box"), template)
+        assert runscript_path == str(tmp_path / "box" / "box.yaml")
+        assert "_pfstore_" not in model.__dict__
+        assert model.to_dict() == parflow.Run.from_definition(os.path.join(TEMPLATE_DIR, template)).to_dict()
+
+
+def test_create_project_template(tmp_path, monkeypatch):
+    """Test that the template option is used by create_project without parsing the template again."""
+
+    # parflow.Run parses the command line arguments of pytest
+    monkeypatch.setattr(sys, "argv", ["pytest"])
+    monkeypatch.setattr(project, "hf", project.hf)
+    monkeypatch.setattr(project, "st", project.st)
+    fake_providers.install(project)
+    monkeypatch.chdir(tmp_path)
+    template_path = str(tmp_path / "mine.yaml")
+    with open(os.path.join(TEMPLATE_DIR, "conus2_transient_solid.yaml"), "r", encoding="utf-8") as stream:
+        text = stream.read()
+    with open(template_path, "w", encoding="utf-8") as stream:
+        stream.write(text.replace("  KrylovDimension: 500\n", "  KrylovDimension: 77\n"))
+    options = {
+        "template": template_path,
+        "grid_bounds": [3749, 1583, 3759, 1593],
+        "start_date": "2005-10-01",
+        "end_date": "2005-10-02",
+        "forcing_day": "2005-10-01",
+    }
+    parsed = []
+    from_definition = parflow.Run.from_definition
+
+    def counting_from_definition(file_path):
+        parsed.append(os.path.abspath(file_path))
+        return from_definition(file_path)
+
+    monkeypatch.setattr(parflow.Run, "from_definition", counting_from_definition)
+    for name in ["box_1", "box_2"]:
+        runscript_path = project.create_project(options, str(tmp_path / name))
+        project._resolve_spatial_domain.cache_clear()
+        model = from_definition(runscript_path)
+        assert model.get_name() == name
+        assert model.Solver.Linear.KrylovDimension == 77
+    assert parsed.count(template_path) == 1
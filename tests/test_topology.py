@@ -0,0 +1,55 @@
+"""
+Unit tests for the automatic topology selection of the project module.
+"""
+
+# pylint: disable=C0301,R0914,C0413,E0401
+import sys
+import os
+import shutil
+import numpy as np
+import parflow
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+import project
+
+
+def test_choose_topology():
+    """Test that the topology uses the available cores without splitting small domains into slivers."""
+
+    topology, reason = project.choose_topology(10, 10, 10, cores=4)
+    assert topology == [1, 1, 1]
+    assert "auto topology 1x1x1" in reason
+
+    topology, _ = project.choose_topology(200, 100, 10, cores=8)
+    assert topology == [4, 2, 1]
+
+    # Only the active cells of the mask count towards the cells per rank
+    topology, _ = project.choose_topology(200, 100, 10, active_fraction=0.1, cores=8)
+    assert topology == [2, 1, 1]
+
+    # Subgrids are at least MIN_SUBGRID_WIDTH cells wide
+    topology, _ = project.choose_topology(16, 400, 10, cores=64, min_cells_per_rank=1)
+    assert topology[0] == 2
+    assert 400 // topology[1] >= project.MIN_SUBGRID_WIDTH
+    assert topology[0] * topology[1] <= 64
+
+
+def test_auto_topology_metadata(tmp_path, monkeypatch):
+    """Test that an auto topology is set in the model with the reason in the runscript metadata."""
+
+    # parflow.Run parses the command line arguments of pytest
+    monkeypatch.setattr(sys, "argv", ["pytest"])
+
+    template = os.path.join(os.path.dirname(__file__), "../src/template_runscripts/conus2_transient_solid.yaml")
+    runscript_path = str(tmp_path / "auto.yaml")
+    shutil.copy(template, runscript_path)
+    model = parflow.Run.from_definition(runscript_path)
+    build = project._ProjectBuild({"topology": "auto", "available_cores": 4}, "auto", runscript_path, model)
+    build.domain = project.ResolvedDomain(np.ones((100, 200)), "conus2", (0, 0, 200, 100), None, "2005-10-01", "2005-10-02")
+
+    project._create_topology(build)
+    assert model.Process.Topology.P == 2
+    assert model.Process.Topology.Q == 2
+    assert model.ComputationalGrid.NX == 200
+    assert model.ComputationalGrid.NY == 100
+    assert model.Metadata.Description.startswith("auto topology 2x2x1")